@@ -0,0 +1,95 @@
+"""HTTP throughput benchmark for the API.
+
+Keeps ``--concurrency`` requests in flight against one or more read
+endpoints for ``--duration`` seconds and reports throughput and latency
+percentiles. Run it against each server setup on the same machine and
+data set to compare them, for example:
+
+    # Seed a realistic tenant mix first
+    python generate_data.py --users 200
+
+    # Baseline: one worker, default loop and parser
+    RATE_LIMIT_READ_PER_SECOND=0 python server.py
+    python benchmark.py --duration 30 --concurrency 64
+
+    # Tuned: several workers with uvloop and httptools
+    JWT_SECRET=change-me RATE_LIMIT_READ_PER_SECOND=0 python serve.py --workers 4
+    python benchmark.py --duration 30 --concurrency 64
+
+Per-user rate limiting would otherwise cap the result, hence
+RATE_LIMIT_READ_PER_SECOND=0. Run the load generator on a different host
+from the server, or at least pin them to separate cores, so they do not
+compete for CPU.
+"""
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import List, Optional
+
+import requests
+import typer
+
+app = typer.Typer(help="Measure API throughput and latency.")
+
+
+def _percentile(sorted_values: List[float], fraction: float) -> float:
+    if not sorted_values:
+        return 0.0
+    return sorted_values[min(len(sorted_values) - 1, int(len(sorted_values) * fraction))]
+
+
+@app.command()
+def run(
+    url: str = typer.Option("http://localhost:8001", help="Base URL of the server."),
+    path: List[str] = typer.Option(
+        ["/api/dashboard/stats", "/api/clients", "/api/payments"],
+        help="Endpoint to request; repeat the option to rotate through several.",
+    ),
+    concurrency: int = typer.Option(32, help="Requests kept in flight."),
+    duration: float = typer.Option(20.0, help="Seconds to measure for."),
+    warmup: float = typer.Option(3.0, help="Seconds of load before measuring starts."),
+    token: Optional[str] = typer.Option(None, help="Bearer token; without one requests act as the default user."),
+):
+    """Run the benchmark and print a summary."""
+    headers = {"Authorization": f"Bearer {token}"} if token else {}
+    latencies: List[float] = []
+    statuses = {}
+    lock = threading.Lock()
+    started = time.perf_counter()
+    measure_from = started + warmup
+    stop_at = measure_from + duration
+
+    def worker(worker_index: int):
+        session = requests.Session()
+        request_index = worker_index
+        while True:
+            request_started = time.perf_counter()
+            if request_started >= stop_at:
+                return
+            try:
+                status = session.get(url + path[request_index % len(path)], headers=headers).status_code
+            except requests.RequestException:
+                status = "error"
+            request_index += 1
+            if request_started < measure_from:
+                continue
+            elapsed = time.perf_counter() - request_started
+            with lock:
+                statuses[status] = statuses.get(status, 0) + 1
+                if status == 200:
+                    latencies.append(elapsed)
+
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        list(pool.map(worker, range(concurrency)))
+
+    latencies.sort()
+    total = sum(statuses.values())
+    typer.echo(f"Requests:    {total:,} in {duration:.0f}s ({total / duration:,.1f} req/s)")
+    typer.echo(f"Succeeded:   {len(latencies):,} ({len(latencies) / duration:,.1f} req/s)")
+    typer.echo("Statuses:    " + ", ".join(f"{status}={count}" for status, count in sorted(statuses.items(), key=str)))
+    for label, fraction in [("p50", 0.5), ("p95", 0.95), ("p99", 0.99)]:
+        typer.echo(f"Latency {label}: {_percentile(latencies, fraction) * 1000:.1f} ms")
+
+
+if __name__ == "__main__":
+    app()
@@ -0,0 +1,349 @@
+"""Synthetic data generator for scale testing.
+
+Generates referentially consistent users, clients, projects, team members and
+payment transactions shaped exactly like the models in ``models.py`` and loads
+them with parallel, unordered ``insert_many`` batches.
+
+Example:
+    python generate_data.py --users 2000 --clients-per-user 100 --workers 8
+"""
+import os
+import random
+import time
+import uuid
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, as_completed
+from datetime import datetime, timedelta
+from typing import Dict, List
+
+import typer
+from pymongo import MongoClient
+
+from models import (
+    ROLLUP_FIELDS,
+    Client,
+    MemberType,
+    PaymentStatus,
+    PaymentTransaction,
+    PaymentType,
+    Project,
+    ProjectStatus,
+    TeamMember,
+    User,
+)
+
+app = typer.Typer(help="Generate synthetic tenants for local scale testing.")
+
+FIRST_NAMES = [
+    "Ana", "Bruno", "Carla", "David", "Elena", "Filipe", "Grace", "Hugo", "Ines", "Joao",
+    "Karen", "Luis", "Marta", "Nuno", "Olivia", "Pedro", "Rita", "Sofia", "Tiago", "Vera",
+]
+LAST_NAMES = [
+    "Silva", "Santos", "Ferreira", "Pereira", "Oliveira", "Costa", "Rodrigues", "Martins",
+    "Jesus", "Sousa", "Fernandes", "Goncalves", "Gomes", "Lopes", "Marques", "Almeida",
+]
+COMPANY_WORDS = [
+    "Acme", "Globex", "Initech", "Umbrella", "Stark", "Wayne", "Hooli", "Vandelay",
+    "Soylent", "Tyrell", "Cyberdyne", "Aperture", "Wonka", "Monarch", "Oscorp",
+]
+COMPANY_SUFFIXES = ["Corp", "Ltd", "Labs", "Group", "Studio", "Partners", "Holdings"]
+PROJECT_ADJECTIVES = ["New", "Redesigned", "Mobile", "Internal", "Customer", "Global", "Legacy"]
+PROJECT_NOUNS = ["Website", "App", "Dashboard", "Campaign", "Platform", "Portal", "Migration"]
+ROLES = ["Developer", "Designer", "Project Manager", "QA Engineer", "Copywriter", "DevOps"]
+CURRENCIES = ["usd", "usd", "usd", "eur", "gbp"]
+
+# Completed payments dominate real tenants; the rest exercise the other states.
+PAYMENT_STATUS_WEIGHTS = [
+    (PaymentStatus.COMPLETED, 0.8),
+    (PaymentStatus.PENDING, 0.1),
+    (PaymentStatus.FAILED, 0.05),
+    (PaymentStatus.CANCELLED, 0.05),
+]
+PROJECT_STATUS_WEIGHTS = [
+    (ProjectStatus.ACTIVE, 0.5),
+    (ProjectStatus.COMPLETED, 0.35),
+    (ProjectStatus.ON_HOLD, 0.1),
+    (ProjectStatus.CANCELLED, 0.05),
+]
+
+
+def _weighted(rng: random.Random, choices):
+    values, weights = zip(*choices)
+    return rng.choices(values, weights=weights)[0].value
+
+
+def _uuid(rng: random.Random) -> str:
+    # Derived from the seeded RNG so a given seed always produces the same ids
+    return str(uuid.UUID(int=rng.getrandbits(128), version=4))
+
+
+def _timestamp(rng: random.Random, now: datetime, days: int) -> str:
+    return (now - timedelta(seconds=rng.random() * days * 86400)).isoformat()
+
+
+def _user_multipliers(users: int, skew: float) -> List[float]:
+    """Zipf-like size multipliers with a mean of 1.0 (``skew=0`` is uniform)."""
+    weights = [1.0 / (rank + 1) ** skew for rank in range(users)]
+    mean = sum(weights) / users
+    return [weight / mean for weight in weights]
+
+
+def _scaled(rng: random.Random, average: float, multiplier: float) -> int:
+    # Jitter by +/-50% around the skewed average so tenants are not identical
+    return max(1, int(round(average * multiplier * (0.5 + rng.random()))))
+
+
+def generate_user(user_index: int, multiplier: float, options: Dict[str, object]) -> Dict[str, List[dict]]:
+    """Build every document for one synthetic user.
+
+    Each user gets its own RNG derived from the seed, so output is identical
+    regardless of worker count or scheduling order.
+    """
+    rng = random.Random(f"{options['seed']}:{user_index}")
+    now = options["now"]
+    days = options["days"]
+    user_id = f"{options['user_prefix']}_{user_index:07d}"
+
+    created_at = _timestamp(rng, now, days)
+    user = {
+        "id": user_id,
+        "email": f"{user_id}@example.com",
+        "name": f"{rng.choice(FIRST_NAMES)} {rng.choice(LAST_NAMES)}",
+        "profile_picture": None,
+        "theme": "light",
+        "created_at": created_at,
+        "updated_at": created_at,
+    }
+
+    team_members = []
+    for _ in range(_scaled(rng, options["team_members_per_user"], multiplier)):
+        first, last = rng.choice(FIRST_NAMES), rng.choice(LAST_NAMES)
+        created_at = _timestamp(rng, now, days)
+        member_type = rng.choice([MemberType.INTERNAL, MemberType.FREELANCER]).value
+        team_members.append({
+            "id": _uuid(rng),
+            "user_id": user_id,
+            "name": f"{first} {last}",
+            "email": f"{first}.{last}.{rng.randrange(10**6)}@example.com".lower(),
+            "phone": None,
+            "role": rng.choice(ROLES),
+            "member_type": member_type,
+            "hourly_rate": round(rng.uniform(20, 150), 2) if member_type == MemberType.FREELANCER.value else None,
+            "created_at": created_at,
+            "updated_at": created_at,
+        })
+
+    clients, projects, payments = [], [], []
+    for _ in range(_scaled(rng, options["clients_per_user"], multiplier)):
+        company = f"{rng.choice(COMPANY_WORDS)} {rng.choice(COMPANY_SUFFIXES)}"
+        first, last = rng.choice(FIRST_NAMES), rng.choice(LAST_NAMES)
+        created_at = _timestamp(rng, now, days)
+        client = {
+            "id": _uuid(rng),
+            "user_id": user_id,
+            "name": f"{first} {last}",
+            "email": f"{first}.{last}.{rng.randrange(10**6)}@example.com".lower(),
+            "phone": None,
+            "company": company,
+            "address": None,
+            "created_at": created_at,
+            "updated_at": created_at,
+        }
+        clients.append(client)
+
+        for _ in range(_scaled(rng, options["projects_per_client"], 1.0)):
+            created_at = _timestamp(rng, now, days)
+            budget = round(rng.uniform(1_000, 100_000), 2)
+            project = {
+                "id": _uuid(rng),
+                "user_id": user_id,
+                "name": f"{company} {rng.choice(PROJECT_ADJECTIVES)} {rng.choice(PROJECT_NOUNS)}",
+                "description": None,
+                "client_id": client["id"],
+                "client_name": client["name"],
+                "status": _weighted(rng, PROJECT_STATUS_WEIGHTS),
+                "budget": budget,
+                "start_date": created_at,
+                "end_date": None,
+                "created_at": created_at,
+                "updated_at": created_at,
+            }
+            projects.append(project)
+
+            for _ in range(_scaled(rng, options["payments_per_project"], 1.0)):
+                created_at = _timestamp(rng, now, days)
+                received = rng.random() < 0.6
+                member = rng.choice(team_members)
+                payments.append({
+                    "id": _uuid(rng),
+                    "user_id": user_id,
+                    "payment_type": (PaymentType.RECEIVED if received else PaymentType.SENT).value,
+                    "amount": round(rng.uniform(0.01, 0.2) * budget, 2),
+                    "currency": rng.choice(CURRENCIES),
+                    "description": None,
+                    "client_id": client["id"] if received else None,
+                    "team_member_id": None if received else member["id"],
+                    "project_id": project["id"],
+                    "client_name": client["name"] if received else None,
+                    "team_member_name": None if received else member["name"],
+                    "project_name": project["name"],
+                    "stripe_session_id": None,
+                    "payment_status": _weighted(rng, PAYMENT_STATUS_WEIGHTS),
+                    "created_at": created_at,
+                    "updated_at": created_at,
+                })
+
+    return {
+        "users": [user],
+        "payment_rollups": _rollups(user_id, payments),
+        "clients": clients,
+        "projects": projects,
+        "team_members": team_members,
+        "payment_transactions": payments,
+    }
+
+
+def _rollups(user_id: str, payments: List[dict]) -> List[dict]:
+    """Daily rollups for the generated payments, matching ``record_payment_rollup``."""
+    rollups: Dict[tuple, dict] = {}
+    for payment in payments:
+        if payment["payment_status"] != PaymentStatus.COMPLETED.value:
+            continue
+        key = (payment["created_at"][:10], payment["currency"])
+        rollup = rollups.get(key)
+        if rollup is None:
+            rollup = rollups[key] = {"user_id": user_id, "day": key[0], "currency": key[1], **dict.fromkeys(ROLLUP_FIELDS, 0)}
+        field = payment["payment_type"]
+        rollup[field] += payment["amount"]
+        rollup[f"{field}_count"] += 1
+    return list(rollups.values())
+
+
+def _check_schema(sample: Dict[str, List[dict]]) -> None:
+    """Fail fast if generated documents drift from the API models."""
+    models = {
+        "users": User,
+        "clients": Client,
+        "projects": Project,
+        "team_members": TeamMember,
+        "payment_transactions": PaymentTransaction,
+    }
+    for collection, model in models.items():
+        document = sample[collection][0]
+        expected = set(model(**document).dict())
+        if set(document) != expected:
+            raise typer.BadParameter(
+                f"{collection} documents do not match {model.__name__}: "
+                f"missing={sorted(expected - set(document))} extra={sorted(set(document) - expected)}"
+            )
+
+
+def load_users(user_indexes: List[int], multipliers: List[float], options: Dict[str, object]) -> Dict[str, int]:
+    """Generate and insert a shard of users; runs inside a worker process."""
+    mongo = MongoClient(options["mongo_url"], maxPoolSize=options["insert_threads"] + 1)
+    db = mongo[options["db_name"]]
+    batch_size = options["batch_size"]
+    buffers: Dict[str, List[dict]] = {}
+    counts: Dict[str, int] = {}
+    pending = []
+
+    with ThreadPoolExecutor(max_workers=options["insert_threads"]) as pool:
+        def flush(collection: str) -> None:
+            batch = buffers.pop(collection, [])
+            if not batch:
+                return
+            # Bound in-flight batches so generation cannot outrun the database
+            while len(pending) >= options["insert_threads"] * 2:
+                pending.pop(0).result()
+            pending.append(pool.submit(db[collection].insert_many, batch, ordered=False))
+            counts[collection] = counts.get(collection, 0) + len(batch)
+
+        for user_index, multiplier in zip(user_indexes, multipliers):
+            for collection, documents in generate_user(user_index, multiplier, options).items():
+                buffer = buffers.setdefault(collection, [])
+                buffer.extend(documents)
+                if len(buffer) >= batch_size:
+                    flush(collection)
+        for collection in list(buffers):
+            flush(collection)
+        for future in pending:
+            future.result()
+
+    mongo.close()
+    return counts
+
+
+@app.command()
+def generate(
+    users: int = typer.Option(100, help="Number of synthetic users (tenants)."),
+    clients_per_user: float = typer.Option(50, help="Average clients per user."),
+    projects_per_client: float = typer.Option(2, help="Average projects per client."),
+    team_members_per_user: float = typer.Option(10, help="Average team members per user."),
+    payments_per_project: float = typer.Option(10, help="Average payment transactions per project."),
+    skew: float = typer.Option(1.0, help="Zipf exponent for tenant sizes; 0 makes every tenant the same size."),
+    seed: int = typer.Option(42, help="Seed for reproducible output."),
+    days: int = typer.Option(730, help="Spread created_at timestamps over this many past days."),
+    batch_size: int = typer.Option(5000, help="Documents per insert_many batch."),
+    workers: int = typer.Option(os.cpu_count() or 1, help="Generator processes."),
+    insert_threads: int = typer.Option(4, help="Concurrent insert_many batches per process."),
+    user_prefix: str = typer.Option("synthetic_user", help="Prefix for generated user ids."),
+    drop: bool = typer.Option(False, help="Delete previously generated data with the same prefix first; needed when any exists."),
+    mongo_url: str = typer.Option(os.environ.get("MONGO_URL", "mongodb://localhost:27017"), help="MongoDB URL."),
+    db_name: str = typer.Option(os.environ.get("DB_NAME", "test_database"), help="Database name."),
+):
+    """Generate and load synthetic tenants."""
+    multipliers = _user_multipliers(users, skew)
+    options = {
+        "seed": seed,
+        "now": datetime.utcnow(),
+        "days": days,
+        "user_prefix": user_prefix,
+        "clients_per_user": clients_per_user,
+        "projects_per_client": projects_per_client,
+        "team_members_per_user": team_members_per_user,
+        "payments_per_project": payments_per_project,
+        "batch_size": batch_size,
+        "insert_threads": insert_threads,
+        "mongo_url": mongo_url,
+        "db_name": db_name,
+    }
+    _check_schema(generate_user(0, multipliers[0], options))
+
+    # Ids are derived from the seed, so loading over earlier output would hit
+    # the unique indexes partway through and leave a partial dataset
+    mongo = MongoClient(mongo_url)
+    db = mongo[db_name]
+    prefix_filters = {"users": {"id": {"$regex": f"^{user_prefix}_"}}}
+    for collection in ["clients", "projects", "team_members", "payment_transactions", "payment_rollups"]:
+        prefix_filters[collection] = {"user_id": {"$regex": f"^{user_prefix}_"}}
+    if drop:
+        for collection, prefix_filter in prefix_filters.items():
+            db[collection].delete_many(prefix_filter)
+    elif any(db[collection].find_one(prefix_filter, {"_id": 1}) for collection, prefix_filter in prefix_filters.items()):
+        raise typer.BadParameter(
+            f"{db_name} already has data for --user-prefix {user_prefix}; pass --drop to replace it or pick another prefix"
+        )
+    mongo.close()
+
+    # Interleave users across shards so large (low-rank) tenants are spread out
+    shards = [list(range(worker, users, workers)) for worker in range(workers)]
+    totals: Dict[str, int] = {}
+    started = time.perf_counter()
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        futures = [
+            pool.submit(load_users, shard, [multipliers[i] for i in shard], options)
+            for shard in shards if shard
+        ]
+        for future in as_completed(futures):
+            for collection, count in future.result().items():
+                totals[collection] = totals.get(collection, 0) + count
+            typer.echo(f"shard done: {sum(totals.values()):,} documents so far")
+
+    elapsed = time.perf_counter() - started
+    total = sum(totals.values())
+    for collection, count in sorted(totals.items()):
+        typer.echo(f"{collection}: {count:,}")
+    typer.echo(f"Loaded {total:,} documents in {elapsed:.1f}s ({total / max(elapsed, 1e-9):,.0f} docs/s)")
+
+
+if __name__ == "__main__":
+    app()
@@ -0,0 +1,128 @@
+"""Shapes of the documents the API stores.
+
+Kept apart from ``server`` so tools such as ``generate_data.py`` can build
+and check documents without importing the app, which connects to the
+database on import.
+"""
+import uuid
+from datetime import datetime
+from enum import Enum
+from typing import Any, Dict, List, Optional
+
+from pydantic import BaseModel, Field
+
+
+class ProjectStatus(str, Enum):
+    ACTIVE = "active"
+    COMPLETED = "completed"
+    ON_HOLD = "on_hold"
+    CANCELLED = "cancelled"
+
+class PaymentStatus(str, Enum):
+    PENDING = "pending"
+    COMPLETED = "completed"
+    FAILED = "failed"
+    CANCELLED = "cancelled"
+
+class PaymentType(str, Enum):
+    RECEIVED = "received"
+    SENT = "sent"
+
+class MemberType(str, Enum):
+    INTERNAL = "internal"
+    FREELANCER = "freelancer"
+
+class IntegrationType(str, Enum):
+    STRIPE = "stripe"
+    GMAIL = "gmail"
+    GOOGLE_CALENDAR = "google_calendar"
+
+class User(BaseModel):
+    id: str = Field(default_factory=lambda: str(uuid.uuid4()))
+    email: str
+    name: str
+    profile_picture: Optional[str] = None
+    theme: str = "light"
+    created_at: datetime = Field(default_factory=datetime.utcnow)
+    updated_at: datetime = Field(default_factory=datetime.utcnow)
+
+class Integration(BaseModel):
+    id: str = Field(default_factory=lambda: str(uuid.uuid4()))
+    user_id: str
+    integration_type: IntegrationType
+    is_connected: bool = False
+    credentials: Dict[str, Any] = {}
+    settings: Dict[str, Any] = {}
+    created_at: datetime = Field(default_factory=datetime.utcnow)
+    updated_at: datetime = Field(default_factory=datetime.utcnow)
+
+class Client(BaseModel):
+    id: str = Field(default_factory=lambda: str(uuid.uuid4()))
+    user_id: str
+    name: str
+    email: str
+    phone: Optional[str] = None
+    company: Optional[str] = None
+    address: Optional[str] = None
+    created_at: datetime = Field(default_factory=datetime.utcnow)
+    updated_at: datetime = Field(default_factory=datetime.utcnow)
+
+class Project(BaseModel):
+    id: str = Field(default_factory=lambda: str(uuid.uuid4()))
+    user_id: str
+    name: str
+    description: Optional[str] = None
+    client_id: str
+    # Denormalized copy of the client's name, kept current on rename
+    client_name: Optional[str] = None
+    status: ProjectStatus = ProjectStatus.ACTIVE
+    budget: Optional[float] = None
+    start_date: Optional[datetime] = None
+    end_date: Optional[datetime] = None
+    created_at: datetime = Field(default_factory=datetime.utcnow)
+    updated_at: datetime = Field(default_factory=datetime.utcnow)
+
+class TeamMember(BaseModel):
+    id: str = Field(default_factory=lambda: str(uuid.uuid4()))
+    user_id: str
+    name: str
+    email: str
+    phone: Optional[str] = None
+    role: str
+    member_type: MemberType
+    hourly_rate: Optional[float] = None
+    created_at: datetime = Field(default_factory=datetime.utcnow)
+    updated_at: datetime = Field(default_factory=datetime.utcnow)
+
+class PaymentTransaction(BaseModel):
+    id: str = Field(default_factory=lambda: str(uuid.uuid4()))
+    user_id: str
+    payment_type: PaymentType
+    amount: float
+    currency: str = "usd"
+    description: Optional[str] = None
+    client_id: Optional[str] = None
+    team_member_id: Optional[str] = None
+    project_id: Optional[str] = None
+    # Denormalized copies of the referenced names, kept current on rename
+    client_name: Optional[str] = None
+    team_member_name: Optional[str] = None
+    project_name: Optional[str] = None
+    stripe_session_id: Optional[str] = None
+    payment_status: PaymentStatus = PaymentStatus.PENDING
+    created_at: datetime = Field(default_factory=datetime.utcnow)
+    updated_at: datetime = Field(default_factory=datetime.utcnow)
+
+class CalendarEvent(BaseModel):
+    id: str = Field(default_factory=lambda: str(uuid.uuid4()))
+    user_id: str
+    title: str
+    description: Optional[str] = None
+    start_time: datetime
+    end_time: datetime
+    attendees: List[str] = []
+    google_event_id: Optional[str] = None
+    created_at: datetime = Field(default_factory=datetime.utcnow)
+
+# Fields of a payment_rollups document besides user_id, day and currency
+ROLLUP_FIELDS = ["received", "sent", "received_count", "sent_count"]
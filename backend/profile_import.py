@@ -0,0 +1,53 @@
+"""Import-time profile of ``server.py``.
+
+Imports the module in a fresh interpreter under ``python -X importtime``
+and lists the slowest imports, so anything that creeps back into the cold
+start path shows up here.
+
+Example:
+    python profile_import.py --top 15
+"""
+import os
+import subprocess
+import sys
+
+import typer
+
+app = typer.Typer(help="Show what importing server.py spends its time on.")
+
+
+@app.command()
+def profile(
+    module: str = typer.Option("server", help="Module to import."),
+    top: int = typer.Option(20, help="Number of imports to list."),
+):
+    """Print the slowest imports by cumulative time."""
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        cwd=os.path.dirname(os.path.abspath(__file__)),
+        capture_output=True,
+        text=True,
+    )
+    if result.returncode != 0:
+        typer.echo(result.stderr.splitlines()[-1] if result.stderr else "Import failed", err=True)
+        raise typer.Exit(result.returncode)
+
+    # Lines look like "import time:       self [us] |  cumulative | imported package"
+    timings = []
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:"):
+            continue
+        fields = [field.strip() for field in line[len("import time:"):].split("|")]
+        if not fields[0].isdigit():
+            continue
+        timings.append((int(fields[1]), int(fields[0]), fields[2]))
+
+    total = next(cumulative for cumulative, _, name in timings if name == module)
+    typer.echo(f"Importing {module} took {total / 1000:.1f} ms")
+    typer.echo(f"{'cumulative ms':>14} {'self ms':>9}  module")
+    for cumulative, own, name in sorted(timings, reverse=True)[:top]:
+        typer.echo(f"{cumulative / 1000:>14.1f} {own / 1000:>9.1f}  {name}")
+
+
+if __name__ == "__main__":
+    app()
@@ -0,0 +1,148 @@
+"""Rendering for background job output.
+
+Functions here run in the job runner's process pool, so they take and
+return plain data, never touch the database, and this module must stay
+cheap to import in a freshly spawned process.
+"""
+import csv
+import io
+import json
+import zipfile
+import zlib
+
+# Bump whenever the statement layout changes so cached PDFs are re-rendered
+STATEMENT_LAYOUT_VERSION = 1
+
+PAGE_WIDTH, PAGE_HEIGHT = 595, 842  # A4 in points
+MARGIN = 50
+LINE_HEIGHT = 15
+REGULAR, BOLD = "F1", "F2"
+
+
+def render_json(data):
+    return json.dumps(data, default=str, separators=(",", ":")).encode()
+
+
+def render_csv(columns, rows):
+    buffer = io.StringIO()
+    writer = csv.DictWriter(buffer, fieldnames=columns, extrasaction="ignore")
+    writer.writeheader()
+    writer.writerows(rows)
+    return buffer.getvalue().encode()
+
+
+def render_zip(files):
+    """Bundle (name, bytes) pairs; PDFs are already compressed, so they are stored as is"""
+    buffer = io.BytesIO()
+    with zipfile.ZipFile(buffer, "w", zipfile.ZIP_STORED) as archive:
+        for name, data in files:
+            archive.writestr(name, data)
+    return buffer.getvalue()
+
+
+def pdf_string(value, max_chars=None):
+    text = "" if value is None else str(value)
+    if max_chars and len(text) > max_chars:
+        text = text[:max_chars - 3] + "..."
+    # The standard fonts only cover Latin-1; anything else prints as "?"
+    text = text.encode("latin-1", "replace").decode("latin-1")
+    return "(" + text.replace("\\", "\\\\").replace("(", "\\(").replace(")", "\\)") + ")"
+
+
+def render_pdf(lines):
+    """Lay out lines of text on as many A4 pages as needed.
+
+    Each line is (font, size, [(x, text, max_chars), ...]); a line of None
+    leaves a blank line. Only the built-in Helvetica fonts are used, so no
+    font data is embedded and a statement stays a few kilobytes.
+    """
+    pages = [[]]
+    y = PAGE_HEIGHT - MARGIN
+    for line in lines:
+        if y < MARGIN:
+            pages.append([])
+            y = PAGE_HEIGHT - MARGIN
+        if line is not None:
+            font, size, cells = line
+            for x, text, max_chars in cells:
+                pages[-1].append(f"BT /{font} {size} Tf {x} {y} Td {pdf_string(text, max_chars)} Tj ET")
+        y -= LINE_HEIGHT
+
+    # Objects 1-4 are fixed; each page then adds a page object and its content stream
+    objects = [
+        b"<< /Type /Catalog /Pages 2 0 R >>",
+        None,  # page tree, filled in once the page objects are numbered
+        b"<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica /Encoding /WinAnsiEncoding >>",
+        b"<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica-Bold /Encoding /WinAnsiEncoding >>",
+    ]
+    page_refs = []
+    for number, commands in enumerate(pages, start=1):
+        footer = f"BT /{REGULAR} 8 Tf {MARGIN} {MARGIN / 2} Td (Page {number} of {len(pages)}) Tj ET"
+        stream = zlib.compress("\n".join(commands + [footer]).encode("latin-1"))
+        page_id = len(objects) + 1
+        page_refs.append(f"{page_id} 0 R")
+        objects.append(
+            f"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 {PAGE_WIDTH} {PAGE_HEIGHT}] "
+            f"/Resources << /Font << /{REGULAR} 3 0 R /{BOLD} 4 0 R >> >> /Contents {page_id + 1} 0 R >>".encode()
+        )
+        objects.append(
+            f"<< /Length {len(stream)} /Filter /FlateDecode >>\nstream\n".encode() + stream + b"\nendstream"
+        )
+    objects[1] = f"<< /Type /Pages /Kids [{' '.join(page_refs)}] /Count {len(pages)} >>".encode()
+
+    output = io.BytesIO()
+    output.write(b"%PDF-1.4\n%\xe2\xe3\xcf\xd3\n")
+    offsets = []
+    for number, body in enumerate(objects, start=1):
+        offsets.append(output.tell())
+        output.write(f"{number} 0 obj\n".encode() + body + b"\nendobj\n")
+    xref = output.tell()
+    output.write(f"xref\n0 {len(objects) + 1}\n0000000000 65535 f \n".encode())
+    for offset in offsets:
+        output.write(f"{offset:010d} 00000 n \n".encode())
+    output.write(f"trailer\n<< /Size {len(objects) + 1} /Root 1 0 R >>\nstartxref\n{xref}\n%%EOF\n".encode())
+    return output.getvalue()
+
+
+def format_amount(amount, currency):
+    return f"{amount:,.2f} {currency.upper()}"
+
+
+def render_statement_pdf(statement):
+    """A client's monthly statement: their projects and the payments received"""
+    client = statement["client"]
+    lines = [
+        (BOLD, 18, [(MARGIN, f"Statement for {statement['month']}", None)]),
+        None,
+        (BOLD, 11, [(MARGIN, client["name"], 80)]),
+    ]
+    for detail in [client.get("company"), client.get("email")]:
+        if detail:
+            lines.append((REGULAR, 10, [(MARGIN, detail, 90)]))
+    lines += [None, (BOLD, 12, [(MARGIN, "Projects", None)])]
+    lines.append((BOLD, 9, [(MARGIN, "Name", None), (330, "Status", None), (430, "Budget", None)]))
+    for project in statement["projects"]:
+        budget = project.get("budget")
+        lines.append((REGULAR, 9, [
+            (MARGIN, project["name"], 55),
+            (330, str(project.get("status") or "").replace("_", " "), 18),
+            (430, "" if budget is None else f"{budget:,.2f}", None),
+        ]))
+    if not statement["projects"]:
+        lines.append((REGULAR, 9, [(MARGIN, "No projects", None)]))
+
+    lines += [None, (BOLD, 12, [(MARGIN, "Payments received", None)])]
+    lines.append((BOLD, 9, [(MARGIN, "Date", None), (120, "Description", None), (330, "Project", None), (460, "Amount", None)]))
+    for payment in statement["payments"]:
+        lines.append((REGULAR, 9, [
+            (MARGIN, payment["date"], None),
+            (120, payment.get("description"), 40),
+            (330, payment.get("project_name"), 24),
+            (460, format_amount(payment["amount"], payment["currency"]), None),
+        ]))
+    if not statement["payments"]:
+        lines.append((REGULAR, 9, [(MARGIN, "No payments received this month", None)]))
+    lines.append(None)
+    for total in statement["totals"]:
+        lines.append((BOLD, 10, [(330, "Total received", None), (460, format_amount(total["amount"], total["currency"]), None)]))
+    return render_pdf(lines)
@@ -0,0 +1,83 @@
+"""Production entry point for the API.
+
+Runs ``server:app`` under uvicorn with several worker processes, the uvloop
+event loop and the httptools parser (both picked automatically when
+installed). Each worker opens its own MongoClient, so a total connection
+budget passed with ``--mongo-pool-total`` is split between the workers.
+
+Workers share nothing in memory: tokens only verify across workers with a
+shared ``JWT_SECRET``, and the autocomplete and report caches of other
+workers catch up with a write after ``LOCAL_CACHE_TTL_SECONDS``.
+
+Example:
+    JWT_SECRET=change-me python serve.py --workers 4 --mongo-pool-total 200
+
+Use ``benchmark.py`` to compare this against ``python server.py``.
+"""
+import os
+from enum import Enum
+
+import typer
+import uvicorn
+
+app = typer.Typer(help="Serve the API with production settings.")
+
+
+class Loop(str, Enum):
+    AUTO = "auto"
+    UVLOOP = "uvloop"
+    ASYNCIO = "asyncio"
+
+
+class Http(str, Enum):
+    AUTO = "auto"
+    HTTPTOOLS = "httptools"
+    H11 = "h11"
+
+
+@app.command()
+def serve(
+    host: str = typer.Option("0.0.0.0", help="Interface to bind."),
+    port: int = typer.Option(8001, help="Port to bind."),
+    workers: int = typer.Option(1, help="Worker processes; more than one needs JWT_SECRET."),
+    loop: Loop = typer.Option(Loop.AUTO, help="Event loop; auto uses uvloop when it is installed."),
+    http: Http = typer.Option(Http.AUTO, help="HTTP parser; auto uses httptools when it is installed."),
+    backlog: int = typer.Option(2048, help="Pending connections the kernel queues before refusing new ones."),
+    keep_alive: int = typer.Option(
+        75, help="Seconds an idle connection stays open; keep it above the load balancer's idle timeout."
+    ),
+    graceful_timeout: int = typer.Option(30, help="Seconds in-flight requests get to finish on shutdown."),
+    mongo_pool_total: int = typer.Option(
+        0, help="Mongo connections shared by all workers; 0 leaves MONGO_MAX_POOL_SIZE per worker as is."
+    ),
+    access_log: bool = typer.Option(False, help="Log every request; costs throughput under load."),
+):
+    """Start the API."""
+    if workers > 1 and not os.environ.get("JWT_SECRET"):
+        # Each worker would sign tokens with its own random key and reject the others'
+        typer.echo("JWT_SECRET must be set to run more than one worker", err=True)
+        raise typer.Exit(1)
+    if mongo_pool_total:
+        # Workers inherit the environment, so each one sizes its own pool from it
+        os.environ["MONGO_MAX_POOL_SIZE"] = str(max(1, mongo_pool_total // workers))
+    typer.echo(
+        f"Starting {workers} workers on {host}:{port} "
+        f"(Mongo pool per worker: {os.environ.get('MONGO_MAX_POOL_SIZE', 'default')})"
+    )
+    uvicorn.run(
+        "server:app",
+        app_dir=os.path.dirname(os.path.abspath(__file__)),
+        host=host,
+        port=port,
+        workers=workers,
+        loop=loop.value,
+        http=http.value,
+        backlog=backlog,
+        timeout_keep_alive=keep_alive,
+        timeout_graceful_shutdown=graceful_timeout,
+        access_log=access_log,
+    )
+
+
+if __name__ == "__main__":
+    app()
@@ -1,34 +1,207 @@
-from fastapi import FastAPI, HTTPException, Depends, Request
+from fastapi import FastAPI, HTTPException, Depends, Header, Request, Query, BackgroundTasks
 from fastapi.middleware.cors import CORSMiddleware
-from pydantic import BaseModel, Field
+from fastapi.responses import JSONResponse, Response, StreamingResponse
+from fastapi.security import HTTPAuthorizationCredentials, HTTPBearer
+from pydantic import BaseModel, Field, ValidationError
 from typing import List, Optional, Dict, Any
-from datetime import datetime, timedelta
+from datetime import date, datetime, timedelta
+import gridfs
 import pymongo
-from pymongo import MongoClient
+from pymongo import ReplaceOne, ReturnDocument, UpdateOne, monitoring
 import os
 import uuid
+import asyncio
+import logging
+import multiprocessing
+import socket
+import threading
 from enum import Enum
 import json
+import base64
+import cProfile
+import hashlib
+import importlib
+import re
+import secrets
+import time
+import jwt
+from bisect import bisect_left, insort
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from contextlib import asynccontextmanager
+from types import SimpleNamespace
+from urllib.parse import parse_qs
 
-# Import Stripe integration
-from emergentintegrations.payments.stripe.checkout import StripeCheckout, CheckoutSessionResponse, CheckoutStatusResponse, CheckoutSessionRequest
+import renderers
+import storage
+from models import (
+    ROLLUP_FIELDS,
+    Client,
+    Integration,
+    IntegrationType,
+    MemberType,
+    PaymentStatus,
+    PaymentTransaction,
+    PaymentType,
+    Project,
+    ProjectStatus,
+    TeamMember,
+    User,
+)
 
-app = FastAPI(title="Business Management API", version="1.0.0")
+logger = logging.getLogger(__name__)
 
-# CORS middleware
-app.add_middleware(
-    CORSMiddleware,
-    allow_origins=["*"],
-    allow_credentials=True,
-    allow_methods=["*"],
-    allow_headers=["*"],
-)
+@asynccontextmanager
+async def lifespan(app):
+    """Accept requests at once and warm up pools, indexes and Stripe in the background.
+
+    /api/health/ready turns healthy once the warm-up has finished.
+    """
+    if STORAGE_BACKEND == "memory":
+        logger.warning("Using the in-memory storage backend; data is lost when this process exits")
+    activity_log.start()
+    background_tasks.append(asyncio.create_task(warm_up()))
+    yield
+    change_stream_stop.set()
+    for task in background_tasks:
+        task.cancel()
+    await job_runner.close()
+    await activity_log.close()
+    client.close()
+
+app = FastAPI(title="Business Management API", version="1.0.0", lifespan=lifespan)
 
 # MongoDB connection
 MONGO_URL = os.environ.get("MONGO_URL", "mongodb://localhost:27017")
 DB_NAME = os.environ.get("DB_NAME", "test_database")
+# "mongo", or "memory" for an in-process store that is lost on exit (see storage.py)
+STORAGE_BACKEND = os.environ.get("STORAGE_BACKEND", "mongo")
+
+# Pool settings are per process; serve.py divides a total budget between its workers
+MONGO_MAX_POOL_SIZE = int(os.environ.get("MONGO_MAX_POOL_SIZE", "100"))
+MONGO_MIN_POOL_SIZE = int(os.environ.get("MONGO_MIN_POOL_SIZE", "0"))
+# How long a request waits for a free connection before failing; unset waits forever
+MONGO_WAIT_QUEUE_TIMEOUT_MS = int(os.environ["MONGO_WAIT_QUEUE_TIMEOUT_MS"]) if os.environ.get("MONGO_WAIT_QUEUE_TIMEOUT_MS") else None
+# e.g. "zstd,snappy,zlib"; compressors whose library is missing are skipped with a warning
+MONGO_COMPRESSORS = os.environ.get("MONGO_COMPRESSORS") or None
+
+class PoolStats(monitoring.ConnectionPoolListener):
+    """Connection pool counters per server, fed by pymongo's monitoring events"""
+
+    # Upper bounds (ms) of the checkout wait histogram buckets
+    WAIT_BUCKETS_MS = [1, 5, 10, 50, 100, 500, 1000]
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._pools = {}
+        # Checkout start and finish are reported on the requesting thread
+        self._checkout_started = threading.local()
+
+    def _pool(self, address):
+        key = f"{address[0]}:{address[1]}"
+        if key not in self._pools:
+            self._pools[key] = {
+                "open": 0,
+                "in_use": 0,
+                "checkouts": 0,
+                "checkout_failures": 0,
+                "timeouts": 0,
+                "cleared": 0,
+                "total_wait_ms": 0.0,
+                "max_wait_ms": 0.0,
+                "wait_histogram": [0] * (len(self.WAIT_BUCKETS_MS) + 1),
+            }
+        return self._pools[key]
+
+    def _finish_wait(self, pool):
+        started = getattr(self._checkout_started, "value", None)
+        if started is None:
+            return
+        self._checkout_started.value = None
+        wait_ms = (time.perf_counter() - started) * 1000
+        pool["total_wait_ms"] += wait_ms
+        pool["max_wait_ms"] = max(pool["max_wait_ms"], wait_ms)
+        pool["wait_histogram"][bisect_left(self.WAIT_BUCKETS_MS, wait_ms)] += 1
+
+    def connection_check_out_started(self, event):
+        self._checkout_started.value = time.perf_counter()
+
+    def connection_checked_out(self, event):
+        with self._lock:
+            pool = self._pool(event.address)
+            pool["checkouts"] += 1
+            pool["in_use"] += 1
+            self._finish_wait(pool)
 
-client = MongoClient(MONGO_URL)
+    def connection_check_out_failed(self, event):
+        with self._lock:
+            pool = self._pool(event.address)
+            pool["checkout_failures"] += 1
+            if event.reason == monitoring.ConnectionCheckOutFailedReason.TIMEOUT:
+                pool["timeouts"] += 1
+            self._finish_wait(pool)
+
+    def connection_checked_in(self, event):
+        with self._lock:
+            self._pool(event.address)["in_use"] -= 1
+
+    def connection_created(self, event):
+        with self._lock:
+            self._pool(event.address)["open"] += 1
+
+    def connection_closed(self, event):
+        with self._lock:
+            self._pool(event.address)["open"] -= 1
+
+    def pool_cleared(self, event):
+        with self._lock:
+            self._pool(event.address)["cleared"] += 1
+
+    def connection_ready(self, event):
+        pass
+
+    def pool_created(self, event):
+        pass
+
+    def pool_ready(self, event):
+        pass
+
+    def pool_closed(self, event):
+        pass
+
+    def snapshot(self):
+        with self._lock:
+            pools = {}
+            for address, pool in self._pools.items():
+                waits = sum(pool["wait_histogram"])
+                pools[address] = {
+                    **pool,
+                    "available": pool["open"] - pool["in_use"],
+                    "mean_wait_ms": round(pool["total_wait_ms"] / waits, 3) if waits else 0.0,
+                    "total_wait_ms": round(pool["total_wait_ms"], 3),
+                    "max_wait_ms": round(pool["max_wait_ms"], 3),
+                    "wait_histogram": dict(zip(
+                        [f"<={bound}ms" for bound in self.WAIT_BUCKETS_MS] + [f">{self.WAIT_BUCKETS_MS[-1]}ms"],
+                        pool["wait_histogram"],
+                    )),
+                }
+            return pools
+
+pool_stats = PoolStats()
+
+# connect=False: no connections or monitor threads until first use
+client = storage.open_client(
+    STORAGE_BACKEND,
+    MONGO_URL,
+    maxPoolSize=MONGO_MAX_POOL_SIZE,
+    minPoolSize=MONGO_MIN_POOL_SIZE,
+    waitQueueTimeoutMS=MONGO_WAIT_QUEUE_TIMEOUT_MS,
+    event_listeners=[pool_stats],
+    connect=False,
+    # pymongo rejects compressors=None, so the option is only passed when set
+    **({"compressors": MONGO_COMPRESSORS} if MONGO_COMPRESSORS else {}),
+)
 db = client[DB_NAME]
 
 # Collections
@@ -39,146 +212,244 @@ payment_transactions_collection = db["payment_transactions"]
 users_collection = db["users"]
 oauth_tokens_collection = db["oauth_tokens"]
 integrations_collection = db["integrations"]
+payment_rollups_collection = db["payment_rollups"]
+deletions_collection = db["deletions"]
+archived_clients_collection = db["archived_clients"]
+archived_projects_collection = db["archived_projects"]
+payment_archive_collection = db["payment_transactions_archive"]
+revoked_tokens_collection = db["revoked_tokens"]
+auth_state_collection = db["auth_state"]
+activity_collection = db["activity"]
+jobs_collection = db["jobs"]
+# One marker document per one-off data migration
+migrations_collection = db["migrations"]
+# Job output is stored in GridFS under the job's id
+job_results = storage.open_file_store(db, "job_results")
+# Rendered statements are stored under the hash of their content
+statement_files = storage.open_file_store(db, "statements")
+
+# Tombstones for hard deletes are kept this long for /api/sync
+SYNC_TOMBSTONE_TTL_DAYS = int(os.environ.get("SYNC_TOMBSTONE_TTL_DAYS", "30"))
+
+# Indexes
+def create_unique_index(collection, keys, name, **kwargs):
+    # Pre-existing duplicates must not stop the API from starting
+    try:
+        collection.create_index(keys, name=name, unique=True, **kwargs)
+    except pymongo.errors.OperationFailure as e:
+        logger.error("Could not create unique index %s on %s: %s", name, collection.name, e)
+
+def ensure_indexes():
+    """Create the indexes the API relies on (idempotent)"""
+    # Unique keys back the single-round-trip upserts in the write handlers
+    for collection in [clients_collection, projects_collection, team_members_collection, payment_transactions_collection]:
+        create_unique_index(collection, [("user_id", pymongo.ASCENDING), ("id", pymongo.ASCENDING)], "user_id_id")
+    # $lookup joins on the bare id, which the compound key above cannot serve
+    for collection in [clients_collection, projects_collection, team_members_collection]:
+        collection.create_index("id", name="lookup_id")
+    # Rename fan-outs find the copies by the referenced id
+    projects_collection.create_index([("user_id", pymongo.ASCENDING), ("client_id", pymongo.ASCENDING)], name="user_client")
+    # Statements look up one client's payments of one month (projects use user_client)
+    for collection in [payment_transactions_collection, payment_archive_collection]:
+        collection.create_index(
+            [("user_id", pymongo.ASCENDING), ("client_id", pymongo.ASCENDING), ("created_at", pymongo.ASCENDING)],
+            name="statement_lookup",
+        )
+    for field in ["client_id", "team_member_id", "project_id"]:
+        payment_transactions_collection.create_index(
+            [("user_id", pymongo.ASCENDING), (field, pymongo.ASCENDING)], name=f"user_{field}"
+        )
+    create_unique_index(users_collection, "id", "user_id")
+    create_unique_index(users_collection, "email", "user_email")
+    create_unique_index(
+        integrations_collection,
+        [("user_id", pymongo.ASCENDING), ("integration_type", pymongo.ASCENDING)],
+        "user_integration_type",
+    )
+    create_unique_index(
+        payment_transactions_collection,
+        "stripe_session_id",
+        "stripe_session_id",
+        partialFilterExpression={"stripe_session_id": {"$type": "string"}},
+    )
+    # Text indexes are prefixed with user_id so every search is scoped to one
+    # tenant's slice of the index instead of the whole collection
+    clients_collection.create_index(
+        [("user_id", pymongo.ASCENDING), ("name", pymongo.TEXT), ("company", pymongo.TEXT), ("email", pymongo.TEXT)],
+        name="clients_search",
+        weights={"name": 10, "company": 5, "email": 2},
+    )
+    projects_collection.create_index(
+        [("user_id", pymongo.ASCENDING), ("name", pymongo.TEXT), ("description", pymongo.TEXT)],
+        name="projects_search",
+        weights={"name": 10, "description": 2},
+    )
+    team_members_collection.create_index(
+        [("user_id", pymongo.ASCENDING), ("name", pymongo.TEXT), ("role", pymongo.TEXT)],
+        name="team_members_search",
+        weights={"name": 10, "role": 3},
+    )
+    payment_rollups_collection.create_index(
+        [("user_id", pymongo.ASCENDING), ("day", pymongo.ASCENDING), ("currency", pymongo.ASCENDING)],
+        name="payment_rollups_key",
+        unique=True,
+    )
+    for collection in [clients_collection, projects_collection, team_members_collection, payment_transactions_collection]:
+        collection.create_index([("user_id", pymongo.ASCENDING), ("updated_at", pymongo.ASCENDING)], name="sync_updated_at")
+    deletions_collection.create_index([("user_id", pymongo.ASCENDING), ("deleted_at", pymongo.ASCENDING)], name="sync_deleted_at")
+    deletions_collection.create_index(
+        "deleted_at", name="tombstone_ttl", expireAfterSeconds=SYNC_TOMBSTONE_TTL_DAYS * 86400
+    )
+    # The archiver walks settled payments oldest first
+    payment_transactions_collection.create_index(
+        [("payment_status", pymongo.ASCENDING), ("created_at", pymongo.ASCENDING)], name="archive_candidates"
+    )
+    create_unique_index(payment_archive_collection, [("user_id", pymongo.ASCENDING), ("id", pymongo.ASCENDING)], "user_id_id")
+    # A revoked token only needs denying until it would have expired anyway
+    create_unique_index(revoked_tokens_collection, "jti", "jti")
+    revoked_tokens_collection.create_index("expires_at", name="revoked_ttl", expireAfterSeconds=0)
+    activity_collection.create_index(
+        [("user_id", pymongo.ASCENDING), ("at", pymongo.DESCENDING), ("id", pymongo.DESCENDING)], name="user_activity"
+    )
+    create_unique_index(jobs_collection, "id", "job_id")
+    # Workers claim the oldest runnable job; users list their own newest first
+    jobs_collection.create_index([("status", pymongo.ASCENDING), ("created_at", pymongo.ASCENDING)], name="job_claim")
+    jobs_collection.create_index([("user_id", pymongo.ASCENDING), ("created_at", pymongo.DESCENDING)], name="user_jobs")
+    jobs_collection.create_index("expires_at", name="job_expiry", sparse=True)
+
+# Startup
+background_tasks = []
+# Each part flips to True once warmed up; /api/health/ready waits for all
+readiness = {"mongo": False, "indexes": False, "stripe": False}
+MONGO_RETRY_SECONDS = 2
+
+async def warm_up():
+    background_tasks.append(asyncio.create_task(load_monitor.watch_loop_lag()))
+    if ORPHAN_SWEEP_INTERVAL_SECONDS > 0:
+        background_tasks.append(asyncio.create_task(sweep_orphans_periodically()))
+    if PAYMENT_ARCHIVE_INTERVAL_SECONDS > 0:
+        background_tasks.append(asyncio.create_task(archive_payments_periodically()))
+    if JOB_REAP_INTERVAL_SECONDS > 0:
+        background_tasks.append(asyncio.create_task(reap_jobs_periodically()))
+    job_runner.start()
+    await asyncio.gather(warm_up_mongo(asyncio.get_running_loop()), warm_up_stripe(), warm_up_analytics())
+
+async def warm_up_mongo(loop):
+    while True:
+        try:
+            await asyncio.to_thread(client.admin.command, "ping")
+            break
+        except pymongo.errors.PyMongoError as e:
+            logger.warning("MongoDB not reachable yet, retrying: %s", e)
+            await asyncio.sleep(MONGO_RETRY_SECONDS)
+    readiness["mongo"] = True
+    try:
+        await asyncio.to_thread(ensure_indexes)
+        readiness["indexes"] = True
+        await asyncio.to_thread(start_change_stream_watcher, loop)
+    except Exception:
+        logger.exception("Database warm-up failed")
+    try:
+        await asyncio.to_thread(backfill_payment_rollups)
+    except Exception:
+        logger.exception("Payment rollup backfill failed; it is retried on the next start")
+
+async def warm_up_stripe():
+    await asyncio.to_thread(stripe_gateway.load)
+    readiness["stripe"] = True
+
+async def warm_up_analytics():
+    # Import pandas off the event loop so the first analytics request does not stall it
+    await asyncio.to_thread(importlib.import_module, "pandas")
 
 # Stripe setup
 STRIPE_API_KEY = os.environ.get("STRIPE_API_KEY", "sk_test_emergent")
-try:
-    stripe_checkout = StripeCheckout(api_key=STRIPE_API_KEY)
-except Exception as e:
-    print(f"Warning: Stripe integration not available: {e}")
-    class MockStripeCheckout:
-        def __init__(self, api_key=None):
-            self.api_key = api_key
-            
-        async def create_checkout_session(self, checkout_request):
-            class MockResponse:
-                def __init__(self):
-                    self.url = "https://checkout.stripe.com/pay/cs_test_example"
-                    self.session_id = str(uuid.uuid4())
-            return MockResponse()
-            
-        async def get_checkout_status(self, session_id):
-            class MockStatusResponse:
-                def __init__(self):
-                    self.status = "complete"
-                    self.payment_status = "paid"
-                    self.amount_total = 1000
-                    self.currency = "usd"
-            return MockStatusResponse()
-    
-    stripe_checkout = MockStripeCheckout(api_key=STRIPE_API_KEY)
 
-# Google OAuth setup
-GOOGLE_CLIENT_ID = os.environ.get("GOOGLE_CLIENT_ID", "")
-GOOGLE_CLIENT_SECRET = os.environ.get("GOOGLE_CLIENT_SECRET", "")
+class MockStripeCheckout:
+    def __init__(self, api_key=None):
+        self.api_key = api_key
+        
+    async def create_checkout_session(self, checkout_request):
+        class MockResponse:
+            def __init__(self):
+                self.url = "https://checkout.stripe.com/pay/cs_test_example"
+                self.session_id = str(uuid.uuid4())
+        return MockResponse()
+        
+    async def get_checkout_status(self, session_id):
+        class MockStatusResponse:
+            def __init__(self):
+                self.status = "complete"
+                self.payment_status = "paid"
+                self.amount_total = 1000
+                self.currency = "usd"
+        return MockStatusResponse()
 
-# Enums
-class ProjectStatus(str, Enum):
-    ACTIVE = "active"
-    COMPLETED = "completed"
-    ON_HOLD = "on_hold"
-    CANCELLED = "cancelled"
+class StripeGateway:
+    """Imports and builds the Stripe integration on first use rather than at import"""
 
-class PaymentStatus(str, Enum):
-    PENDING = "pending"
-    COMPLETED = "completed"
-    FAILED = "failed"
-    CANCELLED = "cancelled"
+    def __init__(self, api_key):
+        self.api_key = api_key
+        self._loaded = None
+        self._lock = threading.Lock()
 
-class PaymentType(str, Enum):
-    RECEIVED = "received"
-    SENT = "sent"
+    def load(self):
+        """(checkout client, checkout session request class)"""
+        with self._lock:
+            if self._loaded is None:
+                try:
+                    from emergentintegrations.payments.stripe.checkout import CheckoutSessionRequest, StripeCheckout
+                    self._loaded = (StripeCheckout(api_key=self.api_key), CheckoutSessionRequest)
+                except Exception:
+                    logger.warning("Stripe integration not available, using the mock checkout", exc_info=True)
+                    self._loaded = (MockStripeCheckout(api_key=self.api_key), SimpleNamespace)
+            return self._loaded
 
-class MemberType(str, Enum):
-    INTERNAL = "internal"
-    FREELANCER = "freelancer"
+stripe_gateway = StripeGateway(STRIPE_API_KEY)
 
-class IntegrationType(str, Enum):
-    STRIPE = "stripe"
-    GMAIL = "gmail"
-    GOOGLE_CALENDAR = "google_calendar"
+# Google OAuth setup
+GOOGLE_CLIENT_ID = os.environ.get("GOOGLE_CLIENT_ID", "")
+GOOGLE_CLIENT_SECRET = os.environ.get("GOOGLE_CLIENT_SECRET", "")
 
-# Pydantic models
-class User(BaseModel):
-    id: str = Field(default_factory=lambda: str(uuid.uuid4()))
-    email: str
-    name: str
-    profile_picture: Optional[str] = None
-    theme: str = "light"
-    created_at: datetime = Field(default_factory=datetime.utcnow)
-    updated_at: datetime = Field(default_factory=datetime.utcnow)
+# Enums
+class Granularity(str, Enum):
+    DAY = "day"
+    WEEK = "week"
+    MONTH = "month"
 
-class Integration(BaseModel):
-    id: str = Field(default_factory=lambda: str(uuid.uuid4()))
-    user_id: str
-    integration_type: IntegrationType
-    is_connected: bool = False
-    credentials: Dict[str, Any] = {}
-    settings: Dict[str, Any] = {}
-    created_at: datetime = Field(default_factory=datetime.utcnow)
-    updated_at: datetime = Field(default_factory=datetime.utcnow)
+class DeleteMode(str, Enum):
+    CASCADE = "cascade"
+    ARCHIVE = "archive"
 
-class Client(BaseModel):
-    id: str = Field(default_factory=lambda: str(uuid.uuid4()))
-    user_id: str
-    name: str
-    email: str
-    phone: Optional[str] = None
-    company: Optional[str] = None
-    address: Optional[str] = None
-    created_at: datetime = Field(default_factory=datetime.utcnow)
-    updated_at: datetime = Field(default_factory=datetime.utcnow)
+class SortOrder(str, Enum):
+    ASC = "asc"
+    DESC = "desc"
 
-class Project(BaseModel):
-    id: str = Field(default_factory=lambda: str(uuid.uuid4()))
-    user_id: str
-    name: str
-    description: Optional[str] = None
-    client_id: str
-    status: ProjectStatus = ProjectStatus.ACTIVE
-    budget: Optional[float] = None
-    start_date: Optional[datetime] = None
-    end_date: Optional[datetime] = None
-    created_at: datetime = Field(default_factory=datetime.utcnow)
-    updated_at: datetime = Field(default_factory=datetime.utcnow)
+class ProfitabilitySortField(str, Enum):
+    PROFIT = "profit"
+    RECEIVED = "received"
+    PAID_OUT = "paid_out"
+    BUDGET = "budget"
+    BUDGET_REMAINING = "budget_remaining"
+    NAME = "name"
 
-class TeamMember(BaseModel):
-    id: str = Field(default_factory=lambda: str(uuid.uuid4()))
-    user_id: str
-    name: str
-    email: str
-    phone: Optional[str] = None
-    role: str
-    member_type: MemberType
-    hourly_rate: Optional[float] = None
-    created_at: datetime = Field(default_factory=datetime.utcnow)
-    updated_at: datetime = Field(default_factory=datetime.utcnow)
+# Named like the route segments; used by search and autocomplete
+class EntityType(str, Enum):
+    CLIENTS = "clients"
+    PROJECTS = "projects"
+    TEAM_MEMBERS = "team-members"
 
-class PaymentTransaction(BaseModel):
-    id: str = Field(default_factory=lambda: str(uuid.uuid4()))
-    user_id: str
-    payment_type: PaymentType
-    amount: float
-    currency: str = "usd"
-    description: Optional[str] = None
-    client_id: Optional[str] = None
-    team_member_id: Optional[str] = None
-    project_id: Optional[str] = None
-    stripe_session_id: Optional[str] = None
-    payment_status: PaymentStatus = PaymentStatus.PENDING
-    created_at: datetime = Field(default_factory=datetime.utcnow)
-    updated_at: datetime = Field(default_factory=datetime.utcnow)
+class JobType(str, Enum):
+    EXPORT = "export"
+    PROJECT_PROFITABILITY = "project-profitability"
+    CLIENT_STATEMENTS = "client-statements"
 
-class CalendarEvent(BaseModel):
-    id: str = Field(default_factory=lambda: str(uuid.uuid4()))
-    user_id: str
-    title: str
-    description: Optional[str] = None
-    start_time: datetime
-    end_time: datetime
-    attendees: List[str] = []
-    google_event_id: Optional[str] = None
-    created_at: datetime = Field(default_factory=datetime.utcnow)
+class JobStatus(str, Enum):
+    QUEUED = "queued"
+    RUNNING = "running"
+    SUCCEEDED = "succeeded"
+    FAILED = "failed"
+    CANCELLED = "cancelled"
 
 # Request models
 class UserRequest(BaseModel):
@@ -233,15 +504,1117 @@ class IntegrationRequest(BaseModel):
     credentials: Dict[str, Any] = {}
     settings: Dict[str, Any] = {}
 
-# Helper function to get current user (mock implementation)
-def get_current_user_id():
-    return "default_user_id"
+class BatchGetRequest(BaseModel):
+    ids: List[str]
+
+class JobRequest(BaseModel):
+    type: JobType
+    params: Dict[str, Any] = {}
+
+class ExportJobParams(BaseModel):
+    include_archived: bool = False
+
+class ProjectProfitabilityJobParams(BaseModel):
+    sort_by: ProfitabilitySortField = ProfitabilitySortField.PROFIT
+    order: SortOrder = SortOrder.DESC
+
+MONTH_PATTERN = r"^\d{4}-(0[1-9]|1[0-2])$"
+
+class ClientStatementsJobParams(BaseModel):
+    month: str = Field(pattern=MONTH_PATTERN)
+
+# Authentication
+# Requests carry a signed JWT as a bearer token. Verified tokens and user
+# documents are cached, so after the first request with a token neither
+# the signature check nor a Mongo read is repeated.
+JWT_SECRET = os.environ.get("JWT_SECRET")
+if not JWT_SECRET:
+    logger.warning("JWT_SECRET is not set; tokens will not survive a restart or work across workers")
+    JWT_SECRET = secrets.token_urlsafe(32)
+JWT_ALGORITHM = "HS256"
+JWT_TTL_SECONDS = int(os.environ.get("JWT_TTL_SECONDS", "86400"))
+# Without a token, requests act as the default user unless this is set
+AUTH_REQUIRED = os.environ.get("AUTH_REQUIRED", "false").lower() == "true"
+DEFAULT_USER_ID = "default_user_id"
+TOKEN_CACHE_MAX_ENTRIES = int(os.environ.get("TOKEN_CACHE_MAX_ENTRIES", "10000"))
+USER_CACHE_MAX_ENTRIES = int(os.environ.get("USER_CACHE_MAX_ENTRIES", "10000"))
+USER_CACHE_TTL_SECONDS = int(os.environ.get("USER_CACHE_TTL_SECONDS", "300"))
+DENY_LIST_REFRESH_SECONDS = float(os.environ.get("DENY_LIST_REFRESH_SECONDS", "5"))
+
+class TTLCache:
+    """LRU cache whose entries also expire at a given wall-clock time"""
+
+    def __init__(self, max_entries):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            expires_at, value = entry
+            if expires_at <= time.time():
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return value
+
+    def set(self, key, value, expires_at):
+        with self._lock:
+            self._entries[key] = (expires_at, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def pop(self, key):
+        with self._lock:
+            self._entries.pop(key, None)
+
+class DenyList:
+    """Ids of revoked tokens, shared through Mongo.
+
+    Every revocation bumps a version number; each process re-reads the list
+    only when it sees the version move, and checks at most once per
+    refresh interval, so a revocation reaches other workers within it.
+    """
+
+    def __init__(self, refresh_seconds):
+        self.refresh_seconds = refresh_seconds
+        self.version = None
+        self.token_ids = set()
+        self.checked_at = 0.0
+
+    def refresh(self):
+        now = time.monotonic()
+        if now - self.checked_at < self.refresh_seconds:
+            return
+        self.checked_at = now
+        state = auth_state_collection.find_one({"_id": "deny_list"}) or {}
+        version = state.get("version", 0)
+        if version != self.version:
+            self.token_ids = {revoked["jti"] for revoked in revoked_tokens_collection.find({}, {"_id": 0, "jti": 1})}
+            self.version = version
+
+    def is_revoked(self, token_id):
+        self.refresh()
+        return token_id in self.token_ids
+
+    def revoke(self, token_id, expires_at):
+        revoked_tokens_collection.update_one(
+            {"jti": token_id},
+            {"$setOnInsert": {"expires_at": expires_at}},
+            upsert=True,
+        )
+        auth_state_collection.update_one({"_id": "deny_list"}, {"$inc": {"version": 1}}, upsert=True)
+        self.token_ids.add(token_id)
+
+token_cache = TTLCache(TOKEN_CACHE_MAX_ENTRIES)
+user_cache = TTLCache(USER_CACHE_MAX_ENTRIES)
+deny_list = DenyList(DENY_LIST_REFRESH_SECONDS)
+bearer_scheme = HTTPBearer(auto_error=False)
+
+def issue_token(user_id):
+    now = int(time.time())
+    claims = {"sub": user_id, "jti": uuid.uuid4().hex, "iat": now, "exp": now + JWT_TTL_SECONDS}
+    return jwt.encode(claims, JWT_SECRET, algorithm=JWT_ALGORITHM)
+
+def unauthorized(detail):
+    return HTTPException(status_code=401, detail=detail, headers={"WWW-Authenticate": "Bearer"})
+
+def verify_token(token):
+    """Claims of a valid, unrevoked token; the signature is only checked on a cache miss"""
+    claims = token_cache.get(token)
+    if claims is None:
+        try:
+            claims = jwt.decode(
+                token, JWT_SECRET, algorithms=[JWT_ALGORITHM], options={"require": ["sub", "jti", "exp"]}
+            )
+        except jwt.InvalidTokenError:
+            raise unauthorized("Invalid or expired token")
+        token_cache.set(token, claims, claims["exp"])
+    if deny_list.is_revoked(claims["jti"]):
+        raise unauthorized("Token has been revoked")
+    return claims
+
+async def get_token_claims(credentials: Optional[HTTPAuthorizationCredentials] = Depends(bearer_scheme)):
+    if credentials is None:
+        return None
+    return verify_token(credentials.credentials)
+
+def claims_user_id(claims):
+    if claims is not None:
+        return claims["sub"]
+    if AUTH_REQUIRED:
+        raise unauthorized("Not authenticated")
+    return DEFAULT_USER_ID
+
+async def get_current_user_id(claims: Optional[dict] = Depends(get_token_claims)):
+    return claims_user_id(claims)
+
+async def get_stream_user_id(
+    access_token: Optional[str] = None,
+    claims: Optional[dict] = Depends(get_token_claims),
+):
+    """Like get_current_user_id, but EventSource cannot set headers, so the token may come as ?access_token="""
+    if claims is None and access_token:
+        claims = verify_token(access_token)
+    return claims_user_id(claims)
+
+# Admin access
+# Operational endpoints are only served with the X-Admin-Key header set to
+# ADMIN_API_KEY; without that setting they are disabled.
+ADMIN_API_KEY = os.environ.get("ADMIN_API_KEY")
+
+def is_admin_key(admin_key):
+    return bool(ADMIN_API_KEY) and admin_key is not None and secrets.compare_digest(admin_key, ADMIN_API_KEY)
+
+async def require_admin(x_admin_key: Optional[str] = Header(None)):
+    if not is_admin_key(x_admin_key):
+        raise HTTPException(status_code=403, detail="Admin key required")
+
+# Rate limiting and load shedding
+# Each user gets one token bucket for reads and one for writes; a rate of
+# 0 turns that limit off. Independently of the buckets, new requests are
+# turned away with a 503 while the event loop lags or too many requests
+# are already in flight, so overload degrades into fast retries instead
+# of every request queueing behind the slow ones.
+RATE_LIMITS = {
+    "read": (
+        float(os.environ.get("RATE_LIMIT_READ_PER_SECOND", "50")),
+        float(os.environ.get("RATE_LIMIT_READ_BURST", "100")),
+    ),
+    "write": (
+        float(os.environ.get("RATE_LIMIT_WRITE_PER_SECOND", "10")),
+        float(os.environ.get("RATE_LIMIT_WRITE_BURST", "30")),
+    ),
+}
+RATE_LIMIT_MAX_BUCKETS = int(os.environ.get("RATE_LIMIT_MAX_BUCKETS", "100000"))
+LOAD_SHED_MAX_LOOP_LAG_MS = float(os.environ.get("LOAD_SHED_MAX_LOOP_LAG_MS", "250"))
+LOAD_SHED_MAX_IN_FLIGHT = int(os.environ.get("LOAD_SHED_MAX_IN_FLIGHT", "256"))
+LOOP_LAG_SAMPLE_SECONDS = 0.5
+# Liveness probes and long-lived event streams are never limited
+RATE_LIMIT_EXEMPT_PREFIXES = ("/api/health", "/api/events/stream")
+
+class TokenBucket:
+    def __init__(self, rate, capacity):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = time.monotonic()
+
+    def take(self):
+        """Spend one token; returns 0, or the seconds until one is available"""
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+        if self.tokens >= 1:
+            self.tokens -= 1
+            return 0
+        return (1 - self.tokens) / self.rate
+
+class RateLimiter:
+    """Token buckets per (caller, route class), least recently used evicted first"""
+
+    def __init__(self, limits, max_buckets):
+        self.limits = limits
+        self.max_buckets = max_buckets
+        self._buckets = OrderedDict()
+
+    def take(self, identity, route_class):
+        rate, burst = self.limits[route_class]
+        if rate <= 0:
+            return 0
+        key = (identity, route_class)
+        bucket = self._buckets.get(key)
+        if bucket is None:
+            bucket = self._buckets[key] = TokenBucket(rate, burst)
+            if len(self._buckets) > self.max_buckets:
+                self._buckets.popitem(last=False)
+        else:
+            self._buckets.move_to_end(key)
+        return bucket.take()
+
+class LoadMonitor:
+    def __init__(self):
+        self.in_flight = 0
+        self.loop_lag = 0.0
+        self.rejected = {"rate_limited": 0, "shed": 0}
+
+    async def watch_loop_lag(self):
+        """Measure how late a short sleep wakes up; a busy loop wakes it late"""
+        loop = asyncio.get_running_loop()
+        while True:
+            started = loop.time()
+            await asyncio.sleep(LOOP_LAG_SAMPLE_SECONDS)
+            self.loop_lag = max(0.0, loop.time() - started - LOOP_LAG_SAMPLE_SECONDS)
+
+    def overloaded(self):
+        return self.loop_lag * 1000 > LOAD_SHED_MAX_LOOP_LAG_MS or self.in_flight >= LOAD_SHED_MAX_IN_FLIGHT
+
+rate_limiter = RateLimiter(RATE_LIMITS, RATE_LIMIT_MAX_BUCKETS)
+load_monitor = LoadMonitor()
+
+def request_identity(scope):
+    """The authenticated user, or the client address for anonymous and invalid tokens"""
+    for name, value in scope["headers"]:
+        if name == b"authorization":
+            scheme, _, token = value.decode("latin-1").partition(" ")
+            if scheme.lower() == "bearer" and token:
+                try:
+                    return "user:" + verify_token(token)["sub"]
+                except HTTPException:
+                    break
+    client_address = scope.get("client")
+    return "ip:" + (client_address[0] if client_address else "unknown")
+
+class LoadControlMiddleware:
+    """Plain ASGI middleware, so streamed responses pass through untouched"""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if (
+            scope["type"] != "http"
+            or scope["method"] == "OPTIONS"
+            or scope["path"].startswith(RATE_LIMIT_EXEMPT_PREFIXES)
+        ):
+            await self.app(scope, receive, send)
+            return
+
+        if load_monitor.overloaded():
+            load_monitor.rejected["shed"] += 1
+            response = JSONResponse(
+                {"detail": "Server is overloaded, please retry"}, status_code=503, headers={"Retry-After": "1"}
+            )
+            await response(scope, receive, send)
+            return
+
+        route_class = "read" if scope["method"] in ("GET", "HEAD") else "write"
+        wait = rate_limiter.take(request_identity(scope), route_class)
+        if wait:
+            load_monitor.rejected["rate_limited"] += 1
+            response = JSONResponse(
+                {"detail": "Too many requests"}, status_code=429, headers={"Retry-After": str(int(wait) + 1)}
+            )
+            await response(scope, receive, send)
+            return
+
+        load_monitor.in_flight += 1
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            load_monitor.in_flight -= 1
+
+# Request profiling
+# With PROFILE_REQUESTS=true, a request carrying X-Admin-Key plus either an
+# X-Profile header or ?profile=1 runs under cProfile. The stats are written
+# to PROFILE_DIR/<id>.pstats and the id is returned in X-Profile-Id; open
+# them with `python -m pstats` or snakeviz. Without PROFILE_REQUESTS the
+# middleware is not installed at all.
+PROFILE_REQUESTS = os.environ.get("PROFILE_REQUESTS", "false").lower() == "true"
+PROFILE_DIR = os.environ.get("PROFILE_DIR", os.path.join(os.path.dirname(os.path.abspath(__file__)), "profiles"))
+
+class ProfilingMiddleware:
+    """Profiles one flagged request at a time.
+
+    cProfile follows the event loop thread, so work done in worker threads
+    (asyncio.to_thread) shows up only as time spent waiting for it, and
+    other requests running concurrently on the loop are included too.
+    """
+
+    def __init__(self, app):
+        self.app = app
+        # Only one profiler can be active per thread
+        self.lock = asyncio.Lock()
+
+    @staticmethod
+    def requested(scope):
+        headers = dict(scope["headers"])
+        flagged = b"x-profile" in headers or parse_qs(scope["query_string"].decode("latin-1")).get("profile") == ["1"]
+        admin_key = headers.get(b"x-admin-key")
+        return flagged and is_admin_key(admin_key.decode("latin-1") if admin_key else None)
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not self.requested(scope):
+            await self.app(scope, receive, send)
+            return
+
+        profile_id = uuid.uuid4().hex
+
+        async def send_with_profile_id(message):
+            if message["type"] == "http.response.start":
+                message["headers"] = [*message.get("headers", []), (b"x-profile-id", profile_id.encode())]
+            await send(message)
+
+        async with self.lock:
+            profiler = cProfile.Profile()
+            started = time.perf_counter()
+            profiler.enable()
+            try:
+                await self.app(scope, receive, send_with_profile_id)
+            finally:
+                profiler.disable()
+                elapsed = time.perf_counter() - started
+                path = os.path.join(PROFILE_DIR, f"{profile_id}.pstats")
+                await asyncio.to_thread(self.save, profiler, path)
+                logger.info("Profiled %s %s in %.1f ms: %s", scope["method"], scope["path"], elapsed * 1000, path)
+
+    @staticmethod
+    def save(profiler, path):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        profiler.dump_stats(path)
+
+if PROFILE_REQUESTS:
+    # Added first so it sits inside the load control and rejected requests are not profiled
+    app.add_middleware(ProfilingMiddleware)
+app.add_middleware(LoadControlMiddleware)
+
+# CORS middleware, added last so it is outermost and rejected requests
+# still carry CORS headers the browser can read
+app.add_middleware(
+    CORSMiddleware,
+    allow_origins=["*"],
+    allow_credentials=True,
+    allow_methods=["*"],
+    allow_headers=["*"],
+)
+
+# Autocomplete prefix indexes
+AUTOCOMPLETE_MAX_ENTRIES = int(os.environ.get("AUTOCOMPLETE_MAX_ENTRIES", "1000000"))
+# Per-worker caches only see their own worker's writes, so entries are
+# rebuilt after this long to bound how stale the other workers can get
+LOCAL_CACHE_TTL_SECONDS = int(os.environ.get("LOCAL_CACHE_TTL_SECONDS", "60"))
+
+class PrefixIndex:
+    """Sorted array of (key, id, name) entries searched with bisect.
+
+    Every word of a name gets its own entry, so "sil" matches "Ana Silva".
+    """
+
+    def __init__(self, items):
+        self.entries = []
+        self.names = {}
+        for item_id, name in items:
+            self.names[item_id] = name
+            self.entries.extend(self._keys(item_id, name))
+        self.entries.sort()
+
+    @staticmethod
+    def _keys(item_id, name):
+        lowered = (name or "").lower()
+        return [(lowered[i:], item_id) for i in range(len(lowered)) if i == 0 or lowered[i - 1] == " "]
+
+    def __len__(self):
+        return len(self.entries)
+
+    def upsert(self, item_id, name):
+        self.remove(item_id)
+        self.names[item_id] = name
+        for entry in self._keys(item_id, name):
+            insort(self.entries, entry)
+
+    def remove(self, item_id):
+        name = self.names.pop(item_id, None)
+        if name is None:
+            return
+        for entry in self._keys(item_id, name):
+            position = bisect_left(self.entries, entry)
+            if position < len(self.entries) and self.entries[position] == entry:
+                del self.entries[position]
+
+    def lookup(self, prefix, limit):
+        prefix = prefix.lower()
+        results = []
+        seen = set()
+        position = bisect_left(self.entries, (prefix,))
+        while position < len(self.entries) and len(results) < limit:
+            key, item_id = self.entries[position]
+            if not key.startswith(prefix):
+                break
+            if item_id not in seen:
+                seen.add(item_id)
+                results.append({"id": item_id, "name": self.names[item_id]})
+            position += 1
+        return results
+
+class AutocompleteCache:
+    """Per-user prefix indexes, built lazily, rebuilt after a TTL and evicted LRU under an entry cap"""
+
+    def __init__(self, max_entries, ttl_seconds):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.size = 0
+        self._indexes = OrderedDict()
+        self._expires_at = {}
+
+    def get(self, user_id, entity, loader):
+        key = (user_id, entity)
+        index = self._indexes.get(key)
+        if index is not None and time.monotonic() >= self._expires_at[key]:
+            self._drop(key)
+            index = None
+        if index is None:
+            index = PrefixIndex(loader())
+            self._indexes[key] = index
+            self._expires_at[key] = time.monotonic() + self.ttl_seconds
+            self.size += len(index)
+            self._evict(keep=key)
+        self._indexes.move_to_end(key)
+        return index
+
+    def upsert(self, user_id, entity, item_id, name):
+        # Indexes that were never loaded (or were evicted) are rebuilt on next use
+        index = self._indexes.get((user_id, entity))
+        if index is not None:
+            self.size -= len(index)
+            index.upsert(item_id, name)
+            self.size += len(index)
+
+    def remove(self, user_id, entity, item_id):
+        index = self._indexes.get((user_id, entity))
+        if index is not None:
+            self.size -= len(index)
+            index.remove(item_id)
+            self.size += len(index)
+
+    def _drop(self, key):
+        self.size -= len(self._indexes.pop(key))
+        del self._expires_at[key]
+
+    def _evict(self, keep):
+        while self.size > self.max_entries and len(self._indexes) > 1:
+            key = next(iter(self._indexes))
+            if key == keep:
+                self._indexes.move_to_end(key)
+                continue
+            self._drop(key)
+
+autocomplete_cache = AutocompleteCache(AUTOCOMPLETE_MAX_ENTRIES, LOCAL_CACHE_TTL_SECONDS)
+
+# Report result cache
+REPORT_CACHE_MAX_ENTRIES = int(os.environ.get("REPORT_CACHE_MAX_ENTRIES", "1000"))
+
+class ReportCache:
+    """Computed report pages per user, dropped whenever the user's data changes or the TTL passes"""
+
+    def __init__(self, max_entries, ttl_seconds):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self._entries = OrderedDict()
+        self._keys_by_user = {}
+        self._generations = {}
+
+    def generation(self, user_id):
+        return self._generations.get(user_id, 0)
+
+    def get(self, user_id, params):
+        key = (user_id, params)
+        if key not in self._entries:
+            return None
+        value, expires_at = self._entries[key]
+        if time.monotonic() >= expires_at:
+            del self._entries[key]
+            self._keys_by_user.get(user_id, set()).discard(key)
+            return None
+        self._entries.move_to_end(key)
+        return value
+
+    def set(self, user_id, params, value, generation=None):
+        # A report computed before the user's data last changed is already stale
+        if generation is not None and generation != self.generation(user_id):
+            return
+        key = (user_id, params)
+        self._entries[key] = (value, time.monotonic() + self.ttl_seconds)
+        self._entries.move_to_end(key)
+        self._keys_by_user.setdefault(user_id, set()).add(key)
+        while len(self._entries) > self.max_entries:
+            evicted_key, _ = self._entries.popitem(last=False)
+            self._keys_by_user.get(evicted_key[0], set()).discard(evicted_key)
+
+    def invalidate(self, user_id):
+        self._generations[user_id] = self.generation(user_id) + 1
+        for key in self._keys_by_user.pop(user_id, set()):
+            self._entries.pop(key, None)
+
+profitability_cache = ReportCache(REPORT_CACHE_MAX_ENTRIES, LOCAL_CACHE_TTL_SECONDS)
+
+# Request coalescing
+class SingleFlight:
+    """Identical concurrent reads share one computation.
+
+    Calls are keyed by (user, route, params). The first caller starts the
+    computation; callers arriving while it runs await the same result.
+    """
+
+    def __init__(self):
+        self._inflight = {}
+        self._stats = {}
+
+    async def run(self, key, compute):
+        stats = self._stats.setdefault(key[1], {"calls": 0, "executions": 0})
+        stats["calls"] += 1
+        future = self._inflight.get(key)
+        if future is None:
+            stats["executions"] += 1
+            future = asyncio.ensure_future(compute())
+            self._inflight[key] = future
+            future.add_done_callback(lambda _: self._inflight.pop(key, None))
+        # A caller that disconnects must not cancel the work for the others
+        return await asyncio.shield(future)
+
+    def metrics(self):
+        return {
+            route: {
+                **stats,
+                "coalesced": stats["calls"] - stats["executions"],
+                "coalescing_ratio": round(stats["calls"] / stats["executions"], 3),
+            }
+            for route, stats in self._stats.items()
+        }
+
+single_flight = SingleFlight()
+
+# Live events
+EVENT_QUEUE_SIZE = int(os.environ.get("EVENT_QUEUE_SIZE", "1000"))
+EVENT_DEDUP_WINDOW = 10000
+SSE_KEEPALIVE_SECONDS = 15
+
+class EventBus:
+    """In-process pub/sub of per-user change events for the SSE stream.
+
+    Handlers publish their own writes; when change streams are available the
+    same writes arrive again from Mongo, so events carrying a key are
+    delivered once.
+    """
+
+    def __init__(self, queue_size):
+        self.queue_size = queue_size
+        self.sequence = 0
+        self._subscribers = {}
+        self._recent_keys = OrderedDict()
+
+    def subscribe(self, user_id):
+        queue = asyncio.Queue(maxsize=self.queue_size)
+        self._subscribers.setdefault(user_id, set()).add(queue)
+        return queue
+
+    def unsubscribe(self, user_id, queue):
+        queues = self._subscribers.get(user_id)
+        if queues is not None:
+            queues.discard(queue)
+            if not queues:
+                del self._subscribers[user_id]
+
+    def publish(self, user_id, event, data, key=None):
+        if key is not None:
+            if key in self._recent_keys:
+                return
+            self._recent_keys[key] = True
+            if len(self._recent_keys) > EVENT_DEDUP_WINDOW:
+                self._recent_keys.popitem(last=False)
+        queues = self._subscribers.get(user_id)
+        if not queues:
+            return
+        self.sequence += 1
+        message = (self.sequence, event, data)
+        for queue in queues:
+            try:
+                queue.put_nowait(message)
+            except asyncio.QueueFull:
+                # A subscriber that fell this far behind has to reload anyway
+                while not queue.empty():
+                    queue.get_nowait()
+                queue.put_nowait((self.sequence, "resync", {}))
+
+event_bus = EventBus(EVENT_QUEUE_SIZE)
+
+def event_payload(document):
+    return {k: v for k, v in document.items() if k != "_id"}
+
+def publish_change(user_id, event, document, counters=None):
+    """Publish an entity change, plus the dashboard counter deltas it implies"""
+    key = f"{event}:{document['id']}:{document.get('updated_at')}"
+    event_bus.publish(user_id, event, event_payload(document), key=key)
+    if counters:
+        event_bus.publish(user_id, "counters.updated", counters, key=f"counters:{key}")
+
+# Activity log
+# Write handlers only enqueue entries; a single writer task stores them with
+# insert_many once ACTIVITY_BATCH_SIZE entries are waiting or the oldest has
+# waited ACTIVITY_FLUSH_SECONDS. When the buffer is full, handlers wait for
+# room rather than entries being dropped, so the writer must never stop: a
+# batch that cannot be stored is logged and dropped, and the task is
+# restarted if it dies anyway.
+ACTIVITY_BUFFER_SIZE = int(os.environ.get("ACTIVITY_BUFFER_SIZE", "10000"))
+ACTIVITY_BATCH_SIZE = int(os.environ.get("ACTIVITY_BATCH_SIZE", "500"))
+ACTIVITY_FLUSH_SECONDS = float(os.environ.get("ACTIVITY_FLUSH_SECONDS", "1"))
+ACTIVITY_WRITE_ATTEMPTS = 3
+ACTIVITY_SHUTDOWN_TIMEOUT_SECONDS = 10
+
+class ActivityLog:
+    def __init__(self, buffer_size, batch_size, flush_seconds):
+        self.batch_size = batch_size
+        self.flush_seconds = flush_seconds
+        self.queue = asyncio.Queue(maxsize=buffer_size)
+        self.task = None
+        self.dropped = 0
+
+    def start(self):
+        self.task = asyncio.create_task(self.run())
+        self.task.add_done_callback(self.restart)
+
+    def restart(self, task):
+        if task.cancelled() or task.exception() is None:
+            return
+        logger.error("Activity writer stopped; restarting it", exc_info=task.exception())
+        self.start()
+
+    async def record(self, entry):
+        await self.queue.put(entry)
+
+    async def run(self):
+        loop = asyncio.get_running_loop()
+        stopping = False
+        while not stopping:
+            entry = await self.queue.get()
+            if entry is None:
+                break
+            batch = [entry]
+            deadline = loop.time() + self.flush_seconds
+            while len(batch) < self.batch_size:
+                try:
+                    entry = await asyncio.wait_for(self.queue.get(), deadline - loop.time())
+                except asyncio.TimeoutError:
+                    break
+                if entry is None:
+                    stopping = True
+                    break
+                batch.append(entry)
+            try:
+                await self.write(batch)
+            except Exception:
+                # e.g. bson.errors.InvalidDocument, which is not a PyMongoError
+                self.dropped += len(batch)
+                logger.exception("Dropped %d activity entries", len(batch))
+
+    async def write(self, batch):
+        for attempt in range(ACTIVITY_WRITE_ATTEMPTS):
+            try:
+                await asyncio.to_thread(activity_collection.insert_many, batch, ordered=False)
+                return
+            except pymongo.errors.BulkWriteError as e:
+                # Entries stored by an earlier attempt come back as duplicate _ids
+                failed = {error["index"] for error in e.details["writeErrors"] if error["code"] != 11000}
+                batch = [entry for index, entry in enumerate(batch) if index in failed]
+                if not batch:
+                    return
+                logger.warning("Writing %d activity entries failed (attempt %d): %s", len(batch), attempt + 1, e)
+            except pymongo.errors.PyMongoError as e:
+                logger.warning("Writing %d activity entries failed (attempt %d): %s", len(batch), attempt + 1, e)
+            await asyncio.sleep(2 ** attempt)
+        self.dropped += len(batch)
+        logger.error("Dropped %d activity entries", len(batch))
+
+    async def close(self):
+        """Flush everything buffered before shutdown, giving up if Mongo stays unreachable"""
+        if self.task is None:
+            return
+        try:
+            await asyncio.wait_for(self.drain(), ACTIVITY_SHUTDOWN_TIMEOUT_SECONDS)
+        except asyncio.TimeoutError:
+            logger.error("Gave up flushing buffered activity entries on shutdown")
+
+    async def drain(self):
+        await self.queue.put(None)
+        # A writer that dies is replaced by restart(), and the new one reads the None
+        while True:
+            task = self.task
+            await asyncio.wait([task])
+            if task is self.task:
+                return
+
+activity_log = ActivityLog(ACTIVITY_BUFFER_SIZE, ACTIVITY_BATCH_SIZE, ACTIVITY_FLUSH_SECONDS)
+
+async def record_activity(user_id, action, entity_id, name=None, **details):
+    """Queue an audit entry, e.g. record_activity(user_id, "client.updated", client_id, "Acme")"""
+    entity, _, verb = action.partition(".")
+    await activity_log.record({
+        "id": str(uuid.uuid4()),
+        "user_id": user_id,
+        "action": action,
+        "entity": entity,
+        "verb": verb,
+        "entity_id": entity_id,
+        "name": name,
+        "details": details,
+        "at": datetime.utcnow().isoformat(),
+    })
+
+def encode_activity_cursor(entry):
+    return base64.urlsafe_b64encode(f"{entry['at']}|{entry['id']}".encode()).decode()
+
+def decode_activity_cursor(cursor):
+    try:
+        at, entry_id = base64.urlsafe_b64decode(cursor.encode()).decode().split("|")
+        return at, entry_id
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid activity cursor")
+
+# Change streams (only available when mongod runs as a replica set)
+CHANGE_STREAMS_ENABLED = os.environ.get("CHANGE_STREAMS_ENABLED", "true").lower() == "true"
+WATCHED_COLLECTIONS = {
+    clients_collection.name: ("client", "clients_count"),
+    projects_collection.name: ("project", "projects_count"),
+    team_members_collection.name: ("team_member", "team_members_count"),
+    payment_transactions_collection.name: ("payment", None),
+}
+change_stream_stop = threading.Event()
+
+def is_replica_set():
+    try:
+        return bool(client.admin.command("hello").get("setName"))
+    except pymongo.errors.PyMongoError:
+        return False
+
+transactions_supported = None
+
+def run_transaction(operations):
+    """Run operations(session) in a transaction when the deployment has them.
+
+    A standalone mongod has no transactions; there the batched writes run in
+    order and the orphan sweeper cleans up after a partial failure.
+    """
+    global transactions_supported
+    if transactions_supported is None:
+        transactions_supported = is_replica_set()
+    if not transactions_supported:
+        return operations(None)
+    with client.start_session() as session:
+        return session.with_transaction(operations)
+
+def change_to_event(change):
+    """Translate a change stream document into publish_change arguments"""
+    document = change.get("fullDocument")
+    if not document or "user_id" not in document:
+        return None
+    entity, counter = WATCHED_COLLECTIONS[change["ns"]["coll"]]
+    if change["operationType"] == "insert":
+        counters = {counter: 1} if counter else None
+        if entity == "project" and document.get("status") == ProjectStatus.ACTIVE:
+            counters["active_projects"] = 1
+        return document["user_id"], f"{entity}.created", document, counters
+    if entity == "payment":
+        updated = change.get("updateDescription", {}).get("updatedFields", {})
+        if updated.get("payment_status") == PaymentStatus.COMPLETED:
+            field = "total_received" if document["payment_type"] == PaymentType.RECEIVED else "total_sent"
+            return document["user_id"], "payment.completed", document, {field: document["amount"]}
+    return document["user_id"], f"{entity}.updated", document, None
+
+def watch_changes(loop):
+    pipeline = [{"$match": {
+        "ns.coll": {"$in": list(WATCHED_COLLECTIONS)},
+        "operationType": {"$in": ["insert", "update", "replace"]},
+    }}]
+    while not change_stream_stop.is_set():
+        try:
+            with db.watch(pipeline, full_document="updateLookup", max_await_time_ms=1000) as stream:
+                while stream.alive and not change_stream_stop.is_set():
+                    change = stream.try_next()
+                    event = change_to_event(change) if change else None
+                    if event:
+                        loop.call_soon_threadsafe(publish_change, *event)
+        except pymongo.errors.PyMongoError as e:
+            logger.warning("Change stream interrupted, retrying: %s", e)
+            change_stream_stop.wait(5)
+
+def start_change_stream_watcher(loop):
+    if not CHANGE_STREAMS_ENABLED or not is_replica_set():
+        logger.info("Change streams unavailable; live events come from this process only")
+        return
+    threading.Thread(target=watch_changes, args=(loop,), name="change-stream-watcher", daemon=True).start()
+
+# Read helpers
+def find_user_documents(collection, user_id):
+    documents = list(collection.find({"user_id": user_id}))
+    for document in documents:
+        document["_id"] = str(document["_id"])
+    return documents
+
+def name_map(collection, user_id, ids):
+    """Resolve a set of ids to names with a single $in query"""
+    ids = list({item_id for item_id in ids if item_id})
+    if not ids:
+        return {}
+    documents = collection.find({"user_id": user_id, "id": {"$in": ids}}, {"_id": 0, "id": 1, "name": 1})
+    return {document["id"]: document["name"] for document in documents}
+
+# (id field, denormalized name field, referenced collection)
+PROJECT_NAME_FIELDS = [("client_id", "client_name", clients_collection)]
+PAYMENT_NAME_FIELDS = [
+    ("client_id", "client_name", clients_collection),
+    ("team_member_id", "team_member_name", team_members_collection),
+    ("project_id", "project_name", projects_collection),
+]
+
+def fill_missing_names(user_id, documents, name_fields):
+    """Backfill names on documents written before names were denormalized.
+
+    Current documents carry their names, so this issues no queries for them.
+    """
+    for id_field, name_field, collection in name_fields:
+        missing = [document for document in documents if document.get(id_field) and name_field not in document]
+        if not missing:
+            continue
+        names = name_map(collection, user_id, [document[id_field] for document in missing])
+        for document in missing:
+            if document[id_field] in names:
+                document[name_field] = names[document[id_field]]
+    return documents
+
+# Denormalized name maintenance
+# referenced collection -> [(collection holding copies, id field, name field)]
+NAME_COPIES = {
+    clients_collection.name: [
+        (projects_collection, "client_id", "client_name"),
+        (payment_transactions_collection, "client_id", "client_name"),
+    ],
+    projects_collection.name: [(payment_transactions_collection, "project_id", "project_name")],
+    team_members_collection.name: [(payment_transactions_collection, "team_member_id", "team_member_name")],
+}
+
+def fan_out_name(collection, user_id, item_id):
+    """Refresh every denormalized copy of a renamed entity's name.
+
+    Runs after the response is sent. The name is re-read here rather than
+    passed in, so back-to-back renames cannot leave an older name behind.
+    """
+    source = collection.find_one({"id": item_id, "user_id": user_id}, {"_id": 0, "name": 1})
+    if not source:
+        return
+    for copies, id_field, name_field in NAME_COPIES[collection.name]:
+        copies.update_many(
+            {"user_id": user_id, id_field: item_id, name_field: {"$ne": source["name"]}},
+            {"$set": {name_field: source["name"], "updated_at": datetime.utcnow().isoformat()}},
+        )
+
+def check_name_copies(user_id, repair=False):
+    """Find (and optionally fix) denormalized names that differ from their source"""
+    stale = {}
+    for source_name, targets in NAME_COPIES.items():
+        for copies, id_field, name_field in targets:
+            mismatches = list(copies.aggregate([
+                {"$match": {"user_id": user_id, id_field: {"$ne": None}}},
+                {"$lookup": {"from": source_name, "localField": id_field, "foreignField": "id", "as": "source"}},
+                {"$project": {
+                    "_id": 0,
+                    "id": 1,
+                    "stored": {"$ifNull": [f"${name_field}", None]},
+                    "actual": {"$ifNull": [{"$arrayElemAt": ["$source.name", 0]}, None]},
+                }},
+                {"$match": {"$expr": {"$ne": ["$stored", "$actual"]}}},
+            ]))
+            stale[f"{copies.name}.{name_field}"] = mismatches
+            if repair and mismatches:
+                # Bumping updated_at sends the repaired copies to delta-sync clients
+                repaired_at = datetime.utcnow().isoformat()
+                copies.bulk_write([
+                    UpdateOne(
+                        {"user_id": user_id, "id": mismatch["id"]},
+                        {"$set": {name_field: mismatch.get("actual"), "updated_at": repaired_at}},
+                    )
+                    for mismatch in mismatches
+                ], ordered=False)
+    return stale
+
+BATCH_GET_MAX_IDS = int(os.environ.get("BATCH_GET_MAX_IDS", "500"))
+
+def batch_get_documents(collection, user_id, ids):
+    """Fetch many documents with one $in query, in the order they were asked for"""
+    if len(ids) > BATCH_GET_MAX_IDS:
+        raise HTTPException(status_code=400, detail=f"At most {BATCH_GET_MAX_IDS} ids per batch")
+    unique_ids = list(dict.fromkeys(ids))
+    documents = {}
+    for document in collection.find({"user_id": user_id, "id": {"$in": unique_ids}}):
+        document["_id"] = str(document["_id"])
+        documents[document["id"]] = document
+    return {
+        "items": [documents[item_id] for item_id in unique_ids if item_id in documents],
+        "missing": [item_id for item_id in unique_ids if item_id not in documents],
+    }
+
+# Delta sync helpers
+# Entity name in /api/sync responses -> collection
+SYNC_COLLECTIONS = {
+    "clients": clients_collection,
+    "projects": projects_collection,
+    "team_members": team_members_collection,
+    "payments": payment_transactions_collection,
+}
+# Writes stamped just before a sync started may commit just after it, so the
+# next token starts a little earlier; clients apply changes idempotently
+SYNC_OVERLAP = timedelta(seconds=5)
+
+def record_deletions(user_id, entity, item_ids, session=None):
+    """Leave tombstones so syncing clients learn about hard deletes"""
+    if not item_ids:
+        return
+    deleted_at = datetime.utcnow()
+    deletions_collection.insert_many([
+        {"user_id": user_id, "entity": entity, "id": item_id, "deleted_at": deleted_at}
+        for item_id in item_ids
+    ], session=session)
+
+def encode_sync_token(timestamp):
+    return base64.urlsafe_b64encode(timestamp.isoformat().encode()).decode()
+
+def decode_sync_token(token):
+    try:
+        return datetime.fromisoformat(base64.urlsafe_b64decode(token.encode()).decode())
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid sync token")
+
+# Cascading deletes and orphan cleanup
+ORPHAN_SWEEP_INTERVAL_SECONDS = int(os.environ.get("ORPHAN_SWEEP_INTERVAL_SECONDS", "3600"))
+
+def detach_payments(user_id, field, item_ids, session=None):
+    """Drop references to deleted records from payments.
+
+    Payments are financial history, so they are kept; the denormalized
+    names still say who they were for.
+    """
+    if not item_ids:
+        return 0
+    result = payment_transactions_collection.update_many(
+        {"user_id": user_id, field: {"$in": item_ids}},
+        {"$set": {field: None, "updated_at": datetime.utcnow().isoformat()}},
+        session=session,
+    )
+    return result.modified_count
+
+def archive_documents(archive_collection, documents, session=None):
+    if documents:
+        archived_at = datetime.utcnow().isoformat()
+        archive_collection.insert_many([{**document, "archived_at": archived_at} for document in documents], session=session)
+
+def forget_projects(user_id, projects):
+    """Drop deleted projects from the in-process caches and tell live clients"""
+    if not projects:
+        return
+    profitability_cache.invalidate(user_id)
+    for project in projects:
+        autocomplete_cache.remove(user_id, EntityType.PROJECTS, project["id"])
+        counters = {"projects_count": -1}
+        if project.get("status") == ProjectStatus.ACTIVE:
+            counters["active_projects"] = -1
+        publish_change(user_id, "project.deleted", {"id": project["id"]}, counters)
+
+def same_tenant_lookup(collection, field, target):
+    """$lookup of the record the field references, only when it belongs to the same user"""
+    return {"$lookup": {
+        "from": collection.name,
+        "let": {"id": f"${field}", "user_id": "$user_id"},
+        "pipeline": [
+            {"$match": {"$expr": {"$and": [{"$eq": ["$user_id", "$$user_id"]}, {"$eq": ["$id", "$$id"]}]}}},
+            {"$project": {"_id": 1}},
+        ],
+        "as": target,
+    }}
+
+def find_orphans(user_id=None):
+    """Projects and payment references pointing at records that no longer exist.
+
+    One aggregation per collection finds every dangling reference, instead
+    of checking each document's references one query at a time. A reference
+    to another user's record counts as dangling too.
+    """
+    match = {"user_id": user_id} if user_id else {}
+    projects = list(projects_collection.aggregate([
+        {"$match": match},
+        same_tenant_lookup(clients_collection, "client_id", "client"),
+        {"$match": {"client": {"$size": 0}}},
+        {"$project": {"_id": 0, "user_id": 1, "id": 1, "status": 1}},
+    ]))
+
+    references = [
+        ("client_id", clients_collection),
+        ("project_id", projects_collection),
+        ("team_member_id", team_members_collection),
+    ]
+    pipeline = [{"$match": {**match, "$or": [{field: {"$ne": None}} for field, _ in references]}}]
+    dangling = {}
+    for field, collection in references:
+        pipeline.append(same_tenant_lookup(collection, field, f"{field}_target"))
+        # The reference itself when it points nowhere, otherwise null
+        dangling[field] = {"$cond": [
+            {"$and": [{"$ifNull": [f"${field}", False]}, {"$eq": [{"$size": f"${field}_target"}, 0]}]},
+            f"${field}",
+            None,
+        ]}
+    pipeline += [
+        {"$project": {"_id": 0, "user_id": 1, "id": 1, **dangling}},
+        {"$match": {"$or": [{field: {"$ne": None}} for field, _ in references]}},
+    ]
+    payments = list(payment_transactions_collection.aggregate(pipeline))
+    return {"projects": projects, "payments": payments}
+
+def remove_orphans(orphans):
+    """Delete orphaned projects and detach dangling payment references, in batches per user"""
+    projects_by_user = {}
+    for project in orphans["projects"]:
+        projects_by_user.setdefault(project["user_id"], []).append(project)
+    for user_id, projects in projects_by_user.items():
+        project_ids = [project["id"] for project in projects]
+        projects_collection.delete_many({"user_id": user_id, "id": {"$in": project_ids}})
+        record_deletions(user_id, "projects", project_ids)
+        detach_payments(user_id, "project_id", project_ids)
+
+    updates = []
+    updated_at = datetime.utcnow().isoformat()
+    for payment in orphans["payments"]:
+        dangling = {field: None for field in ["client_id", "project_id", "team_member_id"] if payment.get(field)}
+        updates.append(UpdateOne(
+            {"user_id": payment["user_id"], "id": payment["id"]},
+            {"$set": {**dangling, "updated_at": updated_at}},
+        ))
+    if updates:
+        payment_transactions_collection.bulk_write(updates, ordered=False)
+    return projects_by_user
+
+async def sweep_orphans_periodically():
+    while True:
+        await asyncio.sleep(ORPHAN_SWEEP_INTERVAL_SECONDS)
+        try:
+            orphans = await asyncio.to_thread(find_orphans)
+            projects_by_user = await asyncio.to_thread(remove_orphans, orphans)
+            for user_id, projects in projects_by_user.items():
+                forget_projects(user_id, projects)
+            if orphans["projects"] or orphans["payments"]:
+                logger.info(
+                    "Orphan sweep removed %d projects and fixed %d payments",
+                    len(orphans["projects"]), len(orphans["payments"]),
+                )
+        except pymongo.errors.PyMongoError as e:
+            logger.warning("Orphan sweep failed: %s", e)
 
 # Health check
 @app.get("/api/health")
 async def health_check():
     return {"status": "healthy", "timestamp": datetime.utcnow()}
 
+@app.get("/api/health/live")
+async def liveness_check():
+    """The process is up and its event loop is responding"""
+    return {"status": "alive"}
+
+@app.get("/api/health/ready")
+async def readiness_check():
+    """Whether the pools, indexes and Stripe client are warm enough to take traffic"""
+    ready = all(readiness.values())
+    return JSONResponse({"ready": ready, **readiness}, status_code=200 if ready else 503)
+
 # Authentication endpoints
 @app.post("/api/auth/google")
 async def google_auth(auth_request: GoogleAuthRequest):
@@ -259,45 +1632,55 @@ async def google_auth(auth_request: GoogleAuthRequest):
             "updated_at": datetime.utcnow().isoformat()
         }
         
-        # Check if user exists
-        existing_user = users_collection.find_one({"email": user_data["email"]})
-        if not existing_user:
-            users_collection.insert_one(user_data)
-        else:
-            user_data = existing_user
-            user_data["_id"] = str(user_data["_id"])
+        # Insert the user unless one with this email exists, in one atomic upsert
+        user_data = users_collection.find_one_and_update(
+            {"email": user_data.pop("email")},
+            {"$setOnInsert": user_data},
+            upsert=True,
+            return_document=ReturnDocument.AFTER,
+        )
+        user_data["_id"] = str(user_data["_id"])
+        user_cache.set(user_data["id"], user_data, time.time() + USER_CACHE_TTL_SECONDS)
         
-        return {"user": user_data, "token": "mock_jwt_token"}
+        return {"user": user_data, "token": issue_token(user_data["id"])}
     except Exception as e:
         raise HTTPException(status_code=400, detail=str(e))
 
+def fetch_current_user(user_id):
+    cached = user_cache.get(user_id)
+    if cached is not None:
+        return cached
+    # Create default user if not exists. Emails are unique, so every other
+    # id gets a placeholder address of its own.
+    default_user = User(
+        id=user_id,
+        email="admin@businesshub.com" if user_id == DEFAULT_USER_ID else f"{user_id}@users.invalid",
+        name="Business Admin",
+        profile_picture="https://via.placeholder.com/150",
+        theme="light"
+    )
+    user_dict = default_user.dict()
+    user_dict["created_at"] = user_dict["created_at"].isoformat()
+    user_dict["updated_at"] = user_dict["updated_at"].isoformat()
+    del user_dict["id"]
+    user = users_collection.find_one_and_update(
+        {"id": user_id},
+        {"$setOnInsert": user_dict},
+        upsert=True,
+        return_document=ReturnDocument.AFTER,
+    )
+    user["_id"] = str(user["_id"])
+    user_cache.set(user_id, user, time.time() + USER_CACHE_TTL_SECONDS)
+    return user
+
 @app.get("/api/auth/me")
-async def get_current_user():
+async def get_current_user(user_id: str = Depends(get_current_user_id)):
     """Get current user information"""
-    user_id = get_current_user_id()
-    user = users_collection.find_one({"id": user_id})
-    if not user:
-        # Create default user if not exists
-        default_user = User(
-            id=user_id,
-            email="admin@businesshub.com",
-            name="Business Admin",
-            profile_picture="https://via.placeholder.com/150",
-            theme="light"
-        )
-        user_dict = default_user.dict()
-        user_dict["created_at"] = user_dict["created_at"].isoformat()
-        user_dict["updated_at"] = user_dict["updated_at"].isoformat()
-        users_collection.insert_one(user_dict)
-        user = user_dict
-    else:
-        user["_id"] = str(user["_id"])
-    return user
+    return fetch_current_user(user_id)
 
 @app.put("/api/auth/me")
-async def update_current_user(user_update: UserUpdateRequest):
+async def update_current_user(user_update: UserUpdateRequest, user_id: str = Depends(get_current_user_id)):
     """Update current user profile"""
-    user_id = get_current_user_id()
     update_data = {k: v for k, v in user_update.dict().items() if v is not None}
     update_data["updated_at"] = datetime.utcnow().isoformat()
     
@@ -305,13 +1688,18 @@ async def update_current_user(user_update: UserUpdateRequest):
         {"id": user_id},
         {"$set": update_data}
     )
+    user_cache.pop(user_id)
     return {"message": "Profile updated successfully"}
 
+@app.post("/api/auth/logout")
+async def logout(claims: Optional[dict] = Depends(get_token_claims)):
+    """Revoke the presented token"""
+    if claims is not None:
+        deny_list.revoke(claims["jti"], datetime.utcfromtimestamp(claims["exp"]))
+    return {"message": "Logged out successfully"}
+
 # Integration endpoints
-@app.get("/api/integrations")
-async def get_integrations():
-    """Get all integrations for current user"""
-    user_id = get_current_user_id()
+def fetch_integrations(user_id):
     integrations = list(integrations_collection.find({"user_id": user_id}))
     for integration in integrations:
         integration["_id"] = str(integration["_id"])
@@ -319,62 +1707,63 @@ async def get_integrations():
         integration["credentials"] = {}
     return integrations
 
+@app.get("/api/integrations")
+async def get_integrations(user_id: str = Depends(get_current_user_id)):
+    """Get all integrations for current user"""
+    return fetch_integrations(user_id)
+
 @app.post("/api/integrations")
-async def create_integration(integration_request: IntegrationRequest):
+async def create_integration(integration_request: IntegrationRequest, user_id: str = Depends(get_current_user_id)):
     """Create or update an integration"""
-    user_id = get_current_user_id()
-    
-    # Check if integration already exists
-    existing = integrations_collection.find_one({
-        "user_id": user_id,
-        "integration_type": integration_request.integration_type
-    })
+    integration = Integration(
+        user_id=user_id,
+        integration_type=integration_request.integration_type,
+        is_connected=True,
+        credentials=integration_request.credentials,
+        settings=integration_request.settings
+    )
     
-    if existing:
-        # Update existing integration
-        update_data = {
-            "is_connected": True,
-            "credentials": integration_request.credentials,
-            "settings": integration_request.settings,
-            "updated_at": datetime.utcnow().isoformat()
-        }
-        integrations_collection.update_one(
-            {"_id": existing["_id"]},
-            {"$set": update_data}
-        )
+    # Update the existing integration or create it, in one atomic upsert
+    result = integrations_collection.update_one(
+        {"user_id": user_id, "integration_type": integration.integration_type},
+        {
+            "$set": {
+                "is_connected": True,
+                "credentials": integration.credentials,
+                "settings": integration.settings,
+                "updated_at": integration.updated_at.isoformat()
+            },
+            "$setOnInsert": {
+                "id": integration.id,
+                "created_at": integration.created_at.isoformat()
+            }
+        },
+        upsert=True
+    )
+    created = result.upserted_id is not None
+    await record_activity(
+        user_id, "integration.created" if created else "integration.updated", integration.integration_type.value
+    )
+    if not created:
         return {"message": "Integration updated successfully"}
-    else:
-        # Create new integration
-        integration = Integration(
-            user_id=user_id,
-            integration_type=integration_request.integration_type,
-            is_connected=True,
-            credentials=integration_request.credentials,
-            settings=integration_request.settings
-        )
-        integration_dict = integration.dict()
-        integration_dict["created_at"] = integration_dict["created_at"].isoformat()
-        integration_dict["updated_at"] = integration_dict["updated_at"].isoformat()
-        integrations_collection.insert_one(integration_dict)
-        return {"message": "Integration created successfully"}
+    return {"message": "Integration created successfully"}
 
 @app.delete("/api/integrations/{integration_type}")
-async def disconnect_integration(integration_type: IntegrationType):
+async def disconnect_integration(integration_type: IntegrationType, user_id: str = Depends(get_current_user_id)):
     """Disconnect an integration"""
-    user_id = get_current_user_id()
     result = integrations_collection.update_one(
         {"user_id": user_id, "integration_type": integration_type},
         {"$set": {"is_connected": False, "updated_at": datetime.utcnow().isoformat()}}
     )
     if result.matched_count == 0:
         raise HTTPException(status_code=404, detail="Integration not found")
+    await record_activity(user_id, "integration.disconnected", integration_type.value)
     return {"message": "Integration disconnected successfully"}
 
 # Google Calendar endpoints
 @app.get("/api/calendar/events")
-async def get_calendar_events():
+async def get_calendar_events(user_id: str = Depends(get_current_user_id)):
     """Get upcoming calendar events"""
-    user_id = get_current_user_id()
     
     # Mock calendar events for demo
     mock_events = [
@@ -406,11 +1795,7 @@ async def get_calendar_events():
     
     return {"events": mock_events}
 
-@app.get("/api/calendar/upcoming")
-async def get_upcoming_meetings():
-    """Get upcoming meetings for dashboard"""
-    user_id = get_current_user_id()
-    
+def fetch_upcoming_meetings(user_id):
     # Mock upcoming meetings
     upcoming = [
         {
@@ -428,32 +1813,37 @@ async def get_upcoming_meetings():
             "location": "Zoom Meeting"
         }
     ]
-    
-    return {"upcoming_meetings": upcoming}
+    return upcoming
+
+@app.get("/api/calendar/upcoming")
+async def get_upcoming_meetings(user_id: str = Depends(get_current_user_id)):
+    """Get upcoming meetings for dashboard"""
+    return {"upcoming_meetings": fetch_upcoming_meetings(user_id)}
 
 # Client endpoints
 @app.post("/api/clients")
-async def create_client(client_request: ClientRequest):
-    user_id = get_current_user_id()
+async def create_client(client_request: ClientRequest, user_id: str = Depends(get_current_user_id)):
     client = Client(user_id=user_id, **client_request.dict())
     client_dict = client.dict()
     client_dict["created_at"] = client_dict["created_at"].isoformat()
     client_dict["updated_at"] = client_dict["updated_at"].isoformat()
     
     clients_collection.insert_one(client_dict)
+    autocomplete_cache.upsert(user_id, EntityType.CLIENTS, client.id, client.name)
+    publish_change(user_id, "client.created", client_dict, {"clients_count": 1})
+    await record_activity(user_id, "client.created", client.id, client.name)
     return client
 
 @app.get("/api/clients")
-async def get_clients():
-    user_id = get_current_user_id()
-    clients = list(clients_collection.find({"user_id": user_id}))
-    for client in clients:
-        client["_id"] = str(client["_id"])
-    return clients
+async def get_clients(user_id: str = Depends(get_current_user_id)):
+    return find_user_documents(clients_collection, user_id)
+
+@app.post("/api/clients/batch-get")
+async def batch_get_clients(batch_request: BatchGetRequest, user_id: str = Depends(get_current_user_id)):
+    return batch_get_documents(clients_collection, user_id, batch_request.ids)
 
 @app.get("/api/clients/{client_id}")
-async def get_client(client_id: str):
-    user_id = get_current_user_id()
+async def get_client(client_id: str, user_id: str = Depends(get_current_user_id)):
     client = clients_collection.find_one({"id": client_id, "user_id": user_id})
     if not client:
         raise HTTPException(status_code=404, detail="Client not found")
@@ -461,36 +1851,67 @@ async def get_client(client_id: str):
     return client
 
 @app.put("/api/clients/{client_id}")
-async def update_client(client_id: str, client_request: ClientRequest):
-    user_id = get_current_user_id()
-    client = clients_collection.find_one({"id": client_id, "user_id": user_id})
-    if not client:
-        raise HTTPException(status_code=404, detail="Client not found")
-    
+async def update_client(client_id: str, client_request: ClientRequest, background_tasks: BackgroundTasks, user_id: str = Depends(get_current_user_id)):
     update_data = client_request.dict()
     update_data["updated_at"] = datetime.utcnow().isoformat()
     
-    clients_collection.update_one({"id": client_id, "user_id": user_id}, {"$set": update_data})
+    # The previous version tells us whether the name copies need refreshing
+    client = clients_collection.find_one_and_update(
+        {"id": client_id, "user_id": user_id},
+        {"$set": update_data},
+        {"name": 1},
+        return_document=ReturnDocument.BEFORE,
+    )
+    if not client:
+        raise HTTPException(status_code=404, detail="Client not found")
+    if client.get("name") != update_data["name"]:
+        background_tasks.add_task(fan_out_name, clients_collection, user_id, client_id)
+    autocomplete_cache.upsert(user_id, EntityType.CLIENTS, client_id, update_data["name"])
+    publish_change(user_id, "client.updated", {"id": client_id, **update_data})
+    await record_activity(user_id, "client.updated", client_id, update_data["name"])
     return {"message": "Client updated successfully"}
 
 @app.delete("/api/clients/{client_id}")
-async def delete_client(client_id: str):
-    user_id = get_current_user_id()
-    result = clients_collection.delete_one({"id": client_id, "user_id": user_id})
-    if result.deleted_count == 0:
+async def delete_client(client_id: str, mode: DeleteMode = DeleteMode.CASCADE, user_id: str = Depends(get_current_user_id)):
+    """Delete a client together with its projects; archive mode keeps copies of both"""
+    
+    def delete(session):
+        client = clients_collection.find_one_and_delete({"id": client_id, "user_id": user_id}, session=session)
+        if not client:
+            return None, []
+        projects = list(projects_collection.find({"user_id": user_id, "client_id": client_id}, session=session))
+        project_ids = [project["id"] for project in projects]
+        if project_ids:
+            projects_collection.delete_many({"user_id": user_id, "id": {"$in": project_ids}}, session=session)
+        if mode == DeleteMode.ARCHIVE:
+            archive_documents(archived_clients_collection, [client], session)
+            archive_documents(archived_projects_collection, projects, session)
+        detach_payments(user_id, "client_id", [client_id], session)
+        detach_payments(user_id, "project_id", project_ids, session)
+        record_deletions(user_id, "clients", [client_id], session)
+        record_deletions(user_id, "projects", project_ids, session)
+        return client, projects
+    
+    client, projects = run_transaction(delete)
+    if not client:
         raise HTTPException(status_code=404, detail="Client not found")
-    return {"message": "Client deleted successfully"}
+    autocomplete_cache.remove(user_id, EntityType.CLIENTS, client_id)
+    publish_change(user_id, "client.deleted", {"id": client_id}, {"clients_count": -1})
+    forget_projects(user_id, projects)
+    await record_activity(
+        user_id, "client.deleted", client_id, client.get("name"), mode=mode.value, projects_deleted=len(projects)
+    )
+    return {"message": "Client deleted successfully", "projects_deleted": len(projects)}
 
 # Project endpoints
 @app.post("/api/projects")
-async def create_project(project_request: ProjectRequest):
-    user_id = get_current_user_id()
+async def create_project(project_request: ProjectRequest, user_id: str = Depends(get_current_user_id)):
     # Verify client exists
-    client = clients_collection.find_one({"id": project_request.client_id, "user_id": user_id})
+    client = clients_collection.find_one({"id": project_request.client_id, "user_id": user_id}, {"name": 1})
     if not client:
         raise HTTPException(status_code=404, detail="Client not found")
     
-    project = Project(user_id=user_id, **project_request.dict())
+    project = Project(user_id=user_id, client_name=client["name"], **project_request.dict())
     project_dict = project.dict()
     project_dict["created_at"] = project_dict["created_at"].isoformat()
     project_dict["updated_at"] = project_dict["updated_at"].isoformat()
@@ -500,42 +1921,35 @@ async def create_project(project_request: ProjectRequest):
         project_dict["end_date"] = project_dict["end_date"].isoformat()
     
     projects_collection.insert_one(project_dict)
+    profitability_cache.invalidate(user_id)
+    autocomplete_cache.upsert(user_id, EntityType.PROJECTS, project.id, project.name)
+    publish_change(user_id, "project.created", project_dict, {"projects_count": 1, "active_projects": 1})
+    await record_activity(user_id, "project.created", project.id, project.name)
     return project
 
 @app.get("/api/projects")
-async def get_projects():
-    user_id = get_current_user_id()
-    projects = list(projects_collection.find({"user_id": user_id}))
-    for project in projects:
-        project["_id"] = str(project["_id"])
-        # Get client info
-        client = clients_collection.find_one({"id": project["client_id"], "user_id": user_id})
-        if client:
-            project["client_name"] = client["name"]
+async def get_projects(user_id: str = Depends(get_current_user_id)):
+    projects = find_user_documents(projects_collection, user_id)
+    fill_missing_names(user_id, projects, PROJECT_NAME_FIELDS)
     return projects
 
+@app.post("/api/projects/batch-get")
+async def batch_get_projects(batch_request: BatchGetRequest, user_id: str = Depends(get_current_user_id)):
+    batch = batch_get_documents(projects_collection, user_id, batch_request.ids)
+    fill_missing_names(user_id, batch["items"], PROJECT_NAME_FIELDS)
+    return batch
+
 @app.get("/api/projects/{project_id}")
-async def get_project(project_id: str):
-    user_id = get_current_user_id()
+async def get_project(project_id: str, user_id: str = Depends(get_current_user_id)):
     project = projects_collection.find_one({"id": project_id, "user_id": user_id})
     if not project:
         raise HTTPException(status_code=404, detail="Project not found")
     project["_id"] = str(project["_id"])
-    
-    # Get client info
-    client = clients_collection.find_one({"id": project["client_id"], "user_id": user_id})
-    if client:
-        project["client_name"] = client["name"]
-    
+    fill_missing_names(user_id, [project], PROJECT_NAME_FIELDS)
     return project
 
 @app.put("/api/projects/{project_id}")
-async def update_project(project_id: str, project_request: ProjectRequest):
-    user_id = get_current_user_id()
-    project = projects_collection.find_one({"id": project_id, "user_id": user_id})
-    if not project:
-        raise HTTPException(status_code=404, detail="Project not found")
-    
+async def update_project(project_id: str, project_request: ProjectRequest, background_tasks: BackgroundTasks, user_id: str = Depends(get_current_user_id)):
     update_data = project_request.dict()
     update_data["updated_at"] = datetime.utcnow().isoformat()
     if update_data["start_date"]:
@@ -543,40 +1957,75 @@ async def update_project(project_id: str, project_request: ProjectRequest):
     if update_data["end_date"]:
         update_data["end_date"] = update_data["end_date"].isoformat()
     
-    projects_collection.update_one({"id": project_id, "user_id": user_id}, {"$set": update_data})
+    # The previous version tells us whether the name copies need refreshing
+    project = projects_collection.find_one_and_update(
+        {"id": project_id, "user_id": user_id},
+        {"$set": update_data},
+        {"name": 1, "client_id": 1, "status": 1},
+        return_document=ReturnDocument.BEFORE,
+    )
+    if not project:
+        raise HTTPException(status_code=404, detail="Project not found")
+    if project.get("name") != update_data["name"]:
+        background_tasks.add_task(fan_out_name, projects_collection, user_id, project_id)
+    if project.get("client_id") != update_data["client_id"]:
+        # Moving a project to another client is rare; refresh its own copy inline
+        client_names = name_map(clients_collection, user_id, [update_data["client_id"]])
+        update_data["client_name"] = client_names.get(update_data["client_id"])
+        projects_collection.update_one(
+            {"id": project_id, "user_id": user_id},
+            {"$set": {"client_name": update_data["client_name"]}},
+        )
+    profitability_cache.invalidate(user_id)
+    autocomplete_cache.upsert(user_id, EntityType.PROJECTS, project_id, update_data["name"])
+    publish_change(user_id, "project.updated", {"id": project_id, "status": project["status"], **update_data})
+    await record_activity(user_id, "project.updated", project_id, update_data["name"])
     return {"message": "Project updated successfully"}
 
 @app.delete("/api/projects/{project_id}")
-async def delete_project(project_id: str):
-    user_id = get_current_user_id()
-    result = projects_collection.delete_one({"id": project_id, "user_id": user_id})
-    if result.deleted_count == 0:
+async def delete_project(project_id: str, mode: DeleteMode = DeleteMode.CASCADE, user_id: str = Depends(get_current_user_id)):
+    
+    def delete(session):
+        project = projects_collection.find_one_and_delete({"id": project_id, "user_id": user_id}, session=session)
+        if not project:
+            return None
+        if mode == DeleteMode.ARCHIVE:
+            archive_documents(archived_projects_collection, [project], session)
+        detach_payments(user_id, "project_id", [project_id], session)
+        record_deletions(user_id, "projects", [project_id], session)
+        return project
+    
+    project = run_transaction(delete)
+    if not project:
         raise HTTPException(status_code=404, detail="Project not found")
+    forget_projects(user_id, [project])
+    await record_activity(user_id, "project.deleted", project_id, project.get("name"), mode=mode.value)
     return {"message": "Project deleted successfully"}
 
 # Team members endpoints
 @app.post("/api/team-members")
-async def create_team_member(team_member_request: TeamMemberRequest):
-    user_id = get_current_user_id()
+async def create_team_member(team_member_request: TeamMemberRequest, user_id: str = Depends(get_current_user_id)):
     team_member = TeamMember(user_id=user_id, **team_member_request.dict())
     team_member_dict = team_member.dict()
     team_member_dict["created_at"] = team_member_dict["created_at"].isoformat()
     team_member_dict["updated_at"] = team_member_dict["updated_at"].isoformat()
     
     team_members_collection.insert_one(team_member_dict)
+    autocomplete_cache.upsert(user_id, EntityType.TEAM_MEMBERS, team_member.id, team_member.name)
+    publish_change(user_id, "team_member.created", team_member_dict, {"team_members_count": 1})
+    await record_activity(user_id, "team_member.created", team_member.id, team_member.name)
     return team_member
 
 @app.get("/api/team-members")
-async def get_team_members():
-    user_id = get_current_user_id()
-    team_members = list(team_members_collection.find({"user_id": user_id}))
-    for member in team_members:
-        member["_id"] = str(member["_id"])
-    return team_members
+async def get_team_members(user_id: str = Depends(get_current_user_id)):
+    return find_user_documents(team_members_collection, user_id)
+
+@app.post("/api/team-members/batch-get")
+async def batch_get_team_members(batch_request: BatchGetRequest, user_id: str = Depends(get_current_user_id)):
+    return batch_get_documents(team_members_collection, user_id, batch_request.ids)
 
 @app.get("/api/team-members/{member_id}")
-async def get_team_member(member_id: str):
-    user_id = get_current_user_id()
+async def get_team_member(member_id: str, user_id: str = Depends(get_current_user_id)):
     member = team_members_collection.find_one({"id": member_id, "user_id": user_id})
     if not member:
         raise HTTPException(status_code=404, detail="Team member not found")
@@ -584,31 +2033,190 @@ async def get_team_member(member_id: str):
     return member
 
 @app.put("/api/team-members/{member_id}")
-async def update_team_member(member_id: str, team_member_request: TeamMemberRequest):
-    user_id = get_current_user_id()
-    member = team_members_collection.find_one({"id": member_id, "user_id": user_id})
-    if not member:
-        raise HTTPException(status_code=404, detail="Team member not found")
-    
+async def update_team_member(member_id: str, team_member_request: TeamMemberRequest, background_tasks: BackgroundTasks, user_id: str = Depends(get_current_user_id)):
     update_data = team_member_request.dict()
     update_data["updated_at"] = datetime.utcnow().isoformat()
     
-    team_members_collection.update_one({"id": member_id, "user_id": user_id}, {"$set": update_data})
+    # The previous version tells us whether the name copies need refreshing
+    member = team_members_collection.find_one_and_update(
+        {"id": member_id, "user_id": user_id},
+        {"$set": update_data},
+        {"name": 1},
+        return_document=ReturnDocument.BEFORE,
+    )
+    if not member:
+        raise HTTPException(status_code=404, detail="Team member not found")
+    if member.get("name") != update_data["name"]:
+        background_tasks.add_task(fan_out_name, team_members_collection, user_id, member_id)
+    autocomplete_cache.upsert(user_id, EntityType.TEAM_MEMBERS, member_id, update_data["name"])
+    publish_change(user_id, "team_member.updated", {"id": member_id, **update_data})
+    await record_activity(user_id, "team_member.updated", member_id, update_data["name"])
     return {"message": "Team member updated successfully"}
 
 @app.delete("/api/team-members/{member_id}")
-async def delete_team_member(member_id: str):
-    user_id = get_current_user_id()
-    result = team_members_collection.delete_one({"id": member_id, "user_id": user_id})
-    if result.deleted_count == 0:
+async def delete_team_member(member_id: str, user_id: str = Depends(get_current_user_id)):
+    
+    def delete(session):
+        member = team_members_collection.find_one_and_delete(
+            {"id": member_id, "user_id": user_id}, {"name": 1}, session=session
+        )
+        if not member:
+            return None
+        detach_payments(user_id, "team_member_id", [member_id], session)
+        record_deletions(user_id, "team_members", [member_id], session)
+        return member
+    
+    member = run_transaction(delete)
+    if not member:
         raise HTTPException(status_code=404, detail="Team member not found")
+    autocomplete_cache.remove(user_id, EntityType.TEAM_MEMBERS, member_id)
+    publish_change(user_id, "team_member.deleted", {"id": member_id}, {"team_members_count": -1})
+    await record_activity(user_id, "team_member.deleted", member_id, member.get("name"))
     return {"message": "Team member deleted successfully"}
 
+# Revenue rollups
+# One document per user, day and currency holding completed payment totals.
+# Payments are bucketed by the day they were created.
+
+def record_payment_rollup(payment):
+    """Fold a newly completed payment into its daily rollup"""
+    field = "received" if payment["payment_type"] == PaymentType.RECEIVED else "sent"
+    payment_rollups_collection.update_one(
+        {"user_id": payment["user_id"], "day": payment["created_at"][:10], "currency": payment.get("currency", "usd")},
+        {"$inc": {field: payment["amount"], f"{field}_count": 1}},
+        upsert=True,
+    )
+
+def rebuild_payment_rollups(user_id):
+    """Recompute a user's rollups from their completed payments, archived ones included.
+
+    Buckets are replaced in place and only days that no longer have payments
+    are deleted, so a payment completing meanwhile never meets a missing or
+    duplicate bucket. With transactions the rebuild is also a consistent
+    snapshot; without them such a payment's increment may be overwritten
+    until the next rebuild.
+    """
+    completed = {"user_id": user_id, "payment_status": PaymentStatus.COMPLETED}
+
+    def rebuild(session):
+        rollups = payment_transactions_collection.aggregate([
+            {"$match": completed},
+            {"$unionWith": {"coll": payment_archive_collection.name, "pipeline": [{"$match": completed}]}},
+            {"$group": {
+                "_id": {"day": {"$substrBytes": ["$created_at", 0, 10]}, "currency": "$currency"},
+                "received": {"$sum": {"$cond": [{"$eq": ["$payment_type", PaymentType.RECEIVED]}, "$amount", 0]}},
+                "sent": {"$sum": {"$cond": [{"$eq": ["$payment_type", PaymentType.SENT]}, "$amount", 0]}},
+                "received_count": {"$sum": {"$cond": [{"$eq": ["$payment_type", PaymentType.RECEIVED]}, 1, 0]}},
+                "sent_count": {"$sum": {"$cond": [{"$eq": ["$payment_type", PaymentType.SENT]}, 1, 0]}},
+            }},
+        ], session=session)
+        buckets = {
+            (rollup["_id"]["day"], rollup["_id"]["currency"]): {field: rollup[field] for field in ROLLUP_FIELDS}
+            for rollup in rollups
+        }
+        if buckets:
+            payment_rollups_collection.bulk_write([
+                ReplaceOne(
+                    {"user_id": user_id, "day": day, "currency": currency},
+                    {"user_id": user_id, "day": day, "currency": currency, **totals},
+                    upsert=True,
+                )
+                for (day, currency), totals in buckets.items()
+            ], ordered=False, session=session)
+        stale = [
+            rollup["_id"]
+            for rollup in payment_rollups_collection.find({"user_id": user_id}, {"day": 1, "currency": 1}, session=session)
+            if (rollup["day"], rollup.get("currency")) not in buckets
+        ]
+        if stale:
+            payment_rollups_collection.delete_many({"_id": {"$in": stale}}, session=session)
+        return len(buckets)
+
+    return run_transaction(rebuild)
+
+def backfill_payment_rollups():
+    """Build rollups once for every user, covering payments completed before rollups existed.
+
+    The marker is claimed atomically, so only one worker runs the backfill;
+    it is released again if the backfill fails.
+    """
+    try:
+        migrations_collection.insert_one({"_id": "payment_rollups", "started_at": datetime.utcnow().isoformat()})
+    except pymongo.errors.DuplicateKeyError:
+        return 0
+    try:
+        completed = {"payment_status": PaymentStatus.COMPLETED}
+        users = payment_transactions_collection.aggregate([
+            {"$match": completed},
+            {"$unionWith": {"coll": payment_archive_collection.name, "pipeline": [{"$match": completed}]}},
+            {"$group": {"_id": "$user_id"}},
+        ])
+        user_ids = [user["_id"] for user in users]
+        for user_id in user_ids:
+            rebuild_payment_rollups(user_id)
+    except Exception:
+        migrations_collection.delete_one({"_id": "payment_rollups"})
+        raise
+    migrations_collection.update_one(
+        {"_id": "payment_rollups"}, {"$set": {"finished_at": datetime.utcnow().isoformat(), "users": len(user_ids)}}
+    )
+    if user_ids:
+        logger.info("Backfilled payment rollups for %d users", len(user_ids))
+    return len(user_ids)
+
+# Payment archival
+# Settled payments older than PAYMENT_ARCHIVE_AFTER_DAYS move to a cold
+# collection so the hot one and its indexes stay small. Rollups already
+# hold their totals, so archiving does not change any reported figure.
+# Archived payments leave /api/sync like deleted ones, through tombstones.
+PAYMENT_ARCHIVE_AFTER_DAYS = int(os.environ.get("PAYMENT_ARCHIVE_AFTER_DAYS", "365"))
+PAYMENT_ARCHIVE_INTERVAL_SECONDS = int(os.environ.get("PAYMENT_ARCHIVE_INTERVAL_SECONDS", "86400"))
+PAYMENT_ARCHIVE_BATCH_SIZE = int(os.environ.get("PAYMENT_ARCHIVE_BATCH_SIZE", "1000"))
+SETTLED_PAYMENT_STATUSES = [PaymentStatus.COMPLETED, PaymentStatus.CANCELLED]
+
+def archive_settled_payments(older_than_days=None):
+    """Move settled payments into the archive in batches, returning how many moved.
+
+    Copies are upserts keyed on _id, so a batch interrupted between the copy
+    and the delete is simply copied again on the next run. Tombstones are
+    written before the delete for the same reason; a repeated one is harmless.
+    """
+    if older_than_days is None:
+        older_than_days = PAYMENT_ARCHIVE_AFTER_DAYS
+    cutoff = (datetime.utcnow() - timedelta(days=older_than_days)).isoformat()
+    query = {"payment_status": {"$in": SETTLED_PAYMENT_STATUSES}, "created_at": {"$lt": cutoff}}
+    moved = 0
+    while True:
+        batch = list(payment_transactions_collection.find(query).sort("created_at", 1).limit(PAYMENT_ARCHIVE_BATCH_SIZE))
+        if not batch:
+            return moved
+        archived_at = datetime.utcnow().isoformat()
+        payment_archive_collection.bulk_write(
+            [ReplaceOne({"_id": payment["_id"]}, {**payment, "archived_at": archived_at}, upsert=True) for payment in batch],
+            ordered=False,
+        )
+        payment_ids_by_user = {}
+        for payment in batch:
+            payment_ids_by_user.setdefault(payment["user_id"], []).append(payment["id"])
+        for payment_user_id, payment_ids in payment_ids_by_user.items():
+            record_deletions(payment_user_id, "payments", payment_ids)
+        payment_transactions_collection.delete_many({"_id": {"$in": [payment["_id"] for payment in batch]}})
+        moved += len(batch)
+
+async def archive_payments_periodically():
+    while True:
+        await asyncio.sleep(PAYMENT_ARCHIVE_INTERVAL_SECONDS)
+        try:
+            moved = await asyncio.to_thread(archive_settled_payments)
+            if moved:
+                logger.info("Archived %d settled payments", moved)
+        except pymongo.errors.PyMongoError as e:
+            logger.warning("Payment archival failed: %s", e)
+
 # Payment endpoints
 @app.post("/api/payments/v1/checkout/session")
-async def create_checkout_session(request: Request):
+async def create_checkout_session(request: Request, user_id: str = Depends(get_current_user_id)):
     try:
-        user_id = get_current_user_id()
         body = await request.json()
         
         # Get origin from request headers
@@ -621,6 +2229,7 @@ async def create_checkout_session(request: Request):
         cancel_url = f"{origin}/payment-cancelled"
         
         # Create checkout session request
+        stripe_checkout, CheckoutSessionRequest = stripe_gateway.load()
         checkout_request = CheckoutSessionRequest(
             amount=float(body.get("amount", 0)),
             currency=body.get("currency", "usd"),
@@ -632,6 +2241,12 @@ async def create_checkout_session(request: Request):
         # Create checkout session
         session = await stripe_checkout.create_checkout_session(checkout_request)
         
+        # Store the referenced names with the payment so reads need no joins
+        names = {}
+        for id_field, name_field, collection in PAYMENT_NAME_FIELDS:
+            if body.get(id_field):
+                names[name_field] = name_map(collection, user_id, [body[id_field]]).get(body[id_field])
+        
         # Create payment transaction record
         payment_transaction = PaymentTransaction(
             user_id=user_id,
@@ -642,7 +2257,8 @@ async def create_checkout_session(request: Request):
             client_id=body.get("client_id"),
             project_id=body.get("project_id"),
             stripe_session_id=session.session_id,
-            payment_status=PaymentStatus.PENDING
+            payment_status=PaymentStatus.PENDING,
+            **names
         )
         
         transaction_dict = payment_transaction.dict()
@@ -650,6 +2266,11 @@ async def create_checkout_session(request: Request):
         transaction_dict["updated_at"] = transaction_dict["updated_at"].isoformat()
         
         payment_transactions_collection.insert_one(transaction_dict)
+        publish_change(user_id, "payment.created", transaction_dict)
+        await record_activity(
+            user_id, "payment.created", payment_transaction.id, payment_transaction.description,
+            amount=payment_transaction.amount, currency=payment_transaction.currency,
+        )
         
         return {"url": session.url, "session_id": session.session_id}
         
@@ -657,28 +2278,38 @@ async def create_checkout_session(request: Request):
         raise HTTPException(status_code=500, detail=str(e))
 
 @app.get("/api/payments/v1/checkout/status/{session_id}")
-async def get_checkout_status(session_id: str):
+async def get_checkout_status(session_id: str, user_id: str = Depends(get_current_user_id)):
     try:
-        user_id = get_current_user_id()
         # Get status from Stripe
+        stripe_checkout, _ = stripe_gateway.load()
         checkout_status = await stripe_checkout.get_checkout_status(session_id)
         
-        # Update payment transaction in database
-        payment_transaction = payment_transactions_collection.find_one({
-            "stripe_session_id": session_id,
-            "user_id": user_id
-        })
+        new_status = PaymentStatus.COMPLETED if checkout_status.payment_status == "paid" else PaymentStatus.PENDING
+        if checkout_status.status == "expired":
+            new_status = PaymentStatus.CANCELLED
+        
+        # Update payment transaction in database. Only a real status transition
+        # matches, so a completed payment is counted into its rollup exactly
+        # once however often it is polled
+        payment_transaction = payment_transactions_collection.find_one_and_update(
+            {"stripe_session_id": session_id, "user_id": user_id, "payment_status": {"$ne": new_status}},
+            {"$set": {
+                "payment_status": new_status,
+                "updated_at": datetime.utcnow().isoformat()
+            }},
+            return_document=ReturnDocument.AFTER,
+        )
         if payment_transaction:
-            new_status = PaymentStatus.COMPLETED if checkout_status.payment_status == "paid" else PaymentStatus.PENDING
-            if checkout_status.status == "expired":
-                new_status = PaymentStatus.CANCELLED
-            
-            payment_transactions_collection.update_one(
-                {"stripe_session_id": session_id, "user_id": user_id},
-                {"$set": {
-                    "payment_status": new_status,
-                    "updated_at": datetime.utcnow().isoformat()
-                }}
+            profitability_cache.invalidate(user_id)
+            if new_status == PaymentStatus.COMPLETED:
+                record_payment_rollup(payment_transaction)
+                total_field = "total_received" if payment_transaction["payment_type"] == PaymentType.RECEIVED else "total_sent"
+                publish_change(user_id, "payment.completed", payment_transaction, {total_field: payment_transaction["amount"]})
+            else:
+                publish_change(user_id, "payment.updated", payment_transaction)
+            await record_activity(
+                user_id, "payment.updated", payment_transaction["id"], payment_transaction.get("description"),
+                payment_status=new_status.value,
             )
         
         return {
@@ -691,48 +2322,39 @@ async def get_checkout_status(session_id: str):
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
+def fetch_payments(user_id, include_archived=False):
+    payments = find_user_documents(payment_transactions_collection, user_id)
+    if include_archived:
+        payments += find_user_documents(payment_archive_collection, user_id)
+    return fill_missing_names(user_id, payments, PAYMENT_NAME_FIELDS)
+
 @app.get("/api/payments")
-async def get_payments():
-    user_id = get_current_user_id()
-    payments = list(payment_transactions_collection.find({"user_id": user_id}))
-    for payment in payments:
-        payment["_id"] = str(payment["_id"])
-        
-        # Get client info if available
-        if payment.get("client_id"):
-            client = clients_collection.find_one({"id": payment["client_id"], "user_id": user_id})
-            if client:
-                payment["client_name"] = client["name"]
-        
-        # Get team member info if available
-        if payment.get("team_member_id"):
-            member = team_members_collection.find_one({"id": payment["team_member_id"], "user_id": user_id})
-            if member:
-                payment["team_member_name"] = member["name"]
-        
-        # Get project info if available
-        if payment.get("project_id"):
-            project = projects_collection.find_one({"id": payment["project_id"], "user_id": user_id})
-            if project:
-                payment["project_name"] = project["name"]
-    
-    return payments
+async def get_payments(include_archived: bool = False, user_id: str = Depends(get_current_user_id)):
+    return await single_flight.run(
+        (user_id, "payments", include_archived),
+        lambda: asyncio.to_thread(fetch_payments, user_id, include_archived),
+    )
+
+@app.post("/api/payments/batch-get")
+async def batch_get_payments(batch_request: BatchGetRequest, user_id: str = Depends(get_current_user_id)):
+    batch = batch_get_documents(payment_transactions_collection, user_id, batch_request.ids)
+    fill_missing_names(user_id, batch["items"], PAYMENT_NAME_FIELDS)
+    return batch
 
 @app.get("/api/payments/{payment_id}")
-async def get_payment(payment_id: str):
-    user_id = get_current_user_id()
+async def get_payment(payment_id: str, user_id: str = Depends(get_current_user_id)):
     payment = payment_transactions_collection.find_one({"id": payment_id, "user_id": user_id})
+    if not payment:
+        payment = payment_archive_collection.find_one({"id": payment_id, "user_id": user_id})
     if not payment:
         raise HTTPException(status_code=404, detail="Payment not found")
     
     payment["_id"] = str(payment["_id"])
+    fill_missing_names(user_id, [payment], PAYMENT_NAME_FIELDS)
     return payment
 
 # Dashboard endpoints
-@app.get("/api/dashboard/stats")
-async def get_dashboard_stats():
-    user_id = get_current_user_id()
-    
+def fetch_dashboard_stats(user_id):
     # Get counts
     clients_count = clients_collection.count_documents({"user_id": user_id})
     projects_count = projects_collection.count_documents({"user_id": user_id})
@@ -741,27 +2363,13 @@ async def get_dashboard_stats():
     # Get active projects
     active_projects = projects_collection.count_documents({"user_id": user_id, "status": "active"})
     
-    # Get payment statistics
-    total_received = 0
-    total_sent = 0
-    
-    received_payments = payment_transactions_collection.find({
-        "user_id": user_id,
-        "payment_type": "received",
-        "payment_status": "completed"
-    })
-    
-    for payment in received_payments:
-        total_received += payment.get("amount", 0)
-    
-    sent_payments = payment_transactions_collection.find({
-        "user_id": user_id,
-        "payment_type": "sent",
-        "payment_status": "completed"
-    })
-    
-    for payment in sent_payments:
-        total_sent += payment.get("amount", 0)
+    # Get payment statistics from the daily rollups, which also cover archived payments
+    totals = next(payment_rollups_collection.aggregate([
+        {"$match": {"user_id": user_id}},
+        {"$group": {"_id": None, "received": {"$sum": "$received"}, "sent": {"$sum": "$sent"}}},
+    ]), {})
+    total_received = totals.get("received", 0)
+    total_sent = totals.get("sent", 0)
     
     # Get recent payments
     recent_payments = list(payment_transactions_collection.find({"user_id": user_id}).sort("created_at", -1).limit(5))
@@ -778,6 +2386,934 @@ async def get_dashboard_stats():
         "recent_payments": recent_payments
     }
 
+@app.get("/api/dashboard/stats")
+async def get_dashboard_stats(user_id: str = Depends(get_current_user_id)):
+    return await single_flight.run(
+        (user_id, "dashboard-stats"),
+        lambda: asyncio.to_thread(fetch_dashboard_stats, user_id),
+    )
+
+# Bootstrap endpoint
+BOOTSTRAP_SECTIONS = [
+    "user", "integrations", "clients", "projects", "team_members",
+    "payments", "upcoming_meetings", "dashboard_stats",
+]
+
+@app.get("/api/bootstrap")
+async def bootstrap(sections: Optional[str] = None, user_id: str = Depends(get_current_user_id)):
+    """Everything the app needs on page load, gathered concurrently in one response"""
+    requested = set(sections.split(",")) if sections else set(BOOTSTRAP_SECTIONS)
+    unknown = requested - set(BOOTSTRAP_SECTIONS)
+    if unknown:
+        raise HTTPException(status_code=400, detail=f"Unknown bootstrap sections: {', '.join(sorted(unknown))}")
+    return await single_flight.run(
+        (user_id, "bootstrap", tuple(sorted(requested))),
+        lambda: load_bootstrap(user_id, requested),
+    )
+
+async def load_bootstrap(user_id, requested):
+    # Projects and payments carry their names, so every section is one read
+    loaders = {}
+    if "user" in requested:
+        loaders["user"] = lambda: fetch_current_user(user_id)
+    if "integrations" in requested:
+        loaders["integrations"] = lambda: fetch_integrations(user_id)
+    if "clients" in requested:
+        loaders["clients"] = lambda: find_user_documents(clients_collection, user_id)
+    if "team_members" in requested:
+        loaders["team_members"] = lambda: find_user_documents(team_members_collection, user_id)
+    if "projects" in requested:
+        loaders["projects"] = lambda: fill_missing_names(
+            user_id, find_user_documents(projects_collection, user_id), PROJECT_NAME_FIELDS
+        )
+    if "payments" in requested:
+        loaders["payments"] = lambda: fetch_payments(user_id)
+    if "upcoming_meetings" in requested:
+        loaders["upcoming_meetings"] = lambda: fetch_upcoming_meetings(user_id)
+    if "dashboard_stats" in requested:
+        loaders["dashboard_stats"] = lambda: fetch_dashboard_stats(user_id)
+
+    # pymongo is blocking, so each read runs on its own worker thread
+    results = await asyncio.gather(*(asyncio.to_thread(loader) for loader in loaders.values()))
+    data = dict(zip(loaders, results))
+    return {section: data[section] for section in BOOTSTRAP_SECTIONS if section in requested}
+
+# Analytics endpoints
+PERIOD_FREQUENCIES = {Granularity.WEEK: "W", Granularity.MONTH: "M"}
+
+@app.get("/api/analytics/revenue")
+async def get_revenue_analytics(
+    granularity: Granularity = Granularity.DAY,
+    from_date: Optional[date] = Query(None, alias="from"),
+    to_date: Optional[date] = Query(None, alias="to"),
+    currency: Optional[str] = None,
+    user_id: str = Depends(get_current_user_id),
+):
+    """Revenue time series built from the daily payment rollups"""
+    query = {"user_id": user_id}
+    day_range = {}
+    if from_date:
+        day_range["$gte"] = from_date.isoformat()
+    if to_date:
+        day_range["$lte"] = to_date.isoformat()
+    if day_range:
+        query["day"] = day_range
+    if currency:
+        query["currency"] = currency.lower()
+
+    rollups = list(payment_rollups_collection.find(query, {"_id": 0, "user_id": 0}))
+    # The DataFrame work (and a pandas import on a cold worker) stays off the event loop
+    series = await asyncio.to_thread(build_revenue_series, rollups, granularity) if rollups else []
+    return {
+        "granularity": granularity,
+        "from": from_date,
+        "to": to_date,
+        "series": series,
+    }
+
+def build_revenue_series(rollups, granularity):
+    # pandas dominates import time and only this endpoint needs it
+    import pandas as pd
+
+    frame = pd.DataFrame(rollups).reindex(columns=["day", "currency", *ROLLUP_FIELDS]).fillna(0)
+    period = pd.to_datetime(frame["day"])
+    if granularity in PERIOD_FREQUENCIES:
+        period = period.dt.to_period(PERIOD_FREQUENCIES[granularity]).dt.start_time
+    frame["period"] = period.dt.strftime("%Y-%m-%d")
+
+    series = frame.groupby(["period", "currency"], sort=True)[ROLLUP_FIELDS].sum().reset_index()
+    series["net"] = series["received"] - series["sent"]
+    series[["received_count", "sent_count"]] = series[["received_count", "sent_count"]].astype(int)
+    return series.to_dict("records")
+
+@app.post("/api/analytics/revenue/rebuild", dependencies=[Depends(require_admin)])
+async def rebuild_revenue_analytics(user_id: str = Depends(get_current_user_id)):
+    """Recompute the current user's rollups from their payment history"""
+    # Reads the full payment history; repeated requests share one run
+    rollups = await single_flight.run(
+        (user_id, "revenue-rebuild"),
+        lambda: asyncio.to_thread(rebuild_payment_rollups, user_id),
+    )
+    return {"rollups": rollups}
+
+# Live event stream
+def format_sse(sequence, event, data):
+    return f"id: {sequence}\nevent: {event}\ndata: {json.dumps(data, default=str)}\n\n"
+
+@app.get("/api/events/stream")
+async def stream_events(request: Request, user_id: str = Depends(get_stream_user_id)):
+    """Server-Sent Events stream of the current user's changes"""
+    queue = event_bus.subscribe(user_id)
+
+    async def event_source():
+        try:
+            yield "retry: 5000\n\n"
+            while True:
+                try:
+                    message = await asyncio.wait_for(queue.get(), timeout=SSE_KEEPALIVE_SECONDS)
+                except asyncio.TimeoutError:
+                    if await request.is_disconnected():
+                        break
+                    yield ": keepalive\n\n"
+                    continue
+                yield format_sse(*message)
+        finally:
+            event_bus.unsubscribe(user_id, queue)
+
+    return StreamingResponse(
+        event_source(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+# Sync endpoints
+@app.get("/api/sync")
+async def sync(since: Optional[str] = None, user_id: str = Depends(get_current_user_id)):
+    """Documents changed and tombstones recorded since a previous sync token"""
+    started_at = datetime.utcnow()
+    since_time = decode_sync_token(since) if since else None
+    # Tombstones older than the TTL are gone, so such a client must start over
+    full = since_time is None or since_time < started_at - timedelta(days=SYNC_TOMBSTONE_TTL_DAYS)
+
+    changes = {}
+    for entity, collection in SYNC_COLLECTIONS.items():
+        query = {"user_id": user_id}
+        if not full:
+            query["updated_at"] = {"$gt": since_time.isoformat()}
+        changes[entity] = list(collection.find(query, {"_id": 0}))
+
+    deleted = {entity: [] for entity in SYNC_COLLECTIONS}
+    if not full:
+        tombstones = deletions_collection.find(
+            {"user_id": user_id, "deleted_at": {"$gt": since_time}},
+            {"_id": 0, "entity": 1, "id": 1},
+        )
+        for tombstone in tombstones:
+            deleted.setdefault(tombstone["entity"], []).append(tombstone["id"])
+
+    return {
+        "token": encode_sync_token(started_at - SYNC_OVERLAP),
+        "full": full,
+        "changes": changes,
+        "deleted": deleted,
+    }
+
+# Consistency endpoints
+@app.post("/api/consistency/names")
+async def check_denormalized_names(repair: bool = False, user_id: str = Depends(get_current_user_id)):
+    """Report denormalized names that no longer match their source, optionally fixing them"""
+    stale = check_name_copies(user_id, repair=repair)
+    return {
+        "repaired": repair,
+        "stale": {field: len(mismatches) for field, mismatches in stale.items()},
+    }
+
+@app.post("/api/consistency/orphans")
+async def check_orphans(repair: bool = False, user_id: str = Depends(get_current_user_id)):
+    """Report projects and payment references left dangling by deletes, optionally cleaning them up"""
+    orphans = find_orphans(user_id)
+    if repair:
+        for owner_id, projects in remove_orphans(orphans).items():
+            forget_projects(owner_id, projects)
+    return {
+        "repaired": repair,
+        "projects": [project["id"] for project in orphans["projects"]],
+        "payments": [payment["id"] for payment in orphans["payments"]],
+    }
+
+# Report endpoints
+@app.get("/api/reports/project-profitability")
+async def get_project_profitability(
+    sort_by: ProfitabilitySortField = ProfitabilitySortField.PROFIT,
+    order: SortOrder = SortOrder.DESC,
+    skip: int = Query(0, ge=0),
+    limit: int = Query(50, ge=1, le=200),
+    user_id: str = Depends(get_current_user_id),
+):
+    """Budget vs. received vs. paid out for every project with completed payments"""
+    params = (sort_by, order, skip, limit)
+    cached = profitability_cache.get(user_id, params)
+    if cached is not None:
+        return cached
+
+    generation = profitability_cache.generation(user_id)
+    report = await single_flight.run(
+        (user_id, "project-profitability", params),
+        lambda: asyncio.to_thread(fetch_project_profitability, user_id, *params),
+    )
+    profitability_cache.set(user_id, params, report, generation)
+    return report
+
+def fetch_project_profitability(user_id, sort_by, order, skip, limit):
+    direction = pymongo.ASCENDING if order == SortOrder.ASC else pymongo.DESCENDING
+    completed = {"user_id": user_id, "payment_status": PaymentStatus.COMPLETED, "project_id": {"$ne": None}}
+    pipeline = [
+        {"$match": completed},
+        {"$unionWith": {"coll": payment_archive_collection.name, "pipeline": [{"$match": completed}]}},
+        {"$group": {
+            "_id": "$project_id",
+            "received": {"$sum": {"$cond": [{"$eq": ["$payment_type", PaymentType.RECEIVED]}, "$amount", 0]}},
+            "paid_out": {"$sum": {"$cond": [{"$eq": ["$payment_type", PaymentType.SENT]}, "$amount", 0]}},
+        }},
+        {"$lookup": {"from": projects_collection.name, "localField": "_id", "foreignField": "id", "as": "project"}},
+        {"$unwind": "$project"},
+        {"$match": {"project.user_id": user_id}},
+        {"$project": {
+            "_id": 0,
+            "project_id": "$_id",
+            "name": "$project.name",
+            "client_id": "$project.client_id",
+            "status": "$project.status",
+            "budget": "$project.budget",
+            "received": 1,
+            "paid_out": 1,
+            "profit": {"$subtract": ["$received", "$paid_out"]},
+            "budget_remaining": {"$subtract": ["$project.budget", "$paid_out"]},
+        }},
+        {"$facet": {
+            "total": [{"$count": "count"}],
+            "items": [
+                {"$sort": {sort_by.value: direction, "project_id": pymongo.ASCENDING}},
+                {"$skip": skip},
+                {"$limit": limit},
+            ],
+        }},
+    ]
+    result = next(payment_transactions_collection.aggregate(pipeline))
+    return {
+        "total": result["total"][0]["count"] if result["total"] else 0,
+        "skip": skip,
+        "limit": limit,
+        "items": result["items"],
+    }
+
+# Background jobs
+# Jobs are documents in the jobs collection, so they survive restarts and
+# any API process can run them. A worker claims the oldest queued job with a
+# single find_one_and_update and holds a lease on it that a heartbeat keeps
+# renewing. If the worker dies the lease lapses and another worker claims
+# the job again, up to JOB_MAX_ATTEMPTS times. CPU-bound stages such as
+# rendering run in a process pool so they do not stall the event loop.
+JOB_WORKERS = int(os.environ.get("JOB_WORKERS", "2"))
+JOB_PROCESS_WORKERS = int(os.environ.get("JOB_PROCESS_WORKERS", "2"))
+JOB_LEASE_SECONDS = int(os.environ.get("JOB_LEASE_SECONDS", "60"))
+JOB_HEARTBEAT_SECONDS = float(os.environ.get("JOB_HEARTBEAT_SECONDS", "5"))
+JOB_POLL_SECONDS = float(os.environ.get("JOB_POLL_SECONDS", "5"))
+JOB_MAX_ATTEMPTS = int(os.environ.get("JOB_MAX_ATTEMPTS", "3"))
+# Finished jobs and their results are purged this long after they finish
+JOB_RETENTION_DAYS = int(os.environ.get("JOB_RETENTION_DAYS", "7"))
+JOB_REAP_INTERVAL_SECONDS = int(os.environ.get("JOB_REAP_INTERVAL_SECONDS", "600"))
+JOB_SHUTDOWN_TIMEOUT_SECONDS = 5
+JOB_PARAMS = {
+    JobType.EXPORT: ExportJobParams,
+    JobType.PROJECT_PROFITABILITY: ProjectProfitabilityJobParams,
+    JobType.CLIENT_STATEMENTS: ClientStatementsJobParams,
+}
+
+class JobStopped(Exception):
+    """Raised inside a job once it has been cancelled or its lease was lost"""
+
+class JobContext:
+    """Handed to a job handler to report progress and offload CPU-bound work"""
+
+    def __init__(self, runner, job):
+        self.runner = runner
+        self.job = job
+        self.stop_reason = None
+
+    def running_filter(self):
+        return {"id": self.job["id"], "worker_id": self.runner.worker_id, "status": JobStatus.RUNNING}
+
+    async def progress(self, fraction, message=None):
+        """Record progress; raises JobStopped if the job should stop"""
+        job = await asyncio.to_thread(
+            jobs_collection.find_one_and_update,
+            self.running_filter(),
+            {"$set": {"progress": round(fraction, 3), "message": message}},
+            {"cancel_requested": 1},
+        )
+        self.check(job)
+
+    def check(self, job):
+        if job is None:
+            self.stop_reason = "lost"
+        elif job.get("cancel_requested"):
+            self.stop_reason = "cancelled"
+        if self.stop_reason:
+            raise JobStopped(self.stop_reason)
+
+    async def run_in_process(self, function, *args):
+        return await self.runner.run_in_process(function, *args)
+
+class JobRunner:
+    def __init__(self, workers, process_workers):
+        self.worker_id = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+        self.workers = workers
+        self.process_workers = process_workers
+        self.tasks = []
+        self.wakeup = asyncio.Event()
+        self._process_pool = None
+
+    def start(self):
+        self.tasks = [asyncio.create_task(self.work()) for _ in range(self.workers)]
+
+    def notify(self):
+        self.wakeup.set()
+
+    def process_pool(self):
+        if self._process_pool is None:
+            # spawn: forking a process that runs pymongo's threads can deadlock
+            self._process_pool = ProcessPoolExecutor(
+                max_workers=self.process_workers, mp_context=multiprocessing.get_context("spawn")
+            )
+        return self._process_pool
+
+    async def run_in_process(self, function, *args):
+        pool = self.process_pool()
+        try:
+            return await asyncio.get_running_loop().run_in_executor(pool, function, *args)
+        except BrokenProcessPool:
+            # A crashed child breaks the whole pool; start a fresh one for later calls
+            if self._process_pool is pool:
+                self._process_pool = None
+                pool.shutdown(wait=False, cancel_futures=True)
+            raise
+
+    def claim(self):
+        now = datetime.utcnow()
+        return jobs_collection.find_one_and_update(
+            {"$or": [
+                {"status": JobStatus.QUEUED},
+                {
+                    "status": JobStatus.RUNNING,
+                    "lease_expires_at": {"$lt": now},
+                    "attempts": {"$lt": JOB_MAX_ATTEMPTS},
+                    "cancel_requested": False,
+                },
+            ]},
+            {
+                "$set": {
+                    "status": JobStatus.RUNNING,
+                    "worker_id": self.worker_id,
+                    "lease_expires_at": now + timedelta(seconds=JOB_LEASE_SECONDS),
+                    "started_at": now.isoformat(),
+                },
+                "$inc": {"attempts": 1},
+            },
+            projection={"_id": 0},
+            sort=[("created_at", pymongo.ASCENDING)],
+            return_document=ReturnDocument.AFTER,
+        )
+
+    async def work(self):
+        while True:
+            self.wakeup.clear()
+            try:
+                job = await asyncio.to_thread(self.claim)
+            except pymongo.errors.PyMongoError as e:
+                logger.warning("Claiming a job failed: %s", e)
+                job = None
+            if job is None:
+                try:
+                    await asyncio.wait_for(self.wakeup.wait(), JOB_POLL_SECONDS)
+                except asyncio.TimeoutError:
+                    pass
+                continue
+            await self.execute(job)
+
+    async def execute(self, job):
+        context = JobContext(self, job)
+        task = asyncio.create_task(JOB_HANDLERS[job["type"]](job, context))
+        heartbeat = asyncio.create_task(self.heartbeat(context, task))
+        try:
+            output = await task
+            await asyncio.to_thread(store_job_result, job, output)
+            await self.finish(context, JobStatus.SUCCEEDED, progress=1, message=None, result={
+                "filename": output["filename"],
+                "content_type": output["content_type"],
+                "size": len(output["data"]),
+            })
+        except (JobStopped, asyncio.CancelledError):
+            if context.stop_reason is None:
+                # Shutting down; close() puts the job back in the queue
+                raise
+            if context.stop_reason == "cancelled":
+                await self.finish(context, JobStatus.CANCELLED)
+        except Exception as e:
+            logger.exception("Job %s (%s) failed", job["id"], job["type"])
+            await self.finish(context, JobStatus.FAILED, error=str(e) or type(e).__name__)
+        finally:
+            heartbeat.cancel()
+
+    async def heartbeat(self, context, task):
+        """Renew the lease and stop the job as soon as it is cancelled"""
+        while True:
+            await asyncio.sleep(JOB_HEARTBEAT_SECONDS)
+            job = await asyncio.to_thread(
+                jobs_collection.find_one_and_update,
+                context.running_filter(),
+                {"$set": {"lease_expires_at": datetime.utcnow() + timedelta(seconds=JOB_LEASE_SECONDS)}},
+                {"cancel_requested": 1},
+            )
+            try:
+                context.check(job)
+            except JobStopped:
+                task.cancel()
+                return
+
+    async def finish(self, context, status, **fields):
+        now = datetime.utcnow()
+        await asyncio.to_thread(
+            jobs_collection.update_one,
+            context.running_filter(),
+            {"$set": {
+                **fields,
+                "status": status,
+                "finished_at": now.isoformat(),
+                "expires_at": now + timedelta(days=JOB_RETENTION_DAYS),
+            }},
+        )
+
+    async def close(self):
+        for task in self.tasks:
+            task.cancel()
+        await asyncio.gather(*self.tasks, return_exceptions=True)
+        if self.tasks:
+            # Let another process pick up whatever was interrupted straight away;
+            # if Mongo is unreachable the leases simply run out instead
+            try:
+                await asyncio.wait_for(asyncio.to_thread(
+                    jobs_collection.update_many,
+                    {"worker_id": self.worker_id, "status": JobStatus.RUNNING},
+                    {"$set": {"status": JobStatus.QUEUED}, "$unset": {"worker_id": "", "lease_expires_at": ""}},
+                ), JOB_SHUTDOWN_TIMEOUT_SECONDS)
+            except (asyncio.TimeoutError, pymongo.errors.PyMongoError) as e:
+                logger.warning("Could not requeue interrupted jobs: %r", e)
+        if self._process_pool is not None:
+            self._process_pool.shutdown(wait=False, cancel_futures=True)
+
+job_runner = JobRunner(JOB_WORKERS, JOB_PROCESS_WORKERS)
+
+def store_job_result(job, output):
+    # A retried job may already have stored a result before it was interrupted
+    job_results.delete(job["id"])
+    job_results.put(
+        output["data"],
+        _id=job["id"],
+        filename=output["filename"],
+        content_type=output["content_type"],
+        metadata={"user_id": job["user_id"], "job_type": job["type"]},
+    )
+
+def reap_jobs():
+    """Settle jobs whose worker vanished for good and purge expired ones"""
+    now = datetime.utcnow()
+    abandoned = {"status": JobStatus.RUNNING, "lease_expires_at": {"$lt": now}}
+    settled = {"finished_at": now.isoformat(), "expires_at": now + timedelta(days=JOB_RETENTION_DAYS)}
+    jobs_collection.update_many(
+        {**abandoned, "cancel_requested": True},
+        {"$set": {**settled, "status": JobStatus.CANCELLED}},
+    )
+    jobs_collection.update_many(
+        {**abandoned, "attempts": {"$gte": JOB_MAX_ATTEMPTS}},
+        {"$set": {**settled, "status": JobStatus.FAILED, "error": "Worker stopped responding"}},
+    )
+    expired = [job["id"] for job in jobs_collection.find({"expires_at": {"$lt": now}}, {"id": 1})]
+    for job_id in expired:
+        job_results.delete(job_id)
+    if expired:
+        jobs_collection.delete_many({"id": {"$in": expired}})
+    return len(expired)
+
+async def reap_jobs_periodically():
+    while True:
+        await asyncio.sleep(JOB_REAP_INTERVAL_SECONDS)
+        try:
+            purged = await asyncio.to_thread(reap_jobs)
+            if purged:
+                logger.info("Purged %d expired jobs", purged)
+            purged = await asyncio.to_thread(purge_statement_cache)
+            if purged:
+                logger.info("Purged %d cached statements", purged)
+        except pymongo.errors.PyMongoError as e:
+            logger.warning("Job cleanup failed: %s", e)
+
+# Job handlers return {"filename", "content_type", "data"}
+EXPORT_SOURCES = [
+    ("clients", clients_collection),
+    ("projects", projects_collection),
+    ("team_members", team_members_collection),
+    ("payments", payment_transactions_collection),
+]
+PROFITABILITY_PAGE_SIZE = 500
+PROFITABILITY_COLUMNS = [
+    "project_id", "name", "client_id", "status", "budget", "received", "paid_out", "profit", "budget_remaining",
+]
+
+async def run_export_job(job, context):
+    """Everything the user owns as one JSON document"""
+    user_id = job["user_id"]
+    sources = list(EXPORT_SOURCES)
+    if job["params"].get("include_archived"):
+        sources.append(("archived_payments", payment_archive_collection))
+    export = {"exported_at": datetime.utcnow().isoformat()}
+    for index, (name, collection) in enumerate(sources):
+        export[name] = await asyncio.to_thread(lambda: list(collection.find({"user_id": user_id}, {"_id": 0})))
+        await context.progress((index + 1) / (len(sources) + 1), f"Exported {name}")
+    data = await context.run_in_process(renderers.render_json, export)
+    return {"filename": f"export-{date.today().isoformat()}.json", "content_type": "application/json", "data": data}
+
+async def run_project_profitability_job(job, context):
+    """The full profitability report as CSV, fetched a page at a time"""
+    params = ProjectProfitabilityJobParams(**job["params"])
+    rows = []
+    while True:
+        page = await asyncio.to_thread(
+            fetch_project_profitability, job["user_id"], params.sort_by, params.order, len(rows), PROFITABILITY_PAGE_SIZE
+        )
+        rows.extend(page["items"])
+        if len(rows) >= page["total"] or not page["items"]:
+            break
+        await context.progress(0.9 * len(rows) / page["total"], f"Fetched {len(rows)} of {page['total']} projects")
+    data = await context.run_in_process(renderers.render_csv, PROFITABILITY_COLUMNS, rows)
+    return {
+        "filename": f"project-profitability-{date.today().isoformat()}.csv",
+        "content_type": "text/csv",
+        "data": data,
+    }
+
+async def run_client_statements_job(job, context):
+    """Every client's statement for the month, bundled into one ZIP"""
+    user_id, month = job["user_id"], job["params"]["month"]
+    clients = await asyncio.to_thread(
+        lambda: list(clients_collection.find({"user_id": user_id}, {"_id": 0, "id": 1}).sort("name", pymongo.ASCENDING))
+    )
+    client_ids = [client["id"] for client in clients]
+    files = []
+    for start in range(0, len(client_ids), STATEMENT_BATCH_SIZE):
+        statements = await asyncio.to_thread(fetch_statements, user_id, client_ids[start:start + STATEMENT_BATCH_SIZE], month)
+        documents = await render_statements(statements)
+        files.extend((statement_filename(statement), document) for statement, document in zip(statements, documents))
+        await context.progress(0.95 * len(files) / len(client_ids), f"Rendered {len(files)} of {len(client_ids)} statements")
+    data = await asyncio.to_thread(renderers.render_zip, files)
+    return {"filename": f"statements-{month}.zip", "content_type": "application/zip", "data": data}
+
+JOB_HANDLERS = {
+    JobType.EXPORT: run_export_job,
+    JobType.PROJECT_PROFITABILITY: run_project_profitability_job,
+    JobType.CLIENT_STATEMENTS: run_client_statements_job,
+}
+
+# Client statements
+# A statement lists a client's projects and the payments received from them
+# in one month. Clients are fetched in batches with one aggregation each, the
+# PDFs are rendered in the job runner's process pool, and every rendered PDF
+# is kept under the hash of its content, so a statement whose data has not
+# changed since it was last rendered is served from storage.
+STATEMENT_BATCH_SIZE = int(os.environ.get("STATEMENT_BATCH_SIZE", "100"))
+STATEMENT_CACHE_DAYS = int(os.environ.get("STATEMENT_CACHE_DAYS", "90"))
+
+def month_range(month):
+    year, month_number = map(int, month.split("-"))
+    start = date(year, month_number, 1)
+    end = date(year + 1, 1, 1) if month_number == 12 else date(year, month_number + 1, 1)
+    return start.isoformat(), end.isoformat()
+
+def fetch_statements(user_id, client_ids, month):
+    start, end = month_range(month)
+    # Sub-pipelines select the client's rows of this month only, so a
+    # statement costs the month's payments rather than the client's history
+    same_client = {"$expr": {"$eq": ["$client_id", "$$client_id"]}, "user_id": user_id}
+    received = {
+        **same_client,
+        "payment_type": PaymentType.RECEIVED,
+        "payment_status": PaymentStatus.COMPLETED,
+        "created_at": {"$gte": start, "$lt": end},
+    }
+    pipeline = [
+        {"$match": {"user_id": user_id, "id": {"$in": client_ids}}},
+        {"$lookup": {
+            "from": projects_collection.name,
+            "let": {"client_id": "$id"},
+            "pipeline": [{"$match": same_client}],
+            "as": "projects",
+        }},
+        {"$lookup": {
+            "from": payment_transactions_collection.name,
+            "let": {"client_id": "$id"},
+            "pipeline": [{"$match": received}],
+            "as": "payments",
+        }},
+        # Statements for old months are mostly made of archived payments
+        {"$lookup": {
+            "from": payment_archive_collection.name,
+            "let": {"client_id": "$id"},
+            "pipeline": [{"$match": received}],
+            "as": "archived",
+        }},
+        {"$project": {
+            "_id": 0,
+            "client": {"id": "$id", "name": "$name", "company": "$company", "email": "$email"},
+            "projects": 1,
+            "payments": {"$concatArrays": ["$payments", "$archived"]},
+        }},
+    ]
+    return [build_statement(document, month) for document in clients_collection.aggregate(pipeline)]
+
+def build_statement(document, month):
+    """Reduce the aggregation output to exactly what the PDF shows"""
+    payments = sorted(document["payments"], key=lambda payment: (payment["created_at"], payment["id"]))
+    totals = {}
+    for payment in payments:
+        totals[payment["currency"]] = totals.get(payment["currency"], 0) + payment["amount"]
+    return {
+        "client": document["client"],
+        "month": month,
+        "projects": [
+            {"name": project["name"], "status": project.get("status"), "budget": project.get("budget")}
+            for project in sorted(document["projects"], key=lambda project: (project["name"], project["id"]))
+        ],
+        "payments": [
+            {
+                "date": payment["created_at"][:10],
+                "description": payment.get("description"),
+                "project_name": payment.get("project_name"),
+                "amount": payment["amount"],
+                "currency": payment["currency"],
+            }
+            for payment in payments
+        ],
+        "totals": [{"currency": currency, "amount": round(amount, 2)} for currency, amount in sorted(totals.items())],
+    }
+
+def statement_key(statement):
+    content = json.dumps([renderers.STATEMENT_LAYOUT_VERSION, statement], sort_keys=True, default=str)
+    return hashlib.sha256(content.encode()).hexdigest()
+
+def statement_filename(statement):
+    slug = re.sub(r"[^a-z0-9]+", "-", statement["client"]["name"].lower()).strip("-") or "client"
+    return f"{slug}-{statement['client']['id'][:8]}-{statement['month']}.pdf"
+
+def load_cached_statements(keys):
+    return {stored._id: stored.read() for stored in statement_files.find({"_id": {"$in": keys}})}
+
+def store_statements(rendered):
+    for key, document in rendered.items():
+        try:
+            statement_files.put(document, _id=key, content_type="application/pdf")
+        except gridfs.errors.FileExists:
+            # Rendered concurrently by another request or worker
+            pass
+
+async def render_statements(statements):
+    """PDFs for the statements, rendering only those not already stored"""
+    keys = [statement_key(statement) for statement in statements]
+    documents = await asyncio.to_thread(load_cached_statements, keys)
+    missing = {key: statement for key, statement in zip(keys, statements) if key not in documents}
+    rendered = await asyncio.gather(*(
+        job_runner.run_in_process(renderers.render_statement_pdf, statement) for statement in missing.values()
+    ))
+    rendered = dict(zip(missing, rendered))
+    if rendered:
+        await asyncio.to_thread(store_statements, rendered)
+    documents.update(rendered)
+    return [documents[key] for key in keys]
+
+def purge_statement_cache():
+    cutoff = datetime.utcnow() - timedelta(days=STATEMENT_CACHE_DAYS)
+    stale = [stored._id for stored in statement_files.find({"uploadDate": {"$lt": cutoff}})]
+    for key in stale:
+        statement_files.delete(key)
+    return len(stale)
+
+@app.get("/api/clients/{client_id}/statement")
+async def get_client_statement(
+    client_id: str,
+    month: str = Query(..., pattern=MONTH_PATTERN),
+    if_none_match: Optional[str] = Header(None),
+    user_id: str = Depends(get_current_user_id),
+):
+    """The client's statement for a month (YYYY-MM) as a PDF.
+
+    Use the client-statements job for every client at once.
+    """
+    statements = await asyncio.to_thread(fetch_statements, user_id, [client_id], month)
+    if not statements:
+        raise HTTPException(status_code=404, detail="Client not found")
+    etag = f'"{statement_key(statements[0])}"'
+    if if_none_match == etag:
+        return Response(status_code=304, headers={"ETag": etag})
+    [document] = await render_statements(statements)
+    return Response(
+        document,
+        media_type="application/pdf",
+        headers={"ETag": etag, "Content-Disposition": f'attachment; filename="{statement_filename(statements[0])}"'},
+    )
+
+# Job endpoints
+JOB_PROJECTION = {"_id": 0, "user_id": 0, "worker_id": 0, "lease_expires_at": 0}
+
+def find_job(user_id, job_id):
+    job = jobs_collection.find_one({"id": job_id, "user_id": user_id}, JOB_PROJECTION)
+    if not job:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return job
+
+def submit_job(user_id, job_type, params):
+    job = {
+        "id": str(uuid.uuid4()),
+        "user_id": user_id,
+        "type": job_type,
+        "params": params,
+        "status": JobStatus.QUEUED,
+        "progress": 0,
+        "message": None,
+        "attempts": 0,
+        "cancel_requested": False,
+        "created_at": datetime.utcnow().isoformat(),
+    }
+    jobs_collection.insert_one(job)
+    job_runner.notify()
+    return {key: value for key, value in job.items() if key not in JOB_PROJECTION}
+
+@app.post("/api/jobs", status_code=202)
+async def create_job(job_request: JobRequest, user_id: str = Depends(get_current_user_id)):
+    """Queue a job; poll /api/jobs/{id} for its progress"""
+    try:
+        params = JOB_PARAMS[job_request.type](**job_request.params).dict()
+    except ValidationError as e:
+        raise HTTPException(status_code=422, detail=json.loads(e.json()))
+    return submit_job(user_id, job_request.type, params)
+
+@app.get("/api/jobs")
+async def get_jobs(limit: int = Query(20, ge=1, le=100), user_id: str = Depends(get_current_user_id)):
+    return list(jobs_collection.find({"user_id": user_id}, JOB_PROJECTION).sort("created_at", pymongo.DESCENDING).limit(limit))
+
+@app.get("/api/jobs/{job_id}")
+async def get_job(job_id: str, user_id: str = Depends(get_current_user_id)):
+    return find_job(user_id, job_id)
+
+@app.post("/api/jobs/{job_id}/cancel")
+async def cancel_job(job_id: str, user_id: str = Depends(get_current_user_id)):
+    """Queued jobs are cancelled at once; running ones stop at their next heartbeat"""
+    now = datetime.utcnow()
+    job = jobs_collection.find_one_and_update(
+        {"id": job_id, "user_id": user_id, "status": JobStatus.QUEUED},
+        {"$set": {
+            "status": JobStatus.CANCELLED,
+            "cancel_requested": True,
+            "finished_at": now.isoformat(),
+            "expires_at": now + timedelta(days=JOB_RETENTION_DAYS),
+        }},
+        projection=JOB_PROJECTION,
+        return_document=ReturnDocument.AFTER,
+    ) or jobs_collection.find_one_and_update(
+        {"id": job_id, "user_id": user_id, "status": JobStatus.RUNNING},
+        {"$set": {"cancel_requested": True}},
+        projection=JOB_PROJECTION,
+        return_document=ReturnDocument.AFTER,
+    )
+    if job is None:
+        find_job(user_id, job_id)
+        raise HTTPException(status_code=409, detail="Job has already finished")
+    return job
+
+@app.get("/api/jobs/{job_id}/result")
+async def download_job_result(job_id: str, user_id: str = Depends(get_current_user_id)):
+    job = find_job(user_id, job_id)
+    if job["status"] != JobStatus.SUCCEEDED:
+        raise HTTPException(status_code=409, detail=f"Job is {job['status']}")
+    try:
+        result = await asyncio.to_thread(job_results.get, job_id)
+    except gridfs.errors.NoFile:
+        raise HTTPException(status_code=410, detail="Job result has been purged")
+    # GridOut yields the file chunk by chunk, so large results are never held in memory
+    return StreamingResponse(
+        result,
+        media_type=job["result"]["content_type"],
+        headers={
+            "Content-Disposition": f'attachment; filename="{job["result"]["filename"]}"',
+            "Content-Length": str(result.length),
+        },
+    )
+
+# Activity endpoints
+@app.get("/api/activity")
+async def get_activity(
+    cursor: Optional[str] = None,
+    limit: int = Query(50, ge=1, le=200),
+    entity: Optional[str] = None,
+    entity_id: Optional[str] = None,
+    user_id: str = Depends(get_current_user_id),
+):
+    """Newest first; pass next_cursor back as cursor for the following page"""
+    query = {"user_id": user_id}
+    if entity:
+        query["entity"] = entity
+    if entity_id:
+        query["entity_id"] = entity_id
+    if cursor:
+        # Keyset pagination: resume strictly after the last entry seen
+        at, entry_id = decode_activity_cursor(cursor)
+        query["$or"] = [{"at": {"$lt": at}}, {"at": at, "id": {"$lt": entry_id}}]
+    entries = list(
+        activity_collection.find(query, {"_id": 0}).sort([("at", pymongo.DESCENDING), ("id", pymongo.DESCENDING)]).limit(limit + 1)
+    )
+    next_cursor = encode_activity_cursor(entries[limit - 1]) if len(entries) > limit else None
+    return {"items": entries[:limit], "next_cursor": next_cursor}
+
+# Metrics endpoints
+@app.get("/api/metrics/coalescing", dependencies=[Depends(require_admin)])
+async def get_coalescing_metrics():
+    """How many requests per route were answered by an already running computation"""
+    return single_flight.metrics()
+
+@app.get("/api/admin/mongo-pool", dependencies=[Depends(require_admin)])
+async def get_mongo_pool_stats():
+    """Pool settings and live connection counters for this worker's MongoClient"""
+    return {
+        "settings": {
+            "max_pool_size": MONGO_MAX_POOL_SIZE,
+            "min_pool_size": MONGO_MIN_POOL_SIZE,
+            "wait_queue_timeout_ms": MONGO_WAIT_QUEUE_TIMEOUT_MS,
+            "compressors": MONGO_COMPRESSORS,
+        },
+        "pools": pool_stats.snapshot(),
+    }
+
+@app.get("/api/metrics/load", dependencies=[Depends(require_admin)])
+async def get_load_metrics():
+    return {
+        "in_flight": load_monitor.in_flight,
+        "loop_lag_ms": round(load_monitor.loop_lag * 1000, 1),
+        "rejected": load_monitor.rejected,
+    }
+
+# Search endpoints
+SEARCH_MAX_LIMIT = 50
+
+# entity type -> (collection, title field, subtitle field)
+SEARCH_TARGETS = {
+    EntityType.CLIENTS: (clients_collection, "name", "company"),
+    EntityType.PROJECTS: (projects_collection, "name", "description"),
+    EntityType.TEAM_MEMBERS: (team_members_collection, "name", "role"),
+}
+
+@app.get("/api/search")
+async def search(q: str, types: Optional[str] = None, limit: int = Query(20, ge=1, le=SEARCH_MAX_LIMIT), user_id: str = Depends(get_current_user_id)):
+    """Ranked full-text search across clients, projects and team members"""
+    query = q.strip()
+    if not query:
+        raise HTTPException(status_code=400, detail="Search query must not be empty")
+
+    names = [entity_type.value for entity_type in EntityType]
+    requested = set(types.split(",")) if types else set(names)
+    unknown = requested - set(names)
+    if unknown:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Unknown search types: {', '.join(sorted(unknown))}; use {', '.join(names)}",
+        )
+
+    results = []
+    for entity_type in map(EntityType, requested):
+        collection, title_field, subtitle_field = SEARCH_TARGETS[entity_type]
+        # Each collection returns at most `limit` hits, so the merge below is bounded
+        matches = collection.find(
+            {"user_id": user_id, "$text": {"$search": query}},
+            {"_id": 0, "id": 1, title_field: 1, subtitle_field: 1, "score": {"$meta": "textScore"}},
+        ).sort([("score", {"$meta": "textScore"})]).limit(limit)
+        for match in matches:
+            results.append({
+                "type": entity_type.value,
+                "id": match["id"],
+                "title": match.get(title_field),
+                "subtitle": match.get(subtitle_field),
+                "score": match["score"],
+            })
+
+    results.sort(key=lambda result: result["score"], reverse=True)
+    return {"query": query, "results": results[:limit]}
+
+# Autocomplete endpoints
+AUTOCOMPLETE_COLLECTIONS = {
+    EntityType.CLIENTS: clients_collection,
+    EntityType.PROJECTS: projects_collection,
+    EntityType.TEAM_MEMBERS: team_members_collection,
+}
+
+@app.get("/api/autocomplete/{entity}")
+async def autocomplete(entity: EntityType, prefix: str = "", limit: int = Query(10, ge=1, le=50), user_id: str = Depends(get_current_user_id)):
+    """Typeahead over entity names, served from the in-memory prefix index"""
+    collection = AUTOCOMPLETE_COLLECTIONS[entity]
+
+    def load():
+        documents = collection.find({"user_id": user_id}, {"_id": 0, "id": 1, "name": 1})
+        return [(document["id"], document.get("name")) for document in documents]
+
+    index = autocomplete_cache.get(user_id, entity, load)
+    return {"entity": entity, "prefix": prefix, "results": index.lookup(prefix.strip(), limit)}
+
 if __name__ == "__main__":
     import uvicorn
     uvicorn.run(app, host="0.0.0.0", port=8001)
\ No newline at end of file
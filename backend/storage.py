@@ -0,0 +1,1164 @@
+"""Storage backends.
+
+server.py talks to pymongo collections directly. ``open_client`` returns
+the client those collections come from, chosen by ``STORAGE_BACKEND``:
+
+- ``mongo`` (default): a MongoClient for ``MONGO_URL``.
+- ``memory``: an in-process engine with the same interface. Nothing is
+  persisted and every worker process has its own data, so it is meant
+  for tests, benchmarks and local development without a mongod.
+
+The in-memory engine implements the part of the collection API, query
+language and aggregation pipeline that server.py uses; anything else
+raises NotImplementedError rather than quietly behaving differently.
+Documents are kept in insertion order with dict indexes on ``user_id``
+and ``(user_id, id)``, so tenant-scoped queries never scan other
+tenants' documents. Unique and partial indexes are enforced; TTL indexes
+are accepted but nothing expires, and text search matches whole words
+without stemming. tests/test_storage_contract.py runs the same checks
+against both backends.
+"""
+import re
+import threading
+from datetime import datetime
+from types import SimpleNamespace
+
+import gridfs
+from bson import ObjectId
+from pymongo import MongoClient, ReturnDocument
+from pymongo.errors import BulkWriteError, DuplicateKeyError, OperationFailure
+from pymongo.operations import DeleteMany, DeleteOne, InsertOne, ReplaceOne, UpdateMany, UpdateOne
+from pymongo.results import BulkWriteResult, DeleteResult, InsertManyResult, InsertOneResult, UpdateResult
+
+BACKENDS = ("mongo", "memory")
+
+
+def open_client(backend, url, **options):
+    """A MongoClient, or a MemoryClient that ignores the connection options"""
+    if backend == "mongo":
+        return MongoClient(url, **options)
+    if backend == "memory":
+        return MemoryClient()
+    raise ValueError(f"Unknown storage backend {backend!r}; expected one of: {', '.join(BACKENDS)}")
+
+
+def open_file_store(database, collection):
+    """GridFS for a Mongo database, MemoryFileStore for an in-memory one"""
+    if isinstance(database, MemoryDatabase):
+        return MemoryFileStore(database, collection)
+    return gridfs.GridFS(database, collection=collection)
+
+
+# Values
+_MISSING = object()
+
+
+def _store(value):
+    """Copy a value the way a BSON round trip would change it"""
+    if isinstance(value, dict):
+        return {key: _store(item) for key, item in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [_store(item) for item in value]
+    if isinstance(value, str) and type(value) is not str:
+        # str enums are stored as their plain value
+        return str.__str__(value)
+    if isinstance(value, datetime):
+        # BSON dates have millisecond precision
+        return value.replace(microsecond=value.microsecond // 1000 * 1000)
+    return value
+
+
+def _copy(value):
+    if isinstance(value, dict):
+        return {key: _copy(item) for key, item in value.items()}
+    if isinstance(value, list):
+        return [_copy(item) for item in value]
+    return value
+
+
+def _hashable(value):
+    if isinstance(value, dict):
+        return tuple((key, _hashable(item)) for key, item in value.items())
+    if isinstance(value, list):
+        return tuple(_hashable(item) for item in value)
+    return value
+
+
+# Cross-type ordering, following BSON's comparison order
+_TYPE_ORDER = [
+    (type(None), 1), (bool, 8), (int, 2), (float, 2), (str, 3),
+    (dict, 4), (list, 5), (bytes, 6), (ObjectId, 7), (datetime, 9),
+]
+
+
+def _type_rank(value):
+    if value is _MISSING:
+        return 0
+    for value_type, rank in _TYPE_ORDER:
+        if isinstance(value, value_type):
+            return rank
+    return 10
+
+
+def _sort_key(value):
+    rank = _type_rank(value)
+    if rank in (0, 1):
+        return (rank, 0)
+    if rank == 4:
+        return (rank, [(key, _sort_key(item)) for key, item in value.items()])
+    if rank == 5:
+        return (rank, [_sort_key(item) for item in value])
+    return (rank, value)
+
+
+def _compare(left, right):
+    left_key, right_key = _sort_key(left), _sort_key(right)
+    return (left_key > right_key) - (left_key < right_key)
+
+
+def _equal(left, right):
+    return _type_rank(left) == _type_rank(right) and _compare(left, right) == 0
+
+
+# Paths
+def _query_values(document, path):
+    """Every value a query on the dotted path looks at, descending into arrays"""
+    values = [document]
+    for part in path.split("."):
+        found = []
+        for value in values:
+            if isinstance(value, dict):
+                if part in value:
+                    found.append(value[part])
+            elif isinstance(value, list):
+                if part.isdigit() and int(part) < len(value):
+                    found.append(value[int(part)])
+                found.extend(item[part] for item in value if isinstance(item, dict) and part in item)
+        values = found
+    return values
+
+
+def _expression_path(value, path):
+    """A field path as aggregation expressions see it: arrays map to arrays of values"""
+    for part in path.split("."):
+        if isinstance(value, list):
+            value = [
+                found for found in (_expression_path(item, part) for item in value if isinstance(item, dict))
+                if found is not _MISSING
+            ]
+        elif isinstance(value, dict):
+            value = value.get(part, _MISSING)
+        else:
+            return _MISSING
+        if value is _MISSING:
+            return _MISSING
+    return value
+
+
+def _set_path(document, path, value):
+    *parents, last = path.split(".")
+    for part in parents:
+        document = document.setdefault(part, {})
+    document[last] = value
+
+
+def _unset_path(document, path):
+    *parents, last = path.split(".")
+    for part in parents:
+        document = document.get(part)
+        if not isinstance(document, dict):
+            return
+    document.pop(last, None)
+
+
+def _with_path(document, path, value=_MISSING):
+    """A copy of document with path set, or removed when no value is given
+
+    Only the dicts along the path are copied, so aggregation stages can
+    build their output from stored documents without changing them.
+    """
+    *parents, last = path.split(".")
+    result = node = dict(document)
+    for part in parents:
+        child = node.get(part)
+        if not isinstance(child, dict):
+            if value is _MISSING:
+                return result
+            child = {}
+        node[part] = node = dict(child)
+    if value is _MISSING:
+        node.pop(last, None)
+    else:
+        node[last] = value
+    return result
+
+
+# Queries
+_TYPE_NAMES = {
+    "string": str, "bool": bool, "date": datetime, "object": dict, "array": list,
+    "null": type(None), "double": float, "int": int, "objectId": ObjectId, "number": (int, float),
+}
+
+
+def _with_elements(values):
+    for value in values:
+        yield value
+        if isinstance(value, list):
+            yield from value
+
+
+def _match_equal(values, target):
+    if not values:
+        return target is None
+    return any(_equal(value, target) for value in _with_elements(values))
+
+
+def _match_range(values, target, accept):
+    rank = _type_rank(target)
+    # Range queries only compare values of the same type, as MongoDB does
+    return any(
+        _type_rank(value) == rank and accept(_compare(value, target))
+        for value in _with_elements(values)
+    )
+
+
+def _match_operator(values, operator, argument):
+    if operator == "$eq":
+        return _match_equal(values, argument)
+    if operator == "$ne":
+        return not _match_equal(values, argument)
+    if operator == "$gt":
+        return _match_range(values, argument, lambda order: order > 0)
+    if operator == "$gte":
+        return _match_range(values, argument, lambda order: order >= 0)
+    if operator == "$lt":
+        return _match_range(values, argument, lambda order: order < 0)
+    if operator == "$lte":
+        return _match_range(values, argument, lambda order: order <= 0)
+    if operator == "$in":
+        return any(_match_equal(values, item) for item in argument)
+    if operator == "$nin":
+        return not any(_match_equal(values, item) for item in argument)
+    if operator == "$exists":
+        return bool(values) == bool(argument)
+    if operator == "$size":
+        return any(isinstance(value, list) and len(value) == argument for value in values)
+    if operator == "$type":
+        value_type = _TYPE_NAMES[argument]
+        return any(
+            isinstance(value, value_type) and not (isinstance(value, bool) and value_type is not bool)
+            for value in values
+        )
+    raise NotImplementedError(f"Query operator {operator} is not supported by the memory backend")
+
+
+def _is_operator_document(value):
+    return isinstance(value, dict) and bool(value) and all(key.startswith("$") for key in value)
+
+
+def _matches(document, query, variables=None):
+    for key, condition in query.items():
+        if key == "$and":
+            matched = all(_matches(document, part, variables) for part in condition)
+        elif key == "$or":
+            matched = any(_matches(document, part, variables) for part in condition)
+        elif key == "$nor":
+            matched = not any(_matches(document, part, variables) for part in condition)
+        elif key == "$expr":
+            matched = _truthy(_evaluate(condition, document, variables))
+        elif key.startswith("$"):
+            raise NotImplementedError(f"Query operator {key} is not supported here by the memory backend")
+        elif _is_operator_document(condition):
+            values = _query_values(document, key)
+            matched = all(_match_operator(values, operator, argument) for operator, argument in condition.items())
+        else:
+            matched = _match_equal(_query_values(document, key), condition)
+        if not matched:
+            return False
+    return True
+
+
+# Aggregation expressions
+def _truthy(value):
+    return not (value is _MISSING or value is None or value is False or (_type_rank(value) == 2 and value == 0))
+
+
+def _null(value):
+    return value is _MISSING or value is None
+
+
+def _arithmetic(operation):
+    def evaluate(arguments, document, variables):
+        values = [_evaluate(argument, document, variables) for argument in arguments]
+        if any(_null(value) for value in values):
+            return None
+        result = values[0]
+        for value in values[1:]:
+            result = operation(result, value)
+        return result
+    return evaluate
+
+
+def _comparison(accept):
+    def evaluate(arguments, document, variables):
+        left, right = (_evaluate(argument, document, variables) for argument in arguments)
+        return accept(_compare(left, right))
+    return evaluate
+
+
+def _cond(argument, document, variables):
+    if isinstance(argument, dict):
+        argument = [argument["if"], argument["then"], argument["else"]]
+    condition, then, otherwise = argument
+    return _evaluate(then if _truthy(_evaluate(condition, document, variables)) else otherwise, document, variables)
+
+
+def _if_null(arguments, document, variables):
+    for argument in arguments[:-1]:
+        value = _evaluate(argument, document, variables)
+        if not _null(value):
+            return value
+    return _evaluate(arguments[-1], document, variables)
+
+
+def _size(argument, document, variables):
+    value = _evaluate(argument[0] if isinstance(argument, list) else argument, document, variables)
+    if not isinstance(value, list):
+        raise OperationFailure("The argument to $size must be an array")
+    return len(value)
+
+
+def _array_elem_at(arguments, document, variables):
+    array, index = (_evaluate(argument, document, variables) for argument in arguments)
+    if _null(array):
+        return None
+    return array[index] if -len(array) <= index < len(array) else _MISSING
+
+
+def _concat_arrays(arguments, document, variables):
+    arrays = [_evaluate(argument, document, variables) for argument in arguments]
+    if any(_null(array) for array in arrays):
+        return None
+    return [item for array in arrays for item in array]
+
+
+def _filter(argument, document, variables):
+    items = _evaluate(argument["input"], document, variables)
+    if _null(items):
+        return None
+    name = argument.get("as", "this")
+    return [
+        item for item in items
+        if _truthy(_evaluate(argument["cond"], document, {**(variables or {}), name: item}))
+    ]
+
+
+def _substr_bytes(arguments, document, variables):
+    value, start, length = (_evaluate(argument, document, variables) for argument in arguments)
+    if _null(value):
+        return ""
+    encoded = str(value).encode()
+    return encoded[start:start + length if length >= 0 else None].decode()
+
+
+def _sum_expression(argument, document, variables):
+    value = _evaluate(argument, document, variables)
+    values = value if isinstance(value, list) else [value]
+    return sum(item for item in values if _type_rank(item) == 2)
+
+
+_EXPRESSIONS = {
+    "$cond": _cond,
+    "$ifNull": _if_null,
+    "$eq": _comparison(lambda order: order == 0),
+    "$ne": _comparison(lambda order: order != 0),
+    "$gt": _comparison(lambda order: order > 0),
+    "$gte": _comparison(lambda order: order >= 0),
+    "$lt": _comparison(lambda order: order < 0),
+    "$lte": _comparison(lambda order: order <= 0),
+    "$and": lambda arguments, document, variables: all(_truthy(_evaluate(argument, document, variables)) for argument in arguments),
+    "$or": lambda arguments, document, variables: any(_truthy(_evaluate(argument, document, variables)) for argument in arguments),
+    "$not": lambda arguments, document, variables: not _truthy(_evaluate(arguments[0], document, variables)),
+    "$add": _arithmetic(lambda left, right: left + right),
+    "$subtract": _arithmetic(lambda left, right: left - right),
+    "$multiply": _arithmetic(lambda left, right: left * right),
+    "$size": _size,
+    "$arrayElemAt": _array_elem_at,
+    "$concatArrays": _concat_arrays,
+    "$filter": _filter,
+    "$substrBytes": _substr_bytes,
+    "$sum": _sum_expression,
+    "$literal": lambda argument, document, variables: argument,
+}
+
+
+def _evaluate(expression, document, variables=None):
+    if isinstance(expression, str):
+        if expression.startswith("$$"):
+            name, _, path = expression[2:].partition(".")
+            value = document if name in ("ROOT", "CURRENT") else (variables or {})[name]
+            return _expression_path(value, path) if path else value
+        if expression.startswith("$"):
+            return _expression_path(document, expression[1:])
+        return expression
+    if isinstance(expression, list):
+        return [_evaluate(item, document, variables) for item in expression]
+    if isinstance(expression, dict):
+        if len(expression) == 1:
+            operator, argument = next(iter(expression.items()))
+            if operator.startswith("$"):
+                if operator not in _EXPRESSIONS:
+                    raise NotImplementedError(f"Expression {operator} is not supported by the memory backend")
+                return _EXPRESSIONS[operator](argument, document, variables)
+        evaluated = {key: _evaluate(value, document, variables) for key, value in expression.items()}
+        return {key: value for key, value in evaluated.items() if value is not _MISSING}
+    return expression
+
+
+# Projections
+def _project(document, projection, score=None, expressions=False, variables=None):
+    """Apply a find() projection, or a $project stage when expressions is set"""
+    if not projection:
+        return document
+    fields = {key: value for key, value in projection.items() if key != "_id"}
+    include_id = projection.get("_id", 1) not in (0, False)
+    excluding = all(value in (0, False) for value in fields.values())
+    if excluding:
+        result = dict(document)
+        for path in fields:
+            result = _with_path(result, path)
+        if not include_id:
+            result.pop("_id", None)
+        return result
+
+    result = {}
+    if include_id and "_id" in document:
+        result["_id"] = document["_id"]
+    for key, value in fields.items():
+        if isinstance(value, dict) and "$meta" in value:
+            result[key] = score
+        elif value is True or (_type_rank(value) == 2 and not isinstance(value, bool) and value == 1):
+            found = _expression_path(document, key)
+            if found is not _MISSING:
+                _set_path(result, key, found)
+        elif expressions:
+            found = _evaluate(value, document, variables)
+            if found is not _MISSING:
+                _set_path(result, key, found)
+    return result
+
+
+def _sort(entries, keys):
+    """Stable multi-key sort of (document, score) pairs"""
+    for field, direction in reversed(keys):
+        if isinstance(direction, dict):
+            entries.sort(key=lambda entry: entry[1] or 0, reverse=True)
+        else:
+            entries.sort(
+                key=lambda entry: _sort_key(_expression_path(entry[0], field)),
+                reverse=direction in (-1, "desc", "descending"),
+            )
+    return entries
+
+
+def _sort_keys(key_or_list, direction=None):
+    if isinstance(key_or_list, str):
+        return [(key_or_list, 1 if direction is None else direction)]
+    if isinstance(key_or_list, dict):
+        return list(key_or_list.items())
+    return list(key_or_list)
+
+
+# Aggregation stages
+# Each stage takes (database, documents, spec, variables); variables are the
+# $$names bound by an enclosing $lookup's let. Stages may be handed stored
+# documents, so they build new documents instead of changing their input.
+def _join_keys(document, path):
+    values = _query_values(document, path)
+    return {_hashable(value) for value in _with_elements(values)} if values else {None}
+
+
+def _expr_equalities(expression, variables):
+    """{field: value} for the {"$eq": ["$field", "$$name"]} terms of an $expr
+
+    Only used to narrow candidates through the user_id indexes; the full
+    $match still decides.
+    """
+    if not isinstance(expression, dict) or len(expression) != 1:
+        return {}
+    (operator, arguments), = expression.items()
+    if operator == "$and":
+        equalities = {}
+        for argument in arguments:
+            equalities.update(_expr_equalities(argument, variables))
+        return equalities
+    if operator != "$eq":
+        return {}
+    names = [argument for argument in arguments if isinstance(argument, str) and argument.startswith("$$")]
+    fields = [
+        argument for argument in arguments
+        if isinstance(argument, str) and argument.startswith("$") and not argument.startswith("$$")
+    ]
+    if len(fields) != 1 or len(names) != 1 or "." in fields[0] + names[0]:
+        return {}
+    value = (variables or {}).get(names[0][2:])
+    return {fields[0][1:]: value} if isinstance(value, str) else {}
+
+
+def _stage_lookup(database, documents, spec, variables):
+    foreign_collection = database[spec["from"]]
+    pipeline = spec.get("pipeline")
+    if pipeline is None:
+        by_key = {}
+        for foreign in foreign_collection._snapshot():
+            for key in _join_keys(foreign, spec["foreignField"]):
+                by_key.setdefault(key, []).append(foreign)
+    results = []
+    for document in documents:
+        if pipeline is None:
+            matched, seen = [], set()
+            for key in _join_keys(document, spec["localField"]):
+                for foreign in by_key.get(key, []):
+                    if id(foreign) not in seen:
+                        seen.add(id(foreign))
+                        matched.append(foreign)
+        else:
+            scope = {**(variables or {}), **{
+                name: _evaluate(expression, document, variables) for name, expression in spec.get("let", {}).items()
+            }}
+            stages = list(pipeline)
+            first_match = stages.pop(0)["$match"] if stages and "$match" in stages[0] else {}
+            local_keys = _join_keys(document, spec["localField"]) if "localField" in spec else None
+            narrow = {**_expr_equalities(first_match.get("$expr"), scope), **first_match}
+            matched = [
+                foreign for foreign in foreign_collection._snapshot(narrow)
+                if (local_keys is None or local_keys & _join_keys(foreign, spec["foreignField"]))
+                and _matches(foreign, first_match, scope)
+            ]
+            matched = _run_pipeline(database, matched, stages, scope)
+        results.append({**document, spec["as"]: matched})
+    return results
+
+
+def _stage_unwind(database, documents, spec, variables):
+    if isinstance(spec, str):
+        spec = {"path": spec}
+    path = spec["path"][1:]
+    preserve = spec.get("preserveNullAndEmptyArrays", False)
+    results = []
+    for document in documents:
+        value = _expression_path(document, path)
+        if isinstance(value, list) and value:
+            for item in value:
+                results.append(_with_path(document, path, item))
+        elif isinstance(value, list) or _null(value):
+            if preserve:
+                results.append(_with_path(document, path) if isinstance(value, list) else document)
+        else:
+            results.append(document)
+    return results
+
+
+def _accumulate(operator, values):
+    present = [value for value in values if not _null(value)]
+    if operator == "$sum":
+        return sum(value for value in present if _type_rank(value) == 2)
+    if operator == "$avg":
+        numbers = [value for value in present if _type_rank(value) == 2]
+        return sum(numbers) / len(numbers) if numbers else None
+    if operator == "$min":
+        return min(present, key=_sort_key) if present else None
+    if operator == "$max":
+        return max(present, key=_sort_key) if present else None
+    if operator == "$first":
+        return None if not values or values[0] is _MISSING else values[0]
+    if operator == "$last":
+        return None if not values or values[-1] is _MISSING else values[-1]
+    if operator == "$push":
+        return [value for value in values if value is not _MISSING]
+    raise NotImplementedError(f"Accumulator {operator} is not supported by the memory backend")
+
+
+def _stage_group(database, documents, spec, variables):
+    groups = {}
+    for document in documents:
+        group_id = _evaluate(spec["_id"], document, variables)
+        group_id = None if group_id is _MISSING else group_id
+        group = groups.setdefault(_hashable(group_id), {"_id": group_id, "values": {}})
+        for field, accumulator in spec.items():
+            if field == "_id":
+                continue
+            (operator, argument), = accumulator.items()
+            group["values"].setdefault(field, []).append(_evaluate(argument, document, variables))
+    results = []
+    for group in groups.values():
+        result = {"_id": group["_id"]}
+        for field, accumulator in spec.items():
+            if field != "_id":
+                (operator, _), = accumulator.items()
+                result[field] = _accumulate(operator, group["values"].get(field, []))
+        results.append(result)
+    return results
+
+
+def _stage_union_with(database, documents, spec, variables):
+    if isinstance(spec, str):
+        spec = {"coll": spec}
+    other = database[spec["coll"]]._snapshot()
+    return documents + _run_pipeline(database, other, spec.get("pipeline", []))
+
+
+def _stage_count(database, documents, spec, variables):
+    return [{spec: len(documents)}] if documents else []
+
+
+_STAGES = {
+    "$match": lambda database, documents, spec, variables: [
+        document for document in documents if _matches(document, spec, variables)
+    ],
+    "$project": lambda database, documents, spec, variables: [
+        _project(document, spec, expressions=True, variables=variables) for document in documents
+    ],
+    "$addFields": lambda database, documents, spec, variables: [
+        {**document, **_evaluate(spec, document, variables)} for document in documents
+    ],
+    "$set": lambda database, documents, spec, variables: [
+        {**document, **_evaluate(spec, document, variables)} for document in documents
+    ],
+    "$lookup": _stage_lookup,
+    "$unwind": _stage_unwind,
+    "$group": _stage_group,
+    "$sort": lambda database, documents, spec, variables: [
+        document for document, _ in _sort([(document, None) for document in documents], list(spec.items()))
+    ],
+    "$skip": lambda database, documents, spec, variables: documents[spec:],
+    "$limit": lambda database, documents, spec, variables: documents[:spec],
+    "$count": _stage_count,
+    "$facet": lambda database, documents, spec, variables: [{
+        name: _run_pipeline(database, documents, pipeline, variables)
+        for name, pipeline in spec.items()
+    }],
+    "$unionWith": _stage_union_with,
+}
+
+
+def _run_pipeline(database, documents, pipeline, variables=None):
+    for stage in pipeline:
+        (name, spec), = stage.items()
+        if name not in _STAGES:
+            raise NotImplementedError(f"Stage {name} is not supported by the memory backend")
+        documents = _STAGES[name](database, documents, spec, variables)
+    return documents
+
+
+# Collections
+_WORD = re.compile(r"\w+")
+
+
+class MemoryCursor:
+    """The chainable part of pymongo's Cursor; runs the query on first iteration"""
+
+    def __init__(self, collection, query, projection):
+        self._collection = collection
+        self._query = query or {}
+        self._projection = projection
+        self._sort = None
+        self._skip = 0
+        self._limit = 0
+        self._results = None
+
+    def sort(self, key_or_list, direction=None):
+        self._sort = _sort_keys(key_or_list, direction)
+        return self
+
+    def skip(self, count):
+        self._skip = count
+        return self
+
+    def limit(self, count):
+        self._limit = count
+        return self
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        if self._results is None:
+            self._results = iter(self._collection._read(
+                self._query, self._projection, self._sort, self._skip, self._limit
+            ))
+        return next(self._results)
+
+
+class MemoryCollection:
+    def __init__(self, database, name):
+        self.database = database
+        self.name = name
+        self.full_name = f"{database.name}.{name}"
+        self._lock = database._lock
+        self._documents = {}
+        # user_id -> {_id: None} and (user_id, id) -> {_id: None}, in insertion order
+        self._by_user = {}
+        self._by_user_and_id = {}
+        # index name -> (fields, partial filter, {key: _id})
+        self._unique = {}
+        self._text_weights = None
+
+    # Indexing
+    def _index(self, document):
+        user_id = document.get("user_id")
+        if isinstance(user_id, str):
+            self._by_user.setdefault(user_id, {})[document["_id"]] = None
+            self._by_user_and_id.setdefault((user_id, _hashable(document.get("id"))), {})[document["_id"]] = None
+        for fields, partial, keys in self._unique.values():
+            if partial is None or _matches(document, partial):
+                keys[self._unique_key(document, fields)] = document["_id"]
+
+    def _unindex(self, document):
+        user_id = document.get("user_id")
+        if isinstance(user_id, str):
+            self._by_user.get(user_id, {}).pop(document["_id"], None)
+            self._by_user_and_id.get((user_id, _hashable(document.get("id"))), {}).pop(document["_id"], None)
+        for fields, partial, keys in self._unique.values():
+            key = self._unique_key(document, fields)
+            if keys.get(key) == document["_id"]:
+                del keys[key]
+
+    @staticmethod
+    def _unique_key(document, fields):
+        key = []
+        for field in fields:
+            values = _query_values(document, field)
+            key.append(_hashable(values[0]) if values else None)
+        return tuple(key)
+
+    def _check_unique(self, document, replacing=None):
+        if replacing is None and document["_id"] in self._documents:
+            raise DuplicateKeyError(f"E11000 duplicate key error collection: {self.full_name} index: _id_", 11000)
+        for name, (fields, partial, keys) in self._unique.items():
+            if partial is not None and not _matches(document, partial):
+                continue
+            owner = keys.get(self._unique_key(document, fields))
+            if owner is not None and owner != document["_id"]:
+                raise DuplicateKeyError(f"E11000 duplicate key error collection: {self.full_name} index: {name}", 11000)
+
+    def _add(self, document):
+        self._check_unique(document)
+        self._documents[document["_id"]] = document
+        self._index(document)
+
+    def _replace(self, old, new):
+        self._unindex(old)
+        try:
+            self._check_unique(new, replacing=old)
+        except DuplicateKeyError:
+            self._index(old)
+            raise
+        self._documents[new["_id"]] = new
+        self._index(new)
+
+    def _remove(self, document):
+        self._unindex(document)
+        del self._documents[document["_id"]]
+
+    def _candidates(self, query):
+        """Narrow by the user_id and (user_id, id) indexes before matching"""
+        user_id = query.get("user_id")
+        if not isinstance(user_id, str):
+            return list(self._documents.values())
+        item_id = query.get("id")
+        if isinstance(item_id, str):
+            ids = self._by_user_and_id.get((user_id, item_id), {})
+        elif isinstance(item_id, dict) and set(item_id) == {"$in"}:
+            ids = {}
+            for value in item_id["$in"]:
+                ids.update(self._by_user_and_id.get((user_id, _hashable(value)), {}))
+        else:
+            ids = self._by_user.get(user_id, {})
+        return [self._documents[document_id] for document_id in ids]
+
+    def _select(self, query, sort=None):
+        """(document, text score) pairs matching the query, sorted; callers hold the lock"""
+        query = dict(query or {})
+        text = query.pop("$text", None)
+        entries = [(document, None) for document in self._candidates(query) if _matches(document, query)]
+        if text is not None:
+            if self._text_weights is None:
+                raise OperationFailure("text index required for $text query", 27)
+            terms = set(_WORD.findall(text["$search"].lower()))
+            scored = [(document, self._text_score(document, terms)) for document, _ in entries]
+            entries = [(document, score) for document, score in scored if score]
+        if sort:
+            _sort(entries, sort)
+        return entries
+
+    def _text_score(self, document, terms):
+        score = 0.0
+        for field, weight in self._text_weights.items():
+            for value in _query_values(document, field):
+                if isinstance(value, str):
+                    words = _WORD.findall(value.lower())
+                    hits = sum(1 for word in words if word in terms)
+                    if hits:
+                        score += weight * hits / len(words)
+        return score
+
+    def _read(self, query, projection, sort, skip, limit):
+        with self._lock:
+            entries = self._select(query, sort)
+            entries = entries[skip:skip + limit] if limit else entries[skip:]
+            return [_copy(_project(document, projection, score)) for document, score in entries]
+
+    def _snapshot(self, query=None):
+        """Stored documents, narrowed by the user_id indexes when the query allows; not copies"""
+        with self._lock:
+            return self._candidates(query) if query else list(self._documents.values())
+
+    # Reads
+    def find(self, filter=None, projection=None, sort=None, skip=0, limit=0, session=None):
+        cursor = MemoryCursor(self, filter, projection).skip(skip).limit(limit)
+        return cursor.sort(sort) if sort else cursor
+
+    def find_one(self, filter=None, projection=None, sort=None, session=None):
+        return next(self.find(filter, projection, sort=sort, limit=1), None)
+
+    def count_documents(self, filter, session=None, **kwargs):
+        with self._lock:
+            return len(self._select(filter))
+
+    def estimated_document_count(self):
+        return len(self._documents)
+
+    def aggregate(self, pipeline, session=None, **kwargs):
+        # Updates replace stored documents rather than change them, and stages
+        # never change their input, so the pipeline reads the stored documents
+        # in place and only what it emits is copied
+        first_match = pipeline[0].get("$match") if pipeline else None
+        documents = self._snapshot(first_match)
+        with self._lock:
+            return iter([_copy(document) for document in _run_pipeline(self.database, documents, pipeline)])
+
+    # Writes
+    def insert_one(self, document, session=None):
+        document.setdefault("_id", ObjectId())
+        with self._lock:
+            self._add(_store(document))
+        return InsertOneResult(document["_id"], True)
+
+    def insert_many(self, documents, ordered=True, session=None):
+        inserted, errors = [], []
+        with self._lock:
+            for index, document in enumerate(documents):
+                document.setdefault("_id", ObjectId())
+                try:
+                    self._add(_store(document))
+                    inserted.append(document["_id"])
+                except DuplicateKeyError as e:
+                    errors.append({"index": index, "code": 11000, "errmsg": str(e), "op": document})
+                    if ordered:
+                        break
+        if errors:
+            raise BulkWriteError({"writeErrors": errors, "nInserted": len(inserted)})
+        return InsertManyResult(inserted, True)
+
+    def _apply(self, document, update):
+        """The updated copy of a stored document"""
+        if isinstance(update, list):
+            raise NotImplementedError("Update pipelines are not supported by the memory backend")
+        if not any(key.startswith("$") for key in update):
+            return {"_id": document["_id"], **_store(update)}
+        updated = _copy(document)
+        for operator, fields in update.items():
+            if operator == "$set":
+                for path, value in fields.items():
+                    _set_path(updated, path, _store(value))
+            elif operator == "$unset":
+                for path in fields:
+                    _unset_path(updated, path)
+            elif operator == "$inc":
+                for path, amount in fields.items():
+                    current = _expression_path(updated, path)
+                    _set_path(updated, path, amount if current is _MISSING else current + amount)
+            elif operator != "$setOnInsert":
+                raise NotImplementedError(f"Update operator {operator} is not supported by the memory backend")
+        return updated
+
+    def _upsert(self, query, update):
+        document = {}
+        for key, condition in query.items():
+            if not key.startswith("$") and not _is_operator_document(condition):
+                _set_path(document, key, _store(condition))
+            elif isinstance(condition, dict) and "$eq" in condition:
+                _set_path(document, key, _store(condition["$eq"]))
+        if any(key.startswith("$") for key in update):
+            document = self._apply(document, {**update, "$set": {**update.get("$setOnInsert", {}), **update.get("$set", {})}})
+        else:
+            document = {key: value for key, value in document.items() if key == "_id"}
+            document.update(_store(update))
+        document.setdefault("_id", ObjectId())
+        self._add(document)
+        return document
+
+    def _update(self, query, update, upsert, many, sort=None):
+        with self._lock:
+            entries = self._select(query, sort)
+            if not many:
+                entries = entries[:1]
+            modified = 0
+            for document, _ in entries:
+                updated = self._apply(document, update)
+                if updated != document:
+                    self._replace(document, updated)
+                    modified += 1
+            if not entries and upsert:
+                upserted = self._upsert(query, update)
+                return {"n": 1, "nModified": 0, "upserted": upserted["_id"]}, None, upserted
+            before = entries[0][0] if entries else None
+            after = self._documents[before["_id"]] if before else None
+            return {"n": len(entries), "nModified": modified}, before, after
+
+    def update_one(self, filter, update, upsert=False, session=None, **kwargs):
+        raw, _, _ = self._update(filter, update, upsert, many=False)
+        return UpdateResult(raw, True)
+
+    def update_many(self, filter, update, upsert=False, session=None, **kwargs):
+        raw, _, _ = self._update(filter, update, upsert, many=True)
+        return UpdateResult(raw, True)
+
+    def replace_one(self, filter, replacement, upsert=False, session=None, **kwargs):
+        raw, _, _ = self._update(filter, replacement, upsert, many=False)
+        return UpdateResult(raw, True)
+
+    def find_one_and_update(
+        self, filter, update, projection=None, sort=None, upsert=False,
+        return_document=ReturnDocument.BEFORE, session=None, **kwargs,
+    ):
+        raw, before, after = self._update(filter, update, upsert, many=False, sort=sort and _sort_keys(sort))
+        document = after if return_document == ReturnDocument.AFTER else before
+        return None if document is None else _copy(_project(document, projection))
+
+    def find_one_and_replace(self, filter, replacement, **kwargs):
+        return self.find_one_and_update(filter, replacement, **kwargs)
+
+    def find_one_and_delete(self, filter, projection=None, sort=None, session=None, **kwargs):
+        with self._lock:
+            entries = self._select(filter, sort and _sort_keys(sort))
+            if not entries:
+                return None
+            document = entries[0][0]
+            self._remove(document)
+            return _copy(_project(document, projection))
+
+    def _delete(self, query, many):
+        with self._lock:
+            entries = self._select(query)
+            if not many:
+                entries = entries[:1]
+            for document, _ in entries:
+                self._remove(document)
+            return DeleteResult({"n": len(entries)}, True)
+
+    def delete_one(self, filter, session=None, **kwargs):
+        return self._delete(filter, many=False)
+
+    def delete_many(self, filter, session=None, **kwargs):
+        return self._delete(filter, many=True)
+
+    def bulk_write(self, requests, ordered=True, session=None, **kwargs):
+        result = {"nInserted": 0, "nUpserted": 0, "nMatched": 0, "nModified": 0, "nRemoved": 0, "upserted": []}
+        errors = []
+        with self._lock:
+            for index, request in enumerate(requests):
+                try:
+                    if isinstance(request, InsertOne):
+                        self.insert_one(request._doc)
+                        result["nInserted"] += 1
+                    elif isinstance(request, (UpdateOne, UpdateMany, ReplaceOne)):
+                        raw, _, _ = self._update(
+                            request._filter, request._doc, request._upsert, many=isinstance(request, UpdateMany)
+                        )
+                        if "upserted" in raw:
+                            result["nUpserted"] += 1
+                            result["upserted"].append({"index": index, "_id": raw["upserted"]})
+                        else:
+                            result["nMatched"] += raw["n"]
+                            result["nModified"] += raw["nModified"]
+                    elif isinstance(request, (DeleteOne, DeleteMany)):
+                        result["nRemoved"] += self._delete(request._filter, many=isinstance(request, DeleteMany)).deleted_count
+                    else:
+                        raise NotImplementedError(f"{type(request).__name__} is not supported by the memory backend")
+                except DuplicateKeyError as e:
+                    errors.append({"index": index, "code": 11000, "errmsg": str(e)})
+                    if ordered:
+                        break
+        if errors:
+            raise BulkWriteError({**result, "writeErrors": errors})
+        return BulkWriteResult(result, True)
+
+    # Indexes
+    def create_index(self, keys, name=None, unique=False, partialFilterExpression=None, weights=None, **kwargs):
+        keys = [(keys, 1)] if isinstance(keys, str) else list(keys)
+        name = name or "_".join(f"{field}_{direction}" for field, direction in keys)
+        with self._lock:
+            text_fields = [field for field, direction in keys if direction == "text"]
+            if text_fields:
+                self._text_weights = {field: (weights or {}).get(field, 1) for field in text_fields}
+            if unique:
+                fields = [field for field, _ in keys]
+                index = (fields, partialFilterExpression, {})
+                for document in self._documents.values():
+                    if partialFilterExpression is not None and not _matches(document, partialFilterExpression):
+                        continue
+                    key = self._unique_key(document, fields)
+                    if key in index[2]:
+                        raise DuplicateKeyError(f"E11000 duplicate key error collection: {self.full_name} index: {name}", 11000)
+                    index[2][key] = document["_id"]
+                self._unique[name] = index
+        return name
+
+    def drop(self):
+        with self._lock:
+            self._documents.clear()
+            self._by_user.clear()
+            self._by_user_and_id.clear()
+            for _, _, keys in self._unique.values():
+                keys.clear()
+
+
+class MemoryDatabase:
+    def __init__(self, client, name):
+        self.client = client
+        self.name = name
+        self._lock = client._lock
+        self._collections = {}
+        # GridFS contents by (bucket, file id)
+        self._file_data = {}
+
+    def __getitem__(self, name):
+        with self._lock:
+            if name not in self._collections:
+                self._collections[name] = MemoryCollection(self, name)
+            return self._collections[name]
+
+    def __getattr__(self, name):
+        if name.startswith("_"):
+            raise AttributeError(name)
+        return self[name]
+
+    def list_collection_names(self):
+        return list(self._collections)
+
+    def drop_collection(self, name):
+        with self._lock:
+            self._collections.pop(name, None)
+
+    def command(self, name, *args, **kwargs):
+        return self.client.admin.command(name, *args, **kwargs)
+
+    def watch(self, *args, **kwargs):
+        raise OperationFailure("Change streams need a replica set; the memory backend is not one", 40573)
+
+
+class MemoryClient:
+    def __init__(self):
+        self._lock = threading.RLock()
+        self._databases = {}
+        self.admin = SimpleNamespace(command=self._command)
+
+    def _command(self, name, *args, **kwargs):
+        if name == "ping":
+            return {"ok": 1.0}
+        if name in ("hello", "isMaster"):
+            # No setName: callers treat this like a standalone server without transactions
+            return {"isWritablePrimary": True, "ok": 1.0}
+        raise NotImplementedError(f"Command {name} is not supported by the memory backend")
+
+    def __getitem__(self, name):
+        with self._lock:
+            if name not in self._databases:
+                self._databases[name] = MemoryDatabase(self, name)
+            return self._databases[name]
+
+    def get_database(self, name):
+        return self[name]
+
+    def drop_database(self, name):
+        with self._lock:
+            self._databases.pop(getattr(name, "name", name), None)
+
+    def close(self):
+        pass
+
+
+# Files
+class MemoryFile:
+    """The read side of a GridOut"""
+
+    CHUNK_SIZE = 255 * 1024
+
+    def __init__(self, document, data):
+        self._id = document["_id"]
+        self.filename = document.get("filename")
+        self.content_type = document.get("contentType")
+        self.length = document["length"]
+        self.upload_date = document["uploadDate"]
+        self.metadata = document.get("metadata")
+        self._data = data
+
+    def read(self):
+        return self._data
+
+    def __iter__(self):
+        for start in range(0, len(self._data), self.CHUNK_SIZE):
+            yield self._data[start:start + self.CHUNK_SIZE]
+
+
+class MemoryFileStore:
+    """The parts of gridfs.GridFS that server.py uses"""
+
+    def __init__(self, database, collection="fs"):
+        self._database = database
+        self._bucket = collection
+        self._files = database[f"{collection}.files"]
+
+    def put(self, data, _id=None, filename=None, content_type=None, metadata=None, **kwargs):
+        document = {
+            "_id": ObjectId() if _id is None else _id,
+            "length": len(data),
+            "chunkSize": MemoryFile.CHUNK_SIZE,
+            "uploadDate": datetime.utcnow(),
+            **kwargs,
+        }
+        for field, value in [("filename", filename), ("contentType", content_type), ("metadata", metadata)]:
+            if value is not None:
+                document[field] = value
+        with self._database._lock:
+            try:
+                self._files.insert_one(document)
+            except DuplicateKeyError:
+                raise gridfs.errors.FileExists(f"file with _id {document['_id']!r} already exists")
+            self._database._file_data[(self._bucket, document["_id"])] = bytes(data)
+        return document["_id"]
+
+    def _open(self, document):
+        return MemoryFile(document, self._database._file_data[(self._bucket, document["_id"])])
+
+    def get(self, file_id):
+        with self._database._lock:
+            document = self._files.find_one({"_id": file_id})
+            if document is None:
+                raise gridfs.errors.NoFile(f"no file in gridfs collection {self._files.full_name!r} with _id {file_id!r}")
+            return self._open(document)
+
+    def find(self, filter=None):
+        with self._database._lock:
+            return [self._open(document) for document in self._files.find(filter or {})]
+
+    def exists(self, document_or_id=None, **kwargs):
+        query = kwargs if document_or_id is None else {"_id": document_or_id}
+        return self._files.find_one(query) is not None
+
+    def delete(self, file_id):
+        with self._database._lock:
+            self._files.delete_one({"_id": file_id})
+            self._database._file_data.pop((self._bucket, file_id), None)
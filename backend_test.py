@@ -19,6 +19,9 @@ with open('/app/frontend/.env', 'r') as f:
 
 print(f"Using backend URL: {BACKEND_URL}")
 
+# Admin endpoints are checked only when the suite knows the server's key
+ADMIN_API_KEY = os.environ.get("ADMIN_API_KEY")
+
 class BusinessManagementAPITest(unittest.TestCase):
     """Test suite for the Business Management API"""
 
@@ -52,6 +55,14 @@ class BusinessManagementAPITest(unittest.TestCase):
         data = response.json()
         self.assertEqual(data["status"], "healthy")
         self.assertIn("timestamp", data)
+        
+        response = requests.get(f"{BACKEND_URL}/health/live")
+        self.assertEqual(response.status_code, 200)
+        
+        # The suite runs against a warmed-up server
+        response = requests.get(f"{BACKEND_URL}/health/ready")
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.json()["ready"])
         print("✅ Health endpoint is working")
         
     # Authentication System Tests
@@ -67,8 +78,17 @@ class BusinessManagementAPITest(unittest.TestCase):
         data = response.json()
         self.assertIn("user", data)
         self.assertIn("token", data)
-        self.assertEqual(data["token"], "mock_jwt_token")
         self.__class__.user_id = data["user"]["id"]
+        self.__class__.token = data["token"]
+        
+        # The token authenticates as the signed-in user
+        headers = {"Authorization": f"Bearer {data['token']}"}
+        response = requests.get(f"{BACKEND_URL}/auth/me", headers=headers)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()["id"], self.__class__.user_id)
+        
+        response = requests.get(f"{BACKEND_URL}/auth/me", headers={"Authorization": "Bearer not-a-token"})
+        self.assertEqual(response.status_code, 401)
         print(f"✅ Google OAuth authentication working with user ID: {self.__class__.user_id}")
         
     def test_01b_get_current_user(self):
@@ -229,6 +249,17 @@ class BusinessManagementAPITest(unittest.TestCase):
             
         print(f"✅ Get upcoming meetings endpoint working, found {len(data['upcoming_meetings'])} meetings")
 
+    def test_01i_logout_revokes_token(self):
+        """Test logout revokes the token it was called with"""
+        print("\n=== Testing Logout ===")
+        token = requests.post(f"{BACKEND_URL}/auth/google", json={"code": "logout_code", "user_id": "test_user_id"}).json()["token"]
+        headers = {"Authorization": f"Bearer {token}"}
+        response = requests.post(f"{BACKEND_URL}/auth/logout", headers=headers)
+        self.assertEqual(response.status_code, 200)
+        response = requests.get(f"{BACKEND_URL}/auth/me", headers=headers)
+        self.assertEqual(response.status_code, 401)
+        print("✅ Logout revokes the token")
+        
     def test_02_create_client(self):
         """Test creating a new client with user context"""
         print("\n=== Testing Client Creation with User Context ===")
@@ -549,6 +580,11 @@ class BusinessManagementAPITest(unittest.TestCase):
         if len(data) > 0:
             self.__class__.payment_id = data[0]["id"]
             print(f"✅ Found payment with ID: {self.__class__.payment_id}")
+        
+        # Archived payments are only included on request
+        response = requests.get(f"{BACKEND_URL}/payments?include_archived=true")
+        self.assertEqual(response.status_code, 200)
+        self.assertGreaterEqual(len(response.json()), len(data))
 
     def test_18_get_payment(self):
         """Test getting a specific payment"""
@@ -578,6 +614,374 @@ class BusinessManagementAPITest(unittest.TestCase):
         self.assertIn("recent_payments", data)
         print("✅ Dashboard stats retrieved successfully")
 
+    def test_19_revenue_analytics(self):
+        """Test completed payments show up in the revenue series per day, week and month"""
+        print("\n=== Testing Revenue Analytics ===")
+        today = datetime.utcnow().date()
+        buckets = {
+            "day": today.isoformat(),
+            "week": (today - timedelta(days=today.weekday())).isoformat(),
+            "month": today.replace(day=1).isoformat(),
+        }
+
+        def received(granularity, currency, **params):
+            response = requests.get(
+                f"{BACKEND_URL}/analytics/revenue", params={"granularity": granularity, "currency": currency, **params}
+            )
+            self.assertEqual(response.status_code, 200)
+            series = response.json()["series"]
+            self.assertTrue(all(point["currency"] == currency for point in series))
+            return sum(point["received"] for point in series if point["period"] == buckets[granularity])
+
+        before = {granularity: received(granularity, "eur") for granularity in buckets}
+        checkout = requests.post(
+            f"{BACKEND_URL}/payments/v1/checkout/session",
+            json={"amount": 25.0, "currency": "eur", "description": "Analytics payment"},
+            headers={"origin": "https://example.com"},
+        )
+        if checkout.status_code != 200:
+            print("⚠️ Revenue analytics test skipped - Stripe integration may be mocked or unavailable")
+            return
+        status = requests.get(f"{BACKEND_URL}/payments/v1/checkout/status/{checkout.json()['session_id']}")
+        if status.status_code != 200 or status.json()["payment_status"] != "paid":
+            print("⚠️ Revenue analytics test skipped - checkout did not complete")
+            return
+
+        # The payment lands in today's bucket at every granularity, and only under its currency
+        for granularity in buckets:
+            self.assertAlmostEqual(received(granularity, "eur") - before[granularity], 25.0)
+        usd_series = requests.get(f"{BACKEND_URL}/analytics/revenue", params={"currency": "usd"}).json()["series"]
+        self.assertTrue(all(point["currency"] == "usd" for point in usd_series))
+
+        # from/to bound the days included
+        tomorrow = (today + timedelta(days=1)).isoformat()
+        response = requests.get(f"{BACKEND_URL}/analytics/revenue", params={"from": tomorrow})
+        self.assertEqual(response.json()["series"], [])
+        self.assertAlmostEqual(received("day", "eur", to=today.isoformat()) - before["day"], 25.0)
+
+        response = requests.get(f"{BACKEND_URL}/analytics/revenue", params={"granularity": "year"})
+        self.assertEqual(response.status_code, 422)
+        
+        # Rebuilding is an admin repair and gives the same figures
+        response = requests.post(f"{BACKEND_URL}/analytics/revenue/rebuild")
+        self.assertEqual(response.status_code, 403)
+        if not ADMIN_API_KEY:
+            self.skipTest("ADMIN_API_KEY not set")
+        series = requests.get(f"{BACKEND_URL}/analytics/revenue").json()["series"]
+        response = requests.post(f"{BACKEND_URL}/analytics/revenue/rebuild", headers={"X-Admin-Key": ADMIN_API_KEY})
+        self.assertEqual(response.status_code, 200)
+        self.assertGreaterEqual(response.json()["rollups"], 1)
+        self.assertEqual(requests.get(f"{BACKEND_URL}/analytics/revenue").json()["series"], series)
+        print("✅ Revenue analytics working")
+
+    def test_19a_search(self):
+        """Test full-text search across entities"""
+        print("\n=== Testing Search ===")
+        response = requests.get(f"{BACKEND_URL}/search", params={"q": "Acme"})
+        self.assertEqual(response.status_code, 200)
+        data = response.json()
+        self.assertIn("results", data)
+        result_ids = [result["id"] for result in data["results"]]
+        self.assertIn(self.__class__.client_id, result_ids)
+        
+        # Types use the route names, as in /autocomplete
+        response = requests.get(f"{BACKEND_URL}/search", params={"q": "Acme", "types": "clients,team-members"})
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(all(result["type"] in ("clients", "team-members") for result in response.json()["results"]))
+        self.assertIn(self.__class__.client_id, [result["id"] for result in response.json()["results"]])
+
+        # Empty and unknown-type queries are rejected
+        response = requests.get(f"{BACKEND_URL}/search", params={"q": "  "})
+        self.assertEqual(response.status_code, 400)
+        response = requests.get(f"{BACKEND_URL}/search", params={"q": "Acme", "types": "client"})
+        self.assertEqual(response.status_code, 400)
+        self.assertIn("clients, projects, team-members", response.json()["detail"])
+        print(f"✅ Search returned {len(data['results'])} results")
+
+    def test_19b_autocomplete(self):
+        """Test typeahead over client and project names"""
+        print("\n=== Testing Autocomplete ===")
+        response = requests.get(f"{BACKEND_URL}/autocomplete/clients", params={"prefix": "acme"})
+        self.assertEqual(response.status_code, 200)
+        result_ids = [result["id"] for result in response.json()["results"]]
+        self.assertIn(self.__class__.client_id, result_ids)
+
+        # Word prefixes match too, not only the start of the name
+        response = requests.get(f"{BACKEND_URL}/autocomplete/projects", params={"prefix": "redes"})
+        self.assertEqual(response.status_code, 200)
+        result_ids = [result["id"] for result in response.json()["results"]]
+        self.assertIn(self.__class__.project_id, result_ids)
+
+        response = requests.get(f"{BACKEND_URL}/autocomplete/invoices", params={"prefix": "a"})
+        self.assertEqual(response.status_code, 422)
+        print("✅ Autocomplete endpoint working")
+
+    def test_19c_project_profitability(self):
+        """Test the project profitability report"""
+        print("\n=== Testing Project Profitability Report ===")
+        response = requests.get(f"{BACKEND_URL}/reports/project-profitability", params={"sort_by": "received", "limit": 10})
+        self.assertEqual(response.status_code, 200)
+        data = response.json()
+        self.assertIn("total", data)
+        self.assertIn("items", data)
+        self.assertLessEqual(len(data["items"]), 10)
+        for item in data["items"]:
+            self.assertAlmostEqual(item["profit"], item["received"] - item["paid_out"])
+
+        response = requests.get(f"{BACKEND_URL}/reports/project-profitability", params={"sort_by": "client_email"})
+        self.assertEqual(response.status_code, 422)
+        print(f"✅ Profitability report returned {len(data['items'])} projects")
+
+    def test_19c1_event_stream(self):
+        """Test a write is pushed to the user's Server-Sent Events stream"""
+        print("\n=== Testing Event Stream ===")
+        token = requests.post(f"{BACKEND_URL}/auth/google", json={"code": "test_auth_code", "user_id": "test_user_id"}).json()["token"]
+        # EventSource cannot set headers, so the stream takes the token as a query parameter
+        stream = requests.get(f"{BACKEND_URL}/events/stream", params={"access_token": token}, stream=True, timeout=10)
+        self.assertEqual(stream.status_code, 200)
+        self.assertTrue(stream.headers["Content-Type"].startswith("text/event-stream"))
+        lines = stream.iter_lines(decode_unicode=True)
+        self.assertEqual(next(lines), "retry: 5000")
+
+        client = requests.post(
+            f"{BACKEND_URL}/clients",
+            json={"name": "Stream Co", "email": "stream@example.com"},
+            headers={"Authorization": f"Bearer {token}"},
+        ).json()
+        event = {}
+        for line in lines:
+            if line.startswith("event: "):
+                event = {"event": line[len("event: "):]}
+            elif line.startswith("data: "):
+                event["data"] = json.loads(line[len("data: "):])
+            elif not line and event.get("event") == "client.created":
+                break
+        stream.close()
+        self.assertEqual(event["data"]["id"], client["id"])
+        self.assertEqual(event["data"]["name"], "Stream Co")
+
+        response = requests.get(f"{BACKEND_URL}/events/stream", params={"access_token": "not-a-token"})
+        self.assertEqual(response.status_code, 401)
+        requests.delete(f"{BACKEND_URL}/clients/{client['id']}", headers={"Authorization": f"Bearer {token}"})
+        print("✅ Event stream working")
+
+    def test_19d_delta_sync(self):
+        """Test delta sync returns only changes since the token"""
+        print("\n=== Testing Delta Sync ===")
+        response = requests.get(f"{BACKEND_URL}/sync")
+        self.assertEqual(response.status_code, 200)
+        data = response.json()
+        self.assertTrue(data["full"])
+        self.assertIn(self.__class__.client_id, [client["id"] for client in data["changes"]["clients"]])
+
+        # A client created and deleted after the token comes back as a tombstone
+        client = requests.post(f"{BACKEND_URL}/clients", json={"name": "Sync Client", "email": "sync@example.com"}).json()
+        requests.delete(f"{BACKEND_URL}/clients/{client['id']}")
+        response = requests.get(f"{BACKEND_URL}/sync", params={"since": data["token"]})
+        self.assertEqual(response.status_code, 200)
+        delta = response.json()
+        self.assertFalse(delta["full"])
+        self.assertIn(client["id"], delta["deleted"]["clients"])
+
+        response = requests.get(f"{BACKEND_URL}/sync", params={"since": "not-a-token"})
+        self.assertEqual(response.status_code, 400)
+        print("✅ Delta sync working")
+
+    def test_19da_rename_fan_out(self):
+        """Test renaming a client updates the name copied onto its projects and payments"""
+        print("\n=== Testing Rename Fan-out ===")
+        client = requests.post(f"{BACKEND_URL}/clients", json={"name": "Rename Co", "email": "rename@example.com"}).json()
+        project = requests.post(f"{BACKEND_URL}/projects", json={"name": "Rename Project", "client_id": client["id"]}).json()
+        self.assertEqual(project["client_name"], "Rename Co")
+        checkout = requests.post(
+            f"{BACKEND_URL}/payments/v1/checkout/session",
+            json={"amount": 10.0, "currency": "usd", "client_id": client["id"], "project_id": project["id"]},
+            headers={"origin": "https://example.com"},
+        )
+        self.assertEqual(checkout.status_code, 200)
+        sync_token = requests.get(f"{BACKEND_URL}/sync").json()["token"]
+
+        response = requests.put(f"{BACKEND_URL}/clients/{client['id']}", json={"name": "Renamed Co", "email": "rename@example.com"})
+        self.assertEqual(response.status_code, 200)
+        for _ in range(10):  # the copies are updated after the response
+            project = requests.get(f"{BACKEND_URL}/projects/{project['id']}").json()
+            payments = [p for p in requests.get(f"{BACKEND_URL}/payments").json() if p.get("client_id") == client["id"]]
+            if project["client_name"] == "Renamed Co" and all(p["client_name"] == "Renamed Co" for p in payments):
+                break
+            time.sleep(0.5)
+        self.assertEqual(project["client_name"], "Renamed Co")
+        self.assertEqual(len(payments), 1)
+        self.assertEqual(payments[0]["client_name"], "Renamed Co")
+
+        # The updated copies reach delta-sync clients, and nothing is left stale
+        delta = requests.get(f"{BACKEND_URL}/sync", params={"since": sync_token}).json()
+        self.assertIn(project["id"], [p["id"] for p in delta["changes"]["projects"]])
+        self.assertIn(payments[0]["id"], [p["id"] for p in delta["changes"]["payments"]])
+        response = requests.post(f"{BACKEND_URL}/consistency/names", params={"repair": "true"})
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.json()["repaired"])
+        response = requests.post(f"{BACKEND_URL}/consistency/names")
+        self.assertEqual(set(response.json()["stale"].values()), {0})
+        print("✅ Rename fan-out working")
+
+    def test_19e_bootstrap(self):
+        """Test the composite page-load endpoint"""
+        print("\n=== Testing Bootstrap ===")
+        response = requests.get(f"{BACKEND_URL}/bootstrap")
+        self.assertEqual(response.status_code, 200)
+        data = response.json()
+        for section in ["user", "integrations", "clients", "projects", "team_members",
+                        "payments", "upcoming_meetings", "dashboard_stats"]:
+            self.assertIn(section, data)
+        project = next(p for p in data["projects"] if p["id"] == self.__class__.project_id)
+        self.assertIn("client_name", project)
+
+        # Only the requested sections come back
+        response = requests.get(f"{BACKEND_URL}/bootstrap", params={"sections": "clients,dashboard_stats"})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(set(response.json()), {"clients", "dashboard_stats"})
+
+        response = requests.get(f"{BACKEND_URL}/bootstrap", params={"sections": "invoices"})
+        self.assertEqual(response.status_code, 400)
+        print("✅ Bootstrap endpoint working")
+
+    def test_19f_batch_get(self):
+        """Test batch get preserves order and reports missing ids"""
+        print("\n=== Testing Batch Get ===")
+        missing_id = str(uuid.uuid4())
+        response = requests.post(f"{BACKEND_URL}/clients/batch-get", json={"ids": [missing_id, self.__class__.client_id]})
+        self.assertEqual(response.status_code, 200)
+        data = response.json()
+        self.assertEqual([client["id"] for client in data["items"]], [self.__class__.client_id])
+        self.assertEqual(data["missing"], [missing_id])
+
+        ids = [self.__class__.freelancer_id, self.__class__.team_member_id]
+        response = requests.post(f"{BACKEND_URL}/team-members/batch-get", json={"ids": ids})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([member["id"] for member in response.json()["items"]], ids)
+
+        response = requests.post(f"{BACKEND_URL}/projects/batch-get", json={"ids": [str(uuid.uuid4())] * 501})
+        self.assertEqual(response.status_code, 400)
+        print("✅ Batch get endpoints working")
+
+    def test_19g_cascading_delete(self):
+        """Test deleting a client removes its projects and archive mode keeps nothing live"""
+        print("\n=== Testing Cascading Delete ===")
+        client = requests.post(f"{BACKEND_URL}/clients", json={"name": "Cascade Co", "email": "cascade@example.com"}).json()
+        project = requests.post(f"{BACKEND_URL}/projects", json={"name": "Cascade Project", "client_id": client["id"]}).json()
+
+        response = requests.delete(f"{BACKEND_URL}/clients/{client['id']}?mode=archive")
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()["projects_deleted"], 1)
+        self.assertEqual(requests.get(f"{BACKEND_URL}/projects/{project['id']}").status_code, 404)
+
+        response = requests.post(f"{BACKEND_URL}/consistency/orphans")
+        self.assertEqual(response.status_code, 200)
+        self.assertNotIn(project["id"], response.json()["projects"])
+        print("✅ Cascading delete working")
+
+    def test_19h_request_coalescing(self):
+        """Test concurrent identical reads are counted in the coalescing metrics"""
+        print("\n=== Testing Request Coalescing ===")
+        from concurrent.futures import ThreadPoolExecutor
+        with ThreadPoolExecutor(max_workers=8) as pool:
+            responses = list(pool.map(lambda _: requests.get(f"{BACKEND_URL}/dashboard/stats"), range(8)))
+        self.assertTrue(all(response.status_code == 200 for response in responses))
+        
+        response = requests.get(f"{BACKEND_URL}/metrics/coalescing")
+        self.assertEqual(response.status_code, 403)
+        if not ADMIN_API_KEY:
+            self.skipTest("ADMIN_API_KEY not set")
+        response = requests.get(f"{BACKEND_URL}/metrics/coalescing", headers={"X-Admin-Key": ADMIN_API_KEY})
+        self.assertEqual(response.status_code, 200)
+        stats = response.json()["dashboard-stats"]
+        self.assertGreaterEqual(stats["calls"], 8)
+        self.assertLessEqual(stats["executions"], stats["calls"])
+        print(f"✅ Request coalescing working, ratio {stats['coalescing_ratio']}")
+
+    def test_19i_load_metrics(self):
+        """Test load metrics report in-flight requests, loop lag and rejections"""
+        print("\n=== Testing Load Metrics ===")
+        # Load and pool statistics are admin-only
+        response = requests.get(f"{BACKEND_URL}/metrics/load")
+        self.assertEqual(response.status_code, 403)
+        response = requests.get(f"{BACKEND_URL}/admin/mongo-pool", headers={"X-Admin-Key": "wrong-key"})
+        self.assertEqual(response.status_code, 403)
+        if not ADMIN_API_KEY:
+            self.skipTest("ADMIN_API_KEY not set")
+        
+        response = requests.get(f"{BACKEND_URL}/metrics/load", headers={"X-Admin-Key": ADMIN_API_KEY})
+        self.assertEqual(response.status_code, 200)
+        data = response.json()
+        self.assertGreaterEqual(data["in_flight"], 1)
+        self.assertIn("loop_lag_ms", data)
+        self.assertIn("rate_limited", data["rejected"])
+        print("✅ Load metrics working")
+
+    def test_19j_activity_log(self):
+        """Test write handlers are recorded in the activity log and pages follow the cursor"""
+        print("\n=== Testing Activity Log ===")
+        client = requests.post(f"{BACKEND_URL}/clients", json={"name": "Audit Co", "email": "audit@example.com"}).json()
+        requests.put(f"{BACKEND_URL}/clients/{client['id']}", json={"name": "Audit Co 2", "email": "audit@example.com"})
+        time.sleep(2)  # entries are flushed in the background
+
+        response = requests.get(f"{BACKEND_URL}/activity", params={"entity_id": client["id"], "limit": 1})
+        self.assertEqual(response.status_code, 200)
+        data = response.json()
+        self.assertEqual(data["items"][0]["action"], "client.updated")
+        self.assertIsNotNone(data["next_cursor"])
+
+        response = requests.get(
+            f"{BACKEND_URL}/activity", params={"entity_id": client["id"], "limit": 1, "cursor": data["next_cursor"]}
+        )
+        self.assertEqual(response.json()["items"][0]["action"], "client.created")
+        print("✅ Activity log working")
+
+    def test_19k_background_jobs(self):
+        """Test an export job runs to completion and its result downloads"""
+        print("\n=== Testing Background Jobs ===")
+        response = requests.post(f"{BACKEND_URL}/jobs", json={"type": "export"})
+        self.assertEqual(response.status_code, 202)
+        job = response.json()
+        self.assertEqual(job["status"], "queued")
+
+        for _ in range(30):
+            job = requests.get(f"{BACKEND_URL}/jobs/{job['id']}").json()
+            if job["status"] not in ("queued", "running"):
+                break
+            time.sleep(1)
+        self.assertEqual(job["status"], "succeeded")
+
+        response = requests.get(f"{BACKEND_URL}/jobs/{job['id']}/result")
+        self.assertEqual(response.status_code, 200)
+        self.assertIn("clients", response.json())
+
+        # Finished jobs cannot be cancelled
+        response = requests.post(f"{BACKEND_URL}/jobs/{job['id']}/cancel")
+        self.assertEqual(response.status_code, 409)
+        print("✅ Background jobs working")
+
+    def test_19l_client_statement(self):
+        """Test a client's monthly statement renders as a PDF and is revalidated by ETag"""
+        print("\n=== Testing Client Statement ===")
+        client = requests.post(f"{BACKEND_URL}/clients", json={"name": "Statement Co", "email": "statement@example.com"}).json()
+        month = datetime.utcnow().strftime("%Y-%m")
+        response = requests.get(f"{BACKEND_URL}/clients/{client['id']}/statement", params={"month": month})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.headers["Content-Type"], "application/pdf")
+        self.assertTrue(response.content.startswith(b"%PDF-"))
+
+        response = requests.get(
+            f"{BACKEND_URL}/clients/{client['id']}/statement",
+            params={"month": month},
+            headers={"If-None-Match": response.headers["ETag"]},
+        )
+        self.assertEqual(response.status_code, 304)
+
+        response = requests.get(f"{BACKEND_URL}/clients/{client['id']}/statement", params={"month": "2024-13"})
+        self.assertEqual(response.status_code, 422)
+        print("✅ Client statement working")
+
     def test_20_error_handling_nonexistent_resources(self):
         """Test error handling for non-existent resources"""
         print("\n=== Testing Error Handling for Non-existent Resources ===")
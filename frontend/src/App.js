@@ -3,6 +3,18 @@ import './App.css';
 
 const API_BASE_URL = process.env.REACT_APP_BACKEND_URL || 'http://localhost:8001';
 
+// Sends the stored session token with every API request
+const apiFetch = (url, options = {}) => {
+  const token = localStorage.getItem('auth_token');
+  if (!token) {
+    return fetch(url, options);
+  }
+  return fetch(url, {
+    ...options,
+    headers: { ...options.headers, Authorization: `Bearer ${token}` },
+  });
+};
+
 // Theme Context
 const ThemeContext = createContext();
 
@@ -44,7 +56,7 @@ const AuthProvider = ({ children }) => {
 
   const fetchCurrentUser = async () => {
     try {
-      const response = await fetch(`${API_BASE_URL}/api/auth/me`);
+      const response = await apiFetch(`${API_BASE_URL}/api/auth/me`);
       const userData = await response.json();
       setUser(userData);
     } catch (error) {
@@ -56,7 +68,7 @@ const AuthProvider = ({ children }) => {
 
   const login = async (authCode) => {
     try {
-      const response = await fetch(`${API_BASE_URL}/api/auth/google`, {
+      const response = await apiFetch(`${API_BASE_URL}/api/auth/google`, {
         method: 'POST',
         headers: {
           'Content-Type': 'application/json',
@@ -73,7 +85,12 @@ const AuthProvider = ({ children }) => {
     }
   };
 
-  const logout = () => {
+  const logout = async () => {
+    try {
+      await apiFetch(`${API_BASE_URL}/api/auth/logout`, { method: 'POST' });
+    } catch (error) {
+      console.error('Logout error:', error);
+    }
     setUser(null);
     localStorage.removeItem('auth_token');
   };
@@ -129,7 +146,7 @@ const ProfileSettings = ({ isOpen, onClose }) => {
 
   const fetchIntegrations = async () => {
     try {
-      const response = await fetch(`${API_BASE_URL}/api/integrations`);
+      const response = await apiFetch(`${API_BASE_URL}/api/integrations`);
       const data = await response.json();
       setIntegrations(data);
     } catch (error) {
@@ -140,7 +157,7 @@ const ProfileSettings = ({ isOpen, onClose }) => {
   const updateProfile = async (e) => {
     e.preventDefault();
     try {
-      await fetch(`${API_BASE_URL}/api/auth/me`, {
+      await apiFetch(`${API_BASE_URL}/api/auth/me`, {
         method: 'PUT',
         headers: {
           'Content-Type': 'application/json',
@@ -170,7 +187,7 @@ const ProfileSettings = ({ isOpen, onClose }) => {
         credentials.oauth_token = 'mock_calendar_token';
       }
 
-      await fetch(`${API_BASE_URL}/api/integrations`, {
+      await apiFetch(`${API_BASE_URL}/api/integrations`, {
         method: 'POST',
         headers: {
           'Content-Type': 'application/json',
@@ -191,7 +208,7 @@ const ProfileSettings = ({ isOpen, onClose }) => {
 
   const disconnectIntegration = async (integrationType) => {
     try {
-      await fetch(`${API_BASE_URL}/api/integrations/${integrationType}`, {
+      await apiFetch(`${API_BASE_URL}/api/integrations/${integrationType}`, {
         method: 'DELETE',
       });
       fetchIntegrations();
@@ -375,7 +392,7 @@ function App() {
   // Fetch data functions
   const fetchClients = async () => {
     try {
-      const response = await fetch(`${API_BASE_URL}/api/clients`);
+      const response = await apiFetch(`${API_BASE_URL}/api/clients`);
       const data = await response.json();
       setClients(data);
     } catch (error) {
@@ -385,7 +402,7 @@ function App() {
 
   const fetchProjects = async () => {
     try {
-      const response = await fetch(`${API_BASE_URL}/api/projects`);
+      const response = await apiFetch(`${API_BASE_URL}/api/projects`);
       const data = await response.json();
       setProjects(data);
     } catch (error) {
@@ -395,7 +412,7 @@ function App() {
 
   const fetchTeamMembers = async () => {
     try {
-      const response = await fetch(`${API_BASE_URL}/api/team-members`);
+      const response = await apiFetch(`${API_BASE_URL}/api/team-members`);
       const data = await response.json();
       setTeamMembers(data);
     } catch (error) {
@@ -405,7 +422,7 @@ function App() {
 
   const fetchPayments = async () => {
     try {
-      const response = await fetch(`${API_BASE_URL}/api/payments`);
+      const response = await apiFetch(`${API_BASE_URL}/api/payments`);
       const data = await response.json();
       setPayments(data);
     } catch (error) {
@@ -413,34 +430,36 @@ function App() {
     }
   };
 
-  const fetchUpcomingMeetings = async () => {
+  const fetchDashboardStats = async () => {
     try {
-      const response = await fetch(`${API_BASE_URL}/api/calendar/upcoming`);
+      const response = await apiFetch(`${API_BASE_URL}/api/dashboard/stats`);
       const data = await response.json();
-      setUpcomingMeetings(data.upcoming_meetings || []);
+      setDashboardStats(data);
     } catch (error) {
-      console.error('Error fetching upcoming meetings:', error);
+      console.error('Error fetching dashboard stats:', error);
     }
   };
 
-  const fetchDashboardStats = async () => {
+  // Load everything the dashboard needs in a single request
+  const fetchBootstrap = async () => {
     try {
-      const response = await fetch(`${API_BASE_URL}/api/dashboard/stats`);
+      const sections = 'clients,projects,team_members,payments,upcoming_meetings,dashboard_stats';
+      const response = await apiFetch(`${API_BASE_URL}/api/bootstrap?sections=${sections}`);
       const data = await response.json();
-      setDashboardStats(data);
+      setClients(data.clients || []);
+      setProjects(data.projects || []);
+      setTeamMembers(data.team_members || []);
+      setPayments(data.payments || []);
+      setUpcomingMeetings(data.upcoming_meetings || []);
+      setDashboardStats(data.dashboard_stats || {});
     } catch (error) {
-      console.error('Error fetching dashboard stats:', error);
+      console.error('Error fetching bootstrap data:', error);
     }
   };
 
   useEffect(() => {
     if (user) {
-      fetchClients();
-      fetchProjects();
-      fetchTeamMembers();
-      fetchPayments();
-      fetchUpcomingMeetings();
-      fetchDashboardStats();
+      fetchBootstrap();
     }
   }, [user]);
 
@@ -773,7 +792,7 @@ function App() {
         `${API_BASE_URL}/api/clients`;
       const method = clientModal.data ? 'PUT' : 'POST';
       
-      const response = await fetch(url, {
+      const response = await apiFetch(url, {
         method,
         headers: {
           'Content-Type': 'application/json',
@@ -797,7 +816,7 @@ function App() {
         `${API_BASE_URL}/api/projects`;
       const method = projectModal.data ? 'PUT' : 'POST';
       
-      const response = await fetch(url, {
+      const response = await apiFetch(url, {
         method,
         headers: {
           'Content-Type': 'application/json',
@@ -821,7 +840,7 @@ function App() {
         `${API_BASE_URL}/api/team-members`;
       const method = teamMemberModal.data ? 'PUT' : 'POST';
       
-      const response = await fetch(url, {
+      const response = await apiFetch(url, {
         method,
         headers: {
           'Content-Type': 'application/json',
@@ -840,7 +859,7 @@ function App() {
 
   const handlePaymentRequest = async (formData) => {
     try {
-      const response = await fetch(`${API_BASE_URL}/api/payments/v1/checkout/session`, {
+      const response = await apiFetch(`${API_BASE_URL}/api/payments/v1/checkout/session`, {
         method: 'POST',
         headers: {
           'Content-Type': 'application/json',
@@ -860,7 +879,7 @@ function App() {
   const handleDeleteClient = async (clientId) => {
     if (window.confirm('Are you sure you want to delete this client?')) {
       try {
-        await fetch(`${API_BASE_URL}/api/clients/${clientId}`, {
+        await apiFetch(`${API_BASE_URL}/api/clients/${clientId}`, {
           method: 'DELETE',
         });
         fetchClients();
@@ -873,7 +892,7 @@ function App() {
   const handleDeleteProject = async (projectId) => {
     if (window.confirm('Are you sure you want to delete this project?')) {
       try {
-        await fetch(`${API_BASE_URL}/api/projects/${projectId}`, {
+        await apiFetch(`${API_BASE_URL}/api/projects/${projectId}`, {
           method: 'DELETE',
         });
         fetchProjects();
@@ -886,7 +905,7 @@ function App() {
   const handleDeleteTeamMember = async (memberId) => {
     if (window.confirm('Are you sure you want to delete this team member?')) {
       try {
-        await fetch(`${API_BASE_URL}/api/team-members/${memberId}`, {
+        await apiFetch(`${API_BASE_URL}/api/team-members/${memberId}`, {
           method: 'DELETE',
         });
         fetchTeamMembers();
@@ -908,7 +927,7 @@ function App() {
 
   const checkPaymentStatus = async (sessionId) => {
     try {
-      const response = await fetch(`${API_BASE_URL}/api/payments/v1/checkout/status/${sessionId}`);
+      const response = await apiFetch(`${API_BASE_URL}/api/payments/v1/checkout/status/${sessionId}`);
       if (response.ok) {
         const data = await response.json();
         if (data.payment_status === 'paid') {
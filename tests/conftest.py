@@ -0,0 +1,87 @@
+"""Shared setup for the pytest suites in this directory.
+
+Makes ``backend/`` importable and points ``server`` at the in-memory
+storage backend unless ``STORAGE_BACKEND`` says otherwise; the ``database``
+fixture empties it around each test. Microbenchmarks take minutes, so they only
+run with ``--microbench``; their results are written to
+``MICROBENCH_OUTPUT`` (default ``microbench-results.json`` in the
+repository root) and summarised at the end of the run.
+"""
+import json
+import os
+import platform
+import sys
+from datetime import datetime
+
+import pydantic
+import pytest
+
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(REPO_DIR, "backend"))
+os.environ.setdefault("STORAGE_BACKEND", "memory")
+
+microbench_key = pytest.StashKey[list]()
+
+
+def pytest_addoption(parser):
+    parser.addoption("--microbench", action="store_true", help="Run the CPU microbenchmarks.")
+
+
+def pytest_configure(config):
+    config.addinivalue_line("markers", "microbench: CPU microbenchmark, only run with --microbench")
+
+
+def pytest_collection_modifyitems(config, items):
+    if config.getoption("--microbench"):
+        return
+    skip = pytest.mark.skip(reason="pass --microbench to run")
+    for item in items:
+        if "microbench" in item.keywords:
+            item.add_marker(skip)
+
+
+@pytest.fixture
+def database():
+    import server
+
+    def clear():
+        for name in server.db.list_collection_names():
+            server.db[name].delete_many({})
+
+    clear()
+    yield server.db
+    clear()
+
+
+@pytest.fixture(scope="session")
+def microbench_results(request):
+    results = []
+    request.config.stash[microbench_key] = results
+    yield results
+    output = os.environ.get("MICROBENCH_OUTPUT", os.path.join(REPO_DIR, "microbench-results.json"))
+    with open(output, "w") as f:
+        json.dump(
+            {
+                "recorded_at": datetime.utcnow().isoformat(),
+                "python": platform.python_version(),
+                "pydantic": pydantic.VERSION,
+                "machine": platform.machine(),
+                "processor": platform.processor(),
+                "results": results,
+            },
+            f,
+            indent=2,
+        )
+
+
+def pytest_terminal_summary(terminalreporter, config):
+    results = config.stash.get(microbench_key, None)
+    if not results:
+        return
+    terminalreporter.section("microbenchmarks")
+    terminalreporter.write_line(f"{'model':<20} {'step':<16} {'documents':>9} {'batch ms':>10} {'us/document':>12}")
+    for result in results:
+        terminalreporter.write_line(
+            f"{result['model']:<20} {result['step']:<16} {result['documents']:>9} "
+            f"{result['seconds_per_batch'] * 1000:>10.3f} {result['microseconds_per_document']:>12.3f}"
+        )
@@ -0,0 +1,68 @@
+"""Activity log writer, run against the in-memory backend."""
+import asyncio
+
+from bson.errors import InvalidDocument
+
+import server
+
+
+def entry(entry_id):
+    return {"id": entry_id, "user_id": "u1", "action": "client.created", "at": "2026-01-01T00:00:00"}
+
+
+def stored_ids():
+    return sorted(item["id"] for item in server.activity_collection.find({}))
+
+
+def run_log(activity_log, entries):
+    async def main():
+        activity_log.start()
+        for item in entries:
+            await activity_log.record(item)
+        await activity_log.drain()
+
+    asyncio.run(main())
+
+
+def test_entries_stored_by_an_earlier_attempt_count_as_written(database):
+    first = entry("a")
+    server.activity_collection.insert_one(first)
+    activity_log = server.ActivityLog(10, 10, 0.01)
+
+    asyncio.run(activity_log.write([first, entry("b")]))
+    assert activity_log.dropped == 0
+    assert stored_ids() == ["a", "b"]
+
+
+def test_writer_keeps_going_after_a_batch_that_cannot_be_encoded(database, monkeypatch):
+    insert_many = server.activity_collection.insert_many
+    calls = []
+
+    def failing_once(batch, **kwargs):
+        calls.append(len(batch))
+        if len(calls) == 1:
+            raise InvalidDocument("cannot encode object")
+        return insert_many(batch, **kwargs)
+
+    monkeypatch.setattr(server.activity_collection, "insert_many", failing_once)
+    activity_log = server.ActivityLog(10, 1, 0.01)
+    run_log(activity_log, [entry("a"), entry("b")])
+    assert activity_log.dropped == 1
+    assert stored_ids() == ["b"]
+
+
+def test_writer_is_restarted_when_it_dies(database, monkeypatch):
+    activity_log = server.ActivityLog(10, 10, 0.01)
+    run = activity_log.run
+    starts = []
+
+    async def dying_once():
+        starts.append(1)
+        if len(starts) == 1:
+            raise RuntimeError("writer bug")
+        await run()
+
+    monkeypatch.setattr(activity_log, "run", dying_once)
+    run_log(activity_log, [entry("a")])
+    assert len(starts) == 2
+    assert stored_ids() == ["a"]
@@ -0,0 +1,43 @@
+"""Denormalized name checks, run against the in-memory backend."""
+import server
+
+
+def test_repair_fixes_stale_names_and_bumps_updated_at(database):
+    server.clients_collection.insert_one({"id": "c1", "user_id": "u1", "name": "Acme"})
+    server.projects_collection.insert_one(
+        {"id": "p1", "user_id": "u1", "client_id": "c1", "client_name": "Old name", "updated_at": "2020-01-01T00:00:00"}
+    )
+
+    stale = server.check_name_copies("u1")
+    assert stale["projects.client_name"] == [{"id": "p1", "stored": "Old name", "actual": "Acme"}]
+    assert server.projects_collection.find_one({"id": "p1"})["client_name"] == "Old name"
+
+    server.check_name_copies("u1", repair=True)
+    project = server.projects_collection.find_one({"id": "p1"})
+    assert project["client_name"] == "Acme"
+    assert project["updated_at"] > "2020-01-01T00:00:00"
+    assert server.check_name_copies("u1")["projects.client_name"] == []
+
+
+def test_references_to_another_users_records_are_orphans(database):
+    server.clients_collection.insert_many([
+        {"id": "c1", "user_id": "u1", "name": "Own"},
+        {"id": "c2", "user_id": "u2", "name": "Someone else's"},
+    ])
+    server.team_members_collection.insert_one({"id": "t2", "user_id": "u2", "name": "Other member"})
+    server.projects_collection.insert_many([
+        {"id": "p1", "user_id": "u1", "client_id": "c1", "status": "active"},
+        {"id": "p2", "user_id": "u1", "client_id": "c2", "status": "active"},
+        {"id": "p3", "user_id": "u2", "client_id": "c2", "status": "active"},
+    ])
+    server.payment_transactions_collection.insert_many([
+        {"id": "x1", "user_id": "u1", "client_id": "c1", "project_id": "p1", "team_member_id": None},
+        {"id": "x2", "user_id": "u1", "client_id": "c2", "project_id": "p3", "team_member_id": "t2"},
+    ])
+
+    orphans = server.find_orphans()
+    assert [(project["user_id"], project["id"]) for project in orphans["projects"]] == [("u1", "p2")]
+    assert orphans["payments"] == [
+        {"user_id": "u1", "id": "x2", "client_id": "c2", "project_id": "p3", "team_member_id": "t2"},
+    ]
+    assert server.find_orphans("u2") == {"projects": [], "payments": []}
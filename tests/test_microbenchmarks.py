@@ -0,0 +1,225 @@
+"""CPU microbenchmarks for model construction and serialization.
+
+Times the per-document work the handlers do around Mongo: building the
+Pydantic models, ``.dict()``, converting datetimes to ISO strings,
+stringifying ``_id`` and encoding responses. No database is needed.
+
+    pytest tests/test_microbenchmarks.py --microbench
+    MICROBENCH_SIZES=1,1000 MICROBENCH_REPEAT=5 pytest tests/test_microbenchmarks.py --microbench
+
+Each case reports the best of ``MICROBENCH_REPEAT`` runs. Small batches
+are repeated until at least ``MIN_DOCUMENTS_PER_RUN`` documents have been
+processed, so even single-document timings are stable. Results are
+written as JSON (see conftest.py); compare files from the same machine
+only.
+"""
+import os
+import time
+from datetime import datetime, timedelta
+from functools import lru_cache
+
+import pytest
+from bson import ObjectId
+from fastapi.encoders import jsonable_encoder
+
+import models
+
+SIZES = [int(size) for size in os.environ.get("MICROBENCH_SIZES", "1,1000,100000").split(",")]
+REPEAT = int(os.environ.get("MICROBENCH_REPEAT", "3"))
+MIN_DOCUMENTS_PER_RUN = 10000
+NOW = datetime(2024, 1, 1, 12, 0, 0)
+
+pytestmark = [
+    pytest.mark.microbench,
+    # .dict() is deprecated in Pydantic 2 but is what the handlers call
+    pytest.mark.filterwarnings("ignore::DeprecationWarning"),
+]
+
+
+def user_fields(i):
+    return {
+        "email": f"user{i}@example.com",
+        "name": f"User {i}",
+        "profile_picture": f"https://example.com/avatars/{i}.png",
+        "theme": "dark" if i % 2 else "light",
+    }
+
+
+def integration_fields(i):
+    return {
+        "user_id": f"user_{i % 50}",
+        "integration_type": list(models.IntegrationType)[i % len(models.IntegrationType)],
+        "is_connected": True,
+        "credentials": {"token": f"token-{i}"},
+        "settings": {"sync_interval": "hourly"},
+    }
+
+
+def client_fields(i):
+    return {
+        "user_id": f"user_{i % 50}",
+        "name": f"Client {i}",
+        "email": f"client{i}@example.com",
+        "phone": "+1 555 0100",
+        "company": f"Company {i % 97}",
+        "address": f"{i} Main Street",
+    }
+
+
+def project_fields(i):
+    return {
+        "user_id": f"user_{i % 50}",
+        "name": f"Project {i}",
+        "description": "Website redesign and content migration",
+        "client_id": f"client-{i % 500}",
+        "client_name": f"Client {i % 500}",
+        "status": list(models.ProjectStatus)[i % len(models.ProjectStatus)],
+        "budget": 1000.0 + i,
+        "start_date": NOW,
+        "end_date": NOW + timedelta(days=90),
+    }
+
+
+def team_member_fields(i):
+    return {
+        "user_id": f"user_{i % 50}",
+        "name": f"Member {i}",
+        "email": f"member{i}@example.com",
+        "phone": "+1 555 0101",
+        "role": "Developer",
+        "member_type": list(models.MemberType)[i % len(models.MemberType)],
+        "hourly_rate": 75.0,
+    }
+
+
+def payment_fields(i):
+    return {
+        "user_id": f"user_{i % 50}",
+        "payment_type": list(models.PaymentType)[i % len(models.PaymentType)],
+        "amount": 100.0 + i % 1000,
+        "currency": "usd",
+        "description": f"Invoice {i}",
+        "client_id": f"client-{i % 500}",
+        "project_id": f"project-{i % 800}",
+        "client_name": f"Client {i % 500}",
+        "project_name": f"Project {i % 800}",
+        "payment_status": list(models.PaymentStatus)[i % len(models.PaymentStatus)],
+    }
+
+
+def calendar_event_fields(i):
+    return {
+        "user_id": f"user_{i % 50}",
+        "title": f"Meeting {i}",
+        "description": "Weekly sync",
+        "start_time": NOW + timedelta(hours=i % 200),
+        "end_time": NOW + timedelta(hours=i % 200, minutes=30),
+        "attendees": [f"attendee{i % 7}@example.com", f"attendee{i % 11}@example.com"],
+    }
+
+
+MODELS = {
+    "User": (models.User, user_fields),
+    "Integration": (models.Integration, integration_fields),
+    "Client": (models.Client, client_fields),
+    "Project": (models.Project, project_fields),
+    "TeamMember": (models.TeamMember, team_member_fields),
+    "PaymentTransaction": (models.PaymentTransaction, payment_fields),
+    "CalendarEvent": (models.CalendarEvent, calendar_event_fields),
+}
+
+
+@lru_cache(maxsize=1)
+def corpus(model_name, documents):
+    """The same documents in each shape the steps start from"""
+    model_class, make_fields = MODELS[model_name]
+    fields = [make_fields(i) for i in range(documents)]
+    instances = [model_class(**item) for item in fields]
+    dicts = [model.dict() for model in instances]
+    datetime_fields = [name for name, value in dicts[0].items() if isinstance(value, datetime)]
+    stored = []
+    for item in dicts:
+        document = {**item, **{name: item[name].isoformat() for name in datetime_fields if item[name]}}
+        document["_id"] = ObjectId()
+        stored.append(document)
+    responses = [{**document, "_id": str(document["_id"])} for document in stored]
+    return {
+        "fields": fields,
+        "models": instances,
+        "dicts": dicts,
+        "datetime_fields": datetime_fields,
+        "stored": stored,
+        "responses": responses,
+    }
+
+
+def convert_datetimes(documents, datetime_fields):
+    for document in documents:
+        for name in datetime_fields:
+            if document[name] is not None:
+                document[name] = document[name].isoformat()
+    return documents
+
+
+def stringify_ids(documents):
+    for document in documents:
+        document["_id"] = str(document["_id"])
+    return documents
+
+
+# step -> (prepare a fresh input from the corpus, the timed work)
+STEPS = {
+    "construct": (
+        lambda data: data["fields"],
+        lambda data, batch: [data["model_class"](**item) for item in batch],
+    ),
+    "dict": (
+        lambda data: data["models"],
+        lambda data, batch: [model.dict() for model in batch],
+    ),
+    "model_dump": (
+        lambda data: data["models"],
+        lambda data, batch: [model.model_dump() for model in batch],
+    ),
+    "isoformat": (
+        lambda data: [dict(item) for item in data["dicts"]],
+        lambda data, batch: convert_datetimes(batch, data["datetime_fields"]),
+    ),
+    "stringify_id": (
+        lambda data: [dict(document) for document in data["stored"]],
+        lambda data, batch: stringify_ids(batch),
+    ),
+    "encode_response": (
+        lambda data: data["responses"],
+        lambda data, batch: jsonable_encoder(batch),
+    ),
+}
+
+# Grouped by model and size so each corpus is built once
+CASES = [(model_name, documents, step) for model_name in MODELS for documents in SIZES for step in STEPS]
+
+
+@pytest.mark.parametrize("model_name,documents,step", CASES)
+def test_microbenchmark(model_name, documents, step, microbench_results):
+    data = {**corpus(model_name, documents), "model_class": MODELS[model_name][0]}
+    prepare, work = STEPS[step]
+    rounds = max(1, MIN_DOCUMENTS_PER_RUN // documents)
+
+    best = float("inf")
+    for _ in range(REPEAT):
+        batches = [prepare(data) for _ in range(rounds)]
+        started = time.perf_counter()
+        for batch in batches:
+            output = work(data, batch)
+        best = min(best, (time.perf_counter() - started) / rounds)
+        assert len(output) == documents
+
+    microbench_results.append({
+        "model": model_name,
+        "step": step,
+        "documents": documents,
+        "repeat": REPEAT,
+        "rounds": rounds,
+        "seconds_per_batch": best,
+        "microseconds_per_document": best / documents * 1e6,
+    })
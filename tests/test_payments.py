@@ -0,0 +1,79 @@
+"""Payment rollup backfill and archival, run against the in-memory backend."""
+import uuid
+from datetime import datetime, timedelta
+
+import server
+
+
+def payment(user_id, amount, payment_type="received", status="completed", days_ago=0, currency="usd"):
+    created_at = (datetime.utcnow() - timedelta(days=days_ago)).isoformat()
+    return {
+        "id": str(uuid.uuid4()),
+        "user_id": user_id,
+        "payment_type": payment_type,
+        "amount": amount,
+        "currency": currency,
+        "payment_status": status,
+        "created_at": created_at,
+        "updated_at": created_at,
+    }
+
+
+def test_backfill_builds_rollups_for_existing_payments(database):
+    server.payment_transactions_collection.insert_many([
+        payment("u1", 100),
+        payment("u1", 40, payment_type="sent"),
+        payment("u1", 999, status="pending"),
+        payment("u2", 25, days_ago=3),
+    ])
+    server.payment_archive_collection.insert_one(payment("u2", 75, days_ago=400))
+
+    assert server.backfill_payment_rollups() == 2
+    assert server.fetch_dashboard_stats("u1")["total_received"] == 100
+    assert server.fetch_dashboard_stats("u1")["total_sent"] == 40
+    assert server.fetch_dashboard_stats("u2")["total_received"] == 100
+
+
+def test_backfill_runs_once(database):
+    server.payment_transactions_collection.insert_one(payment("u1", 100))
+    assert server.backfill_payment_rollups() == 1
+
+    server.payment_rollups_collection.delete_many({})
+    assert server.backfill_payment_rollups() == 0
+    assert server.payment_rollups_collection.count_documents({}) == 0
+
+
+def test_rebuild_replaces_existing_buckets_and_drops_empty_days(database):
+    server.ensure_indexes()
+    today = payment("u1", 100)
+    server.payment_transactions_collection.insert_one(today)
+    # A payment completing during the rebuild has already upserted its bucket
+    server.record_payment_rollup({**today, "amount": 7})
+    server.payment_rollups_collection.insert_one(
+        {"user_id": "u1", "day": "2000-01-01", "currency": "usd", "received": 5, "sent": 0, "received_count": 1, "sent_count": 0}
+    )
+
+    assert server.rebuild_payment_rollups("u1") == 1
+    rollups = list(server.payment_rollups_collection.find({"user_id": "u1"}, {"_id": 0}))
+    assert rollups == [{
+        "user_id": "u1", "day": today["created_at"][:10], "currency": "usd",
+        "received": 100, "sent": 0, "received_count": 1, "sent_count": 0,
+    }]
+
+
+def test_archive_moves_settled_payments_and_leaves_tombstones(database):
+    old = payment("u1", 100, days_ago=400)
+    old_cancelled = payment("u1", 5, status="cancelled", days_ago=400)
+    old_pending = payment("u1", 10, status="pending", days_ago=400)
+    recent = payment("u1", 20, days_ago=1)
+    server.payment_transactions_collection.insert_many([old, old_cancelled, old_pending, recent])
+
+    assert server.archive_settled_payments(older_than_days=365) == 2
+    assert {item["id"] for item in server.payment_transactions_collection.find({})} == {old_pending["id"], recent["id"]}
+    archived = list(server.payment_archive_collection.find({}))
+    assert {item["id"] for item in archived} == {old["id"], old_cancelled["id"]}
+    assert all("archived_at" in item for item in archived)
+
+    tombstones = server.deletions_collection.find({"user_id": "u1", "entity": "payments"})
+    assert {tombstone["id"] for tombstone in tombstones} == {old["id"], old_cancelled["id"]}
+    assert server.archive_settled_payments(older_than_days=365) == 0
@@ -0,0 +1,32 @@
+"""Request profiling middleware, run against the in-memory backend."""
+import os
+import pstats
+
+from starlette.testclient import TestClient
+
+import server
+
+
+def test_flagged_admin_request_writes_a_profile(tmp_path, monkeypatch):
+    monkeypatch.setattr(server, "ADMIN_API_KEY", "test-admin")
+    monkeypatch.setattr(server, "PROFILE_DIR", str(tmp_path))
+    client = TestClient(server.ProfilingMiddleware(server.app))
+
+    response = client.get("/api/health", headers={"X-Admin-Key": "test-admin", "X-Profile": "1"})
+    assert response.status_code == 200
+    path = os.path.join(tmp_path, f"{response.headers['x-profile-id']}.pstats")
+    assert pstats.Stats(path).total_calls > 0
+
+    response = client.get("/api/health?profile=1", headers={"X-Admin-Key": "test-admin"})
+    assert "x-profile-id" in response.headers
+    assert len(os.listdir(tmp_path)) == 2
+
+
+def test_unflagged_or_non_admin_requests_are_not_profiled(tmp_path, monkeypatch):
+    monkeypatch.setattr(server, "ADMIN_API_KEY", "test-admin")
+    monkeypatch.setattr(server, "PROFILE_DIR", str(tmp_path))
+    client = TestClient(server.ProfilingMiddleware(server.app))
+
+    assert "x-profile-id" not in client.get("/api/health", headers={"X-Admin-Key": "test-admin"}).headers
+    assert "x-profile-id" not in client.get("/api/health", headers={"X-Admin-Key": "wrong", "X-Profile": "1"}).headers
+    assert os.listdir(tmp_path) == []
@@ -0,0 +1,24 @@
+"""Client statement data, run against the in-memory backend."""
+import server
+
+
+def test_fetch_statements_selects_the_clients_month(database):
+    server.clients_collection.insert_one({"id": "c1", "user_id": "u1", "name": "Acme", "email": "a@example.com"})
+    server.projects_collection.insert_many([
+        {"id": "p1", "user_id": "u1", "client_id": "c1", "name": "Website", "status": "active", "budget": 500},
+        {"id": "p2", "user_id": "u2", "client_id": "c1", "name": "Other tenant"},
+    ])
+    base = {"user_id": "u1", "client_id": "c1", "payment_type": "received", "payment_status": "completed", "currency": "usd"}
+    server.payment_transactions_collection.insert_many([
+        {**base, "id": "in-month", "amount": 100, "created_at": "2026-03-31T23:00:00"},
+        {**base, "id": "next-month", "amount": 1, "created_at": "2026-04-01T00:00:00"},
+        {**base, "id": "pending", "amount": 1, "created_at": "2026-03-02T00:00:00", "payment_status": "pending"},
+        {**base, "id": "sent", "amount": 1, "created_at": "2026-03-02T00:00:00", "payment_type": "sent"},
+        {**base, "id": "other-tenant", "amount": 1, "created_at": "2026-03-02T00:00:00", "user_id": "u2"},
+    ])
+    server.payment_archive_collection.insert_one({**base, "id": "archived", "amount": 50, "created_at": "2026-03-01T00:00:00"})
+
+    statement, = server.fetch_statements("u1", ["c1"], "2026-03")
+    assert [project["name"] for project in statement["projects"]] == ["Website"]
+    assert [payment["date"] for payment in statement["payments"]] == ["2026-03-01", "2026-03-31"]
+    assert statement["totals"] == [{"currency": "usd", "amount": 150}]
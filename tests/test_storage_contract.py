@@ -0,0 +1,340 @@
+"""Contract tests for the storage backends.
+
+Every test runs against the in-memory engine and against MongoDB at
+``MONGO_URL``; the Mongo cases are skipped when no server answers. Each
+test gets a throwaway database that is dropped afterwards.
+
+    pytest tests/test_storage_contract.py
+    MONGO_URL=mongodb://localhost:27017 pytest tests/test_storage_contract.py
+"""
+import os
+import uuid
+from datetime import datetime
+
+import gridfs
+import pytest
+from pymongo import ReplaceOne, ReturnDocument, UpdateOne
+from pymongo.errors import DuplicateKeyError, PyMongoError
+
+import storage
+
+MONGO_URL = os.environ.get("MONGO_URL", "mongodb://localhost:27017")
+
+
+@pytest.fixture(params=storage.BACKENDS)
+def db(request):
+    client = storage.open_client(request.param, MONGO_URL, serverSelectionTimeoutMS=500)
+    try:
+        client.admin.command("ping")
+    except PyMongoError:
+        pytest.skip(f"MongoDB is not reachable at {MONGO_URL}")
+    name = f"storage_contract_{uuid.uuid4().hex[:12]}"
+    yield client[name]
+    client.drop_database(name)
+    client.close()
+
+
+def ids(documents):
+    return [document["id"] for document in documents]
+
+
+def test_insert_and_find_return_copies(db):
+    document = {"id": "a", "user_id": "u1", "tags": ("x",), "at": datetime(2024, 1, 1, 12, 0, 0, 123456)}
+    db.items.insert_one(document)
+    assert "_id" in document
+
+    found = db.items.find_one({"id": "a"}, {"_id": 0})
+    assert found == {"id": "a", "user_id": "u1", "tags": ["x"], "at": datetime(2024, 1, 1, 12, 0, 0, 123000)}
+    found["tags"].append("y")
+    assert db.items.find_one({"id": "a"})["tags"] == ["x"]
+    assert db.items.find_one({"id": "missing"}) is None
+
+
+def test_query_operators(db):
+    db.items.insert_many([
+        {"id": "a", "user_id": "u1", "amount": 5, "status": "open", "tags": ["red"], "owner": {"name": "Ann"}},
+        {"id": "b", "user_id": "u1", "amount": 15.5, "status": None, "tags": []},
+        {"id": "c", "user_id": "u1", "amount": "20", "tags": ["red", "blue"]},
+        {"id": "d", "user_id": "u2", "amount": 25, "status": "open"},
+    ])
+
+    def query(filter):
+        return sorted(ids(db.items.find(filter)))
+
+    assert query({"user_id": "u1"}) == ["a", "b", "c"]
+    assert query({"user_id": "u1", "id": {"$in": ["a", "c", "x"]}}) == ["a", "c"]
+    assert query({"status": None}) == ["b", "c"]
+    assert query({"status": {"$ne": None}}) == ["a", "d"]
+    assert query({"status": {"$exists": False}}) == ["c"]
+    # Ranges only compare values of the same type
+    assert query({"amount": {"$gt": 10}}) == ["b", "d"]
+    assert query({"amount": {"$gte": 5, "$lt": 20}}) == ["a", "b"]
+    assert query({"amount": {"$type": "string"}}) == ["c"]
+    assert query({"tags": "red"}) == ["a", "c"]
+    assert query({"tags": {"$size": 0}}) == ["b"]
+    assert query({"tags": {"$nin": ["blue"]}}) == ["a", "b", "d"]
+    assert query({"owner.name": "Ann"}) == ["a"]
+    assert query({"$or": [{"id": "a"}, {"user_id": "u2"}]}) == ["a", "d"]
+    assert query({"$expr": {"$gt": [{"$size": {"$ifNull": ["$tags", []]}}, 1]}}) == ["c"]
+
+
+def test_projection_sort_skip_limit(db):
+    db.items.insert_many([
+        {"id": str(i), "group": i % 2, "name": name, "extra": {"a": 1, "b": 2}}
+        for i, name in enumerate(["d", "b", "a", "c", "e"])
+    ])
+
+    assert ids(db.items.find({}).sort("name", 1).skip(1).limit(2)) == ["1", "3"]
+    assert ids(db.items.find({}).sort([("group", -1), ("name", 1)])) == ["1", "3", "2", "0", "4"]
+    assert db.items.find_one({"id": "0"}, {"_id": 0, "name": 1, "extra.a": 1}) == {"name": "d", "extra": {"a": 1}}
+    assert db.items.find_one({"id": "0"}, {"_id": 0, "extra": 0, "group": 0}) == {"id": "0", "name": "d"}
+
+
+def test_updates_and_upserts(db):
+    db.items.insert_many([{"id": "a", "count": 1, "old": True}, {"id": "b", "count": 1}])
+
+    result = db.items.update_one({"id": "a"}, {"$set": {"meta.seen": True}, "$unset": {"old": ""}, "$inc": {"count": 2}})
+    assert (result.matched_count, result.modified_count, result.upserted_id) == (1, 1, None)
+    assert db.items.find_one({"id": "a"}, {"_id": 0}) == {"id": "a", "count": 3, "meta": {"seen": True}}
+
+    assert db.items.update_one({"id": "a"}, {"$set": {"count": 3}}).modified_count == 0
+    assert db.items.update_many({}, {"$inc": {"count": 1}}).modified_count == 2
+
+    result = db.items.update_one(
+        {"id": "c", "kind": "new"}, {"$inc": {"count": 5}, "$setOnInsert": {"created": True}}, upsert=True
+    )
+    assert result.upserted_id is not None
+    assert db.items.find_one({"id": "c"}, {"_id": 0}) == {"id": "c", "kind": "new", "count": 5, "created": True}
+    db.items.update_one({"id": "c"}, {"$inc": {"count": 1}, "$setOnInsert": {"created": False}}, upsert=True)
+    assert db.items.find_one({"id": "c"})["created"] is True
+
+
+def test_find_one_and_update_and_delete(db):
+    db.jobs.insert_many([{"id": "1", "status": "queued", "n": 2}, {"id": "2", "status": "queued", "n": 1}])
+
+    claimed = db.jobs.find_one_and_update(
+        {"status": "queued"}, {"$set": {"status": "running"}},
+        sort=[("n", 1)], return_document=ReturnDocument.AFTER, projection={"_id": 0},
+    )
+    assert claimed == {"id": "2", "status": "running", "n": 1}
+    before = db.jobs.find_one_and_update({"id": "1"}, {"$set": {"status": "running"}})
+    assert before["status"] == "queued"
+    assert db.jobs.find_one_and_update({"status": "queued"}, {"$set": {"status": "running"}}) is None
+
+    upserted = db.jobs.find_one_and_update(
+        {"id": "3"}, {"$set": {"status": "queued"}}, upsert=True, return_document=ReturnDocument.AFTER
+    )
+    assert upserted["id"] == "3"
+
+    assert db.jobs.find_one_and_delete({"id": "1"})["status"] == "running"
+    assert db.jobs.find_one_and_delete({"id": "1"}) is None
+    assert db.jobs.delete_many({"status": "running"}).deleted_count == 1
+    assert db.jobs.count_documents({}) == 1
+
+
+def test_unique_indexes(db):
+    db.users.create_index("email", unique=True)
+    db.users.create_index(
+        [("user_id", 1), ("stripe_id", 1)], unique=True,
+        partialFilterExpression={"stripe_id": {"$type": "string"}},
+    )
+    db.users.insert_one({"email": "a@example.com", "user_id": "u1", "stripe_id": None})
+    db.users.insert_one({"email": "b@example.com", "user_id": "u1", "stripe_id": None})
+    db.users.insert_one({"email": "c@example.com", "user_id": "u1", "stripe_id": "cs_1"})
+
+    with pytest.raises(DuplicateKeyError):
+        db.users.insert_one({"email": "a@example.com"})
+    with pytest.raises(DuplicateKeyError):
+        db.users.insert_one({"email": "d@example.com", "user_id": "u1", "stripe_id": "cs_1"})
+    with pytest.raises(DuplicateKeyError):
+        db.users.update_one({"email": "b@example.com"}, {"$set": {"email": "a@example.com"}})
+    assert db.users.count_documents({}) == 3
+    assert db.users.find_one({"email": "b@example.com"}) is not None
+
+
+def test_bulk_write(db):
+    db.rollups.insert_one({"_id": "u1|2024-01", "total": 1})
+    result = db.rollups.bulk_write([
+        UpdateOne({"_id": "u1|2024-01"}, {"$inc": {"total": 2}}, upsert=True),
+        UpdateOne({"_id": "u1|2024-02"}, {"$inc": {"total": 5}}, upsert=True),
+        ReplaceOne({"_id": "u2|2024-01"}, {"_id": "u2|2024-01", "total": 7}, upsert=True),
+    ], ordered=False)
+    assert (result.matched_count, result.modified_count, result.upserted_count) == (1, 1, 2)
+    assert {document["_id"]: document["total"] for document in db.rollups.find({})} == {
+        "u1|2024-01": 3, "u1|2024-02": 5, "u2|2024-01": 7,
+    }
+
+
+def test_lookup_unwind_project(db):
+    db.clients.insert_many([{"id": "c1", "name": "Acme"}, {"id": "c2", "name": "Globex", "company": "G"}])
+    db.projects.insert_many([
+        {"id": "p1", "client_id": "c1", "client_name": "Old", "budget": 100},
+        {"id": "p2", "client_id": "c2", "client_name": "Globex", "budget": 50},
+        {"id": "p3", "client_id": "gone", "client_name": "Ghost", "budget": 10},
+    ])
+    db.payments.insert_many([
+        {"id": "x1", "project_id": "p1", "amount": 30, "status": "completed"},
+        {"id": "x2", "project_id": "p1", "amount": 20, "status": "pending"},
+    ])
+
+    stale = list(db.projects.aggregate([
+        {"$lookup": {"from": "clients", "localField": "client_id", "foreignField": "id", "as": "source"}},
+        {"$project": {"_id": 0, "id": 1, "name": {"$ifNull": [{"$arrayElemAt": ["$source.name", 0]}, None]}}},
+        {"$match": {"$expr": {"$and": [{"$ne": ["$name", None]}, {"$ne": ["$name", "Globex"]}]}}},
+    ]))
+    assert stale == [{"id": "p1", "name": "Acme"}]
+
+    orphans = list(db.projects.aggregate([
+        {"$lookup": {"from": "clients", "localField": "client_id", "foreignField": "id", "as": "client"}},
+        {"$match": {"client": {"$size": 0}}},
+        {"$project": {"_id": 0, "id": 1}},
+    ]))
+    assert orphans == [{"id": "p3"}]
+
+    rows = list(db.projects.aggregate([
+        {"$match": {"id": {"$in": ["p1", "p2"]}}},
+        {"$lookup": {"from": "payments", "localField": "id", "foreignField": "project_id", "as": "payments"}},
+        {"$lookup": {"from": "clients", "localField": "client_id", "foreignField": "id", "as": "client"}},
+        {"$unwind": "$client"},
+        {"$project": {
+            "_id": 0,
+            "id": 1,
+            "client": {"name": "$client.name", "company": "$client.company"},
+            "received": {"$filter": {
+                "input": {"$concatArrays": ["$payments", []]},
+                "as": "payment",
+                "cond": {"$eq": ["$$payment.status", "completed"]},
+            }},
+        }},
+        {"$project": {"id": 1, "client": 1, "count": {"$size": "$received"}, "amounts": "$received.amount"}},
+        {"$sort": {"id": 1}},
+    ]))
+    assert rows == [
+        {"id": "p1", "client": {"name": "Acme"}, "count": 1, "amounts": [30]},
+        {"id": "p2", "client": {"name": "Globex", "company": "G"}, "count": 0, "amounts": []},
+    ]
+
+
+def test_pipeline_lookup(db):
+    db.clients.insert_many([{"id": "c1", "user_id": "u1"}, {"id": "c2", "user_id": "u1"}])
+    db.payments.insert_many([
+        {"id": "x1", "user_id": "u1", "client_id": "c1", "created_at": "2024-01-10"},
+        {"id": "x2", "user_id": "u1", "client_id": "c1", "created_at": "2024-02-10"},
+        {"id": "x3", "user_id": "u2", "client_id": "c1", "created_at": "2024-01-11"},
+        {"id": "x4", "user_id": "u1", "client_id": "c2", "created_at": "2024-01-12"},
+    ])
+
+    rows = list(db.clients.aggregate([
+        {"$match": {"user_id": "u1"}},
+        {"$lookup": {
+            "from": "payments",
+            "let": {"client_id": "$id"},
+            "pipeline": [
+                {"$match": {
+                    "$expr": {"$eq": ["$client_id", "$$client_id"]},
+                    "user_id": "u1",
+                    "created_at": {"$gte": "2024-01-01", "$lt": "2024-02-01"},
+                }},
+                {"$project": {"_id": 0, "id": 1}},
+            ],
+            "as": "payments",
+        }},
+        {"$project": {"_id": 0, "id": 1, "payments": 1}},
+        {"$sort": {"id": 1}},
+    ]))
+    assert rows == [{"id": "c1", "payments": [{"id": "x1"}]}, {"id": "c2", "payments": [{"id": "x4"}]}]
+
+
+def test_group_facet_union(db):
+    db.payments.insert_many([
+        {"user_id": "u1", "type": "received", "amount": 10, "at": "2024-01-05T10:00:00"},
+        {"user_id": "u1", "type": "sent", "amount": 4, "at": "2024-01-20T10:00:00"},
+        {"user_id": "u1", "type": "received", "amount": 6, "at": "2024-02-01T10:00:00"},
+    ])
+    db.archive.insert_one({"user_id": "u1", "type": "received", "amount": 100, "at": "2023-12-31T23:00:00"})
+
+    months = list(db.payments.aggregate([
+        {"$unionWith": {"coll": "archive"}},
+        {"$group": {
+            "_id": {"user_id": "$user_id", "month": {"$substrBytes": ["$at", 0, 7]}},
+            "received": {"$sum": {"$cond": [{"$eq": ["$type", "received"]}, "$amount", 0]}},
+            "count": {"$sum": 1},
+        }},
+        {"$sort": {"_id.month": 1}},
+    ]))
+    assert [(row["_id"]["month"], row["received"], row["count"]) for row in months] == [
+        ("2023-12", 100, 1), ("2024-01", 10, 2), ("2024-02", 6, 1),
+    ]
+
+    totals = list(db.payments.aggregate([
+        {"$group": {"_id": None, "total": {"$sum": "$amount"}, "biggest": {"$max": "$amount"}}},
+    ]))
+    assert totals == [{"_id": None, "total": 20, "biggest": 10}]
+
+    facet = list(db.payments.aggregate([
+        {"$project": {"_id": 0, "amount": 1, "net": {"$subtract": ["$amount", 1]}}},
+        {"$facet": {
+            "total": [{"$count": "count"}],
+            "items": [{"$sort": {"net": -1}}, {"$skip": 1}, {"$limit": 1}],
+            "none": [{"$match": {"amount": 0}}, {"$count": "count"}],
+        }},
+    ]))
+    assert facet == [{"total": [{"count": 3}], "items": [{"amount": 6, "net": 5}], "none": []}]
+
+
+def test_aggregate_leaves_stored_documents_alone(db):
+    db.items.insert_one({"id": "a", "owner": {"name": "Ann", "team": "x"}, "tags": ["red", "blue"]})
+    db.links.insert_one({"item_id": "a", "meta": {"kind": "ref"}})
+
+    rows = list(db.items.aggregate([
+        {"$match": {"id": "a"}},
+        {"$project": {"_id": 0, "owner.team": 0}},
+        {"$unwind": "$tags"},
+        {"$lookup": {"from": "links", "localField": "id", "foreignField": "item_id", "as": "links"}},
+        {"$addFields": {"label": "$owner"}},
+    ]))
+    assert [row["tags"] for row in rows] == ["red", "blue"]
+    assert rows[0]["owner"] == {"name": "Ann"}
+    rows[0]["owner"]["name"] = "Changed"
+    rows[0]["links"][0]["meta"]["kind"] = "changed"
+    rows[0]["label"]["name"] = "Changed too"
+    assert rows[1]["owner"] == {"name": "Ann"}
+    assert rows[1]["label"] == {"name": "Ann"}
+    assert rows[1]["links"][0]["meta"] == {"kind": "ref"}
+
+    assert db.items.find_one({"id": "a"}, {"_id": 0}) == {
+        "id": "a", "owner": {"name": "Ann", "team": "x"}, "tags": ["red", "blue"],
+    }
+    assert db.links.find_one({}, {"_id": 0}) == {"item_id": "a", "meta": {"kind": "ref"}}
+
+
+def test_text_search(db):
+    db.projects.create_index([("name", "text"), ("description", "text")], weights={"name": 5, "description": 1})
+    db.projects.insert_many([
+        {"id": "a", "user_id": "u1", "name": "Website design", "description": "Landing page"},
+        {"id": "b", "user_id": "u1", "name": "Mobile app", "description": "Design system and website"},
+        {"id": "c", "user_id": "u1", "name": "Accounting", "description": "Quarterly books"},
+        {"id": "d", "user_id": "u2", "name": "Website", "description": ""},
+    ])
+
+    results = list(
+        db.projects.find({"user_id": "u1", "$text": {"$search": "website"}}, {"_id": 0, "id": 1, "score": {"$meta": "textScore"}})
+        .sort([("score", {"$meta": "textScore"})])
+    )
+    assert ids(results) == ["a", "b"]
+    assert results[0]["score"] > results[1]["score"]
+
+
+def test_file_store(db):
+    files = storage.open_file_store(db, "results")
+    files.put(b"report", _id="job-1", filename="report.csv", content_type="text/csv")
+    with pytest.raises(gridfs.errors.FileExists):
+        files.put(b"again", _id="job-1")
+
+    stored = files.get("job-1")
+    assert (stored.read(), stored.filename, stored.content_type, stored.length) == (b"report", "report.csv", "text/csv", 6)
+    assert [stored._id for stored in files.find({"filename": "report.csv"})] == ["job-1"]
+
+    files.delete("job-1")
+    with pytest.raises(gridfs.errors.NoFile):
+        files.get("job-1")
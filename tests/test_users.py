@@ -0,0 +1,16 @@
+"""Current-user lookups, run against the in-memory backend."""
+import server
+
+
+def test_unknown_users_are_created_with_distinct_emails(database):
+    server.ensure_indexes()
+    for user_id in ["u1", "u2", server.DEFAULT_USER_ID]:
+        server.user_cache.pop(user_id)
+
+    first = server.fetch_current_user("u1")
+    second = server.fetch_current_user("u2")
+    default = server.fetch_current_user(server.DEFAULT_USER_ID)
+    assert first["email"] == "u1@users.invalid"
+    assert second["email"] == "u2@users.invalid"
+    assert default["email"] == "admin@businesshub.com"
+    assert server.users_collection.count_documents({}) == 3